@@ -39,6 +39,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'core',
     'rest_framework',
     'rest_framework.authtoken',
@@ -146,6 +147,31 @@ MEDIA_URL='/static/media/'
 MEDIA_ROOT='/vol/web/media'
 STATIC_ROOT='/vol/web/static'
 
+# Store recipe and product images once per distinct content, named by
+# their SHA-256 digest and reference counted (see core/storage.py).
+CONTENT_ADDRESSED_MEDIA = os.environ.get('CONTENT_ADDRESSED_MEDIA') == '1'
+
+# Worker processes that render resized/WebP image variants in the
+# background. 0 renders them inline after the upload commits.
+IMAGE_VARIANT_WORKERS = int(os.environ.get('IMAGE_VARIANT_WORKERS', 2))
+
+# Deleted images are queued in core.PendingFileDeletion and removed in
+# batches by a background thread once the transaction commits. 0 flushes
+# the queue inline after commit; `manage.py flush_file_deletions` drains
+# it from a separate worker.
+FILE_DELETION_WORKERS = int(os.environ.get('FILE_DELETION_WORKERS', 1))
+FILE_DELETION_BATCH_SIZE = 100
+
+# Threads writing the files of one product image upload to storage.
+PRODUCT_IMAGE_UPLOAD_WORKERS = 8
+
+# On-demand resized images are cached on disk and evicted least recently
+# used first once the directory grows past the byte limit.
+IMAGE_RESIZE_CACHE_DIR = os.path.join(MEDIA_ROOT, 'resized')
+IMAGE_RESIZE_CACHE_MAX_BYTES = int(
+    os.environ.get('IMAGE_RESIZE_CACHE_MAX_BYTES', 512 * 1024 * 1024)
+)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
@@ -161,6 +187,59 @@ REST_FRAMEWORK = {
     # )
 }
 
+# user.authentication.CachedTokenAuthentication keeps authenticated
+# tokens in an in-process LRU of at most TOKEN_AUTH_CACHE_MAX_ENTRIES for
+# this many seconds, which without a shared cache also bounds how long
+# another process may still accept a deleted token.
+TOKEN_AUTH_CACHE_TIMEOUT = 60
+TOKEN_AUTH_CACHE_MAX_ENTRIES = 10000
+# Alias in CACHES shared by all processes to back the LRU, or None.
+TOKEN_AUTH_SHARED_CACHE = os.environ.get('TOKEN_AUTH_SHARED_CACHE') or None
+
+# CACHE_BACKEND/CACHE_LOCATION point the default cache at a server shared
+# by all processes, e.g. PyMemcacheCache at memcached:11211. Without one
+# each process has its own LocMemCache.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+
+# Seconds a cached recipe/tag/ingredient list stays valid; writes by the
+# owner invalidate it earlier through a per-user version number.
+RECIPE_LIST_CACHE_TIMEOUT = 300
+# The version lives in the default cache, so list caching and the list
+# ETags are only enabled when that cache is shared between processes; a
+# per-process one would keep serving other workers' stale lists.
+RECIPE_LIST_CACHE_ENABLED = (
+    CACHES['default']['BACKEND']
+    != 'django.core.cache.backends.locmem.LocMemCache'
+)
+
+# Rejected rows of HTTP catalog imports, kept outside MEDIA_ROOT and only
+# served to the uploader by product.views.import_rejects.
+PRODUCT_IMPORT_REJECTS_DIR = '/vol/web/private/import-rejects'
+
+# Worker processes validating rows in `manage.py import_products`; 0
+# validates inline. The HTTP import always validates inline, since
+# forking a threaded web worker is unsafe.
+PRODUCT_IMPORT_WORKERS = int(
+    os.environ.get('PRODUCT_IMPORT_WORKERS', os.cpu_count() or 1)
+)
+
+# Seconds product facet counts are cached per set of filter values.
+PRODUCT_FACET_CACHE_TIMEOUT = 60
+
+# Autocomplete is served from in-process prefix indexes kept current by
+# model signals; each is rebuilt from the database after this many
+# seconds to pick up writes made by other processes or raw SQL.
+AUTOCOMPLETE_INDEX_MAX_AGE = 300
+# Per-user tag and ingredient indexes kept in memory per process.
+AUTOCOMPLETE_MAX_USER_INDEXES = 1000
+
 SPECTACULAR_SETTINGS = {
     'COMPONENET_SPLIT_REQUEST': True,
 }
\ No newline at end of file
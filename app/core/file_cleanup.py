@@ -0,0 +1,187 @@
+"""Durable, batched deletion of recipe and product image files.
+
+Deleting a row only queues its files in `core.PendingFileDeletion`, inside
+the same transaction, so the request never waits on the storage backend.
+After commit a background thread drains the queue in batches; whatever a
+crash or storage outage leaves behind stays queued for the next flush or
+for `manage.py flush_file_deletions`. `find_orphaned_files` backs the
+`cleanup_orphaned_files` command, which removes files no row refers to.
+"""
+import logging
+import posixpath
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from core.models import PendingFileDeletion, Recipe, StoredFile
+from core.storage import ContentAddressedStorage, get_image_storage
+
+logger = logging.getLogger(__name__)
+
+# Storage directories holding uploaded images and their variants.
+MEDIA_PREFIXES = ('uploads/recipe', 'products', ContentAddressedStorage.prefix)
+
+_pool = None
+_lock = threading.Lock()
+_queued = False
+_collecting = threading.local()
+
+
+@contextmanager
+def collect_file_deletions():
+    """Queue every path enqueued inside the block with a single INSERT.
+
+    Wrap deletes of many rows whose post_delete handlers each enqueue
+    their files, so the queue costs one statement instead of one per row.
+    """
+    if getattr(_collecting, 'paths', None) is not None:
+        yield
+        return
+    _collecting.paths = []
+    try:
+        yield
+        paths = _collecting.paths
+    finally:
+        _collecting.paths = None
+    enqueue_file_deletions(paths)
+
+
+def enqueue_file_deletions(paths):
+    """Queue `paths` for deletion once the current transaction commits"""
+    collected = getattr(_collecting, 'paths', None)
+    if collected is not None:
+        collected.extend(paths)
+        return
+    rows = [PendingFileDeletion(path=path) for path in paths if path]
+    if rows:
+        PendingFileDeletion.objects.bulk_create(rows)
+        transaction.on_commit(schedule_flush)
+
+
+def flush_file_deletions(batch_size=None, storage=None):
+    """Delete queued files batch by batch; returns `(deleted, failed)`.
+
+    Rows are claimed with SKIP LOCKED so concurrent workers never delete
+    the same file twice. Failed deletions stay queued with their attempt
+    count bumped and are retried by the next flush.
+    """
+    batch_size = batch_size or settings.FILE_DELETION_BATCH_SIZE
+    storage = storage or get_image_storage()
+    deleted = failed = 0
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                PendingFileDeletion.objects.select_for_update(skip_locked=True)
+                .filter(id__gt=last_id)
+                .order_by('id')[:batch_size]
+            )
+            if not batch:
+                break
+
+            done, failures = [], []
+            for entry in batch:
+                try:
+                    with transaction.atomic():
+                        storage.delete(entry.path)
+                except Exception:
+                    logger.warning(
+                        'Could not delete %s', entry.path, exc_info=True
+                    )
+                    failures.append(entry.pk)
+                else:
+                    done.append(entry.pk)
+
+            PendingFileDeletion.objects.filter(pk__in=done).delete()
+            PendingFileDeletion.objects.filter(pk__in=failures).update(
+                attempts=F('attempts') + 1
+            )
+        last_id = batch[-1].pk
+        deleted += len(done)
+        failed += len(failures)
+    return deleted, failed
+
+
+def _drain():
+    global _queued
+    with _lock:
+        _queued = False
+    try:
+        flush_file_deletions()
+    except Exception:
+        logger.exception('Flushing queued file deletions failed')
+    finally:
+        connection.close()
+
+
+def schedule_flush():
+    """Flush the queue in the background, coalescing repeated calls"""
+    global _pool, _queued
+    if not settings.FILE_DELETION_WORKERS:
+        flush_file_deletions()
+        return
+    with _lock:
+        if _queued:
+            return
+        _queued = True
+        if _pool is None:
+            _pool = ThreadPoolExecutor(
+                max_workers=settings.FILE_DELETION_WORKERS
+            )
+    _pool.submit(_drain)
+
+
+def _referenced_paths():
+    from product.models import ProductImages
+
+    paths = set()
+    for model in (Recipe, ProductImages):
+        rows = model.objects.exclude(image='').exclude(image=None)
+        for image, variants in rows.values_list(
+            'image', 'image_variants'
+        ).iterator():
+            paths.add(image)
+            paths.update((variants or {}).values())
+    paths.update(StoredFile.objects.values_list('path', flat=True).iterator())
+    # Queued files are handled by the queue.
+    paths.update(
+        PendingFileDeletion.objects.values_list('path', flat=True).iterator()
+    )
+    return paths
+
+
+def _walk(storage, directory):
+    try:
+        dirs, files = storage.listdir(directory)
+    except FileNotFoundError:
+        return
+    for name in files:
+        yield posixpath.join(directory, name)
+    for name in dirs:
+        yield from _walk(storage, posixpath.join(directory, name))
+
+
+def find_orphaned_files(min_age=timedelta(hours=1)):
+    """Yield `(storage, path)` for image files no row refers to.
+
+    Files younger than `min_age` are skipped: uploads are written to
+    storage before their row is inserted.
+    """
+    storage = get_image_storage()
+    # Orphans have no reference count to drop; address the files directly.
+    backend = getattr(storage, 'backend', storage)
+    referenced = _referenced_paths()
+    cutoff = timezone.now() - min_age
+    for prefix in MEDIA_PREFIXES:
+        for path in _walk(backend, prefix):
+            if path in referenced:
+                continue
+            if backend.get_modified_time(path) > cutoff:
+                continue
+            yield backend, path
@@ -0,0 +1,34 @@
+"""Remove image files that no recipe, product image or queue row refers to"""
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from core.file_cleanup import find_orphaned_files
+
+
+class Command(BaseCommand):
+    help = 'Delete stored image files that are no longer referenced.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only list the orphaned files',
+        )
+        parser.add_argument(
+            '--min-age', type=int, default=3600,
+            help='Skip files modified in the last MIN_AGE seconds',
+        )
+
+    def handle(self, *args, **options):
+        min_age = timedelta(seconds=options['min_age'])
+        count = 0
+        for storage, path in find_orphaned_files(min_age):
+            count += 1
+            self.stdout.write(path)
+            if not options['dry_run']:
+                storage.delete(path)
+
+        action = 'Found' if options['dry_run'] else 'Deleted'
+        self.stdout.write(
+            self.style.SUCCESS(f'{action} {count} orphaned files.')
+        )
@@ -0,0 +1,28 @@
+"""Delete the image files queued in core.PendingFileDeletion"""
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.file_cleanup import flush_file_deletions
+
+
+class Command(BaseCommand):
+    help = 'Delete queued image files in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int)
+        parser.add_argument(
+            '--interval', type=float,
+            help='Keep running, flushing every INTERVAL seconds',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            deleted, failed = flush_file_deletions(options['batch_size'])
+            if deleted or failed or not options['interval']:
+                self.stdout.write(
+                    f'Deleted {deleted} files, {failed} failed.'
+                )
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
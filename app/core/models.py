@@ -1,9 +1,23 @@
 from django.db import models
 from django.conf import settings
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Now
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+)
+from django.dispatch import receiver
 
 import uuid
 import os
 
+from core.storage import get_image_storage
+
 from django.contrib.auth.models import (AbstractBaseUser, PermissionsMixin, BaseUserManager)
 
 # Create your models here.
@@ -56,7 +70,30 @@ class Recipe(models.Model):
     link=models.CharField(max_length=255,blank=True)
     tags = models.ManyToManyField('Tag')
     ingredients = models.ManyToManyField('Ingredient')
-    image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    image = models.ImageField(
+        null=True,
+        upload_to=recipe_image_file_path,
+        storage=get_image_storage,
+    )
+    image_variants = models.JSONField(default=dict, blank=True)
+    search_vector = SearchVectorField(null=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='recipe_search_idx'),
+            models.Index(fields=['user', 'id'], name='recipe_user_id_idx'),
+            models.Index(
+                fields=['user', 'price', 'id'], name='recipe_user_price_idx'
+            ),
+            models.Index(
+                fields=['user', 'time_minutes', 'id'],
+                name='recipe_user_time_idx'
+            ),
+            models.Index(
+                fields=['user', 'title', 'id'], name='recipe_user_title_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.title
@@ -78,4 +115,105 @@ class Ingredient(models.Model):
     )
 
     def __str__(self):
-        return self.name
\ No newline at end of file
+        return self.name
+
+
+class StoredFile(models.Model):
+    """Reference count of a content-addressed media file"""
+    path = models.CharField(max_length=255, unique=True)
+    refs = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return self.path
+
+
+class PendingFileDeletion(models.Model):
+    """Media file queued for deletion once its row is gone"""
+    path = models.CharField(max_length=255)
+    attempts = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.path
+
+
+SEARCH_CONFIG = 'english'
+
+
+def _names_subquery(model):
+    """Space separated names of the tags or ingredients of a recipe"""
+    return Subquery(
+        model.objects.filter(recipe=OuterRef('pk'))
+        .values('recipe')
+        .annotate(names=StringAgg('name', ' '))
+        .values('names')
+    )
+
+
+def update_search_vector(recipes, **fields):
+    """Recompute the stored search vector for a Recipe queryset"""
+    return recipes.update(**fields, search_vector=(
+        SearchVector('title', weight='A', config=SEARCH_CONFIG)
+        + SearchVector(_names_subquery(Tag), weight='B', config=SEARCH_CONFIG)
+        + SearchVector(
+            _names_subquery(Ingredient), weight='B', config=SEARCH_CONFIG
+        )
+        + SearchVector('description', weight='C', config=SEARCH_CONFIG)
+    ))
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, **kwargs):
+    update_search_vector(Recipe.objects.filter(pk=instance.pk))
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def recipe_attr_saved(sender, instance, created, **kwargs):
+    if not created:
+        field = 'tags' if sender is Tag else 'ingredients'
+        update_search_vector(
+            Recipe.objects.filter(**{field: instance}), updated_at=Now()
+        )
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def recipe_attr_deleting(sender, instance, **kwargs):
+    instance._recipe_ids = list(
+        instance.recipe_set.values_list('pk', flat=True)
+    )
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def recipe_attr_deleted(sender, instance, **kwargs):
+    recipe_ids = getattr(instance, '_recipe_ids', None)
+    if recipe_ids:
+        update_search_vector(
+            Recipe.objects.filter(pk__in=recipe_ids), updated_at=Now()
+        )
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def recipe_attrs_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    # Relation changes also bump updated_at, which versions the payload.
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            update_search_vector(
+                Recipe.objects.filter(pk=instance.pk), updated_at=Now()
+            )
+    elif action == 'pre_clear':
+        instance._recipe_ids = list(
+            instance.recipe_set.values_list('pk', flat=True)
+        )
+    elif action == 'post_clear':
+        update_search_vector(
+            Recipe.objects.filter(pk__in=instance._recipe_ids),
+            updated_at=Now()
+        )
+    elif action in ('post_add', 'post_remove') and pk_set:
+        update_search_vector(
+            Recipe.objects.filter(pk__in=pk_set), updated_at=Now()
+        )
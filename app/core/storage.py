@@ -0,0 +1,126 @@
+"""Content-addressed, reference-counted storage for uploaded images.
+
+Enabled with the CONTENT_ADDRESSED_MEDIA setting. Uploads are hashed while
+they are streamed to a spool file and stored once under their SHA-256
+digest; every save of identical content only bumps a reference count in
+`core.StoredFile`, and `delete()` removes the file when the last reference
+goes away.
+
+The increment joins the caller's transaction, so save inside the one that
+writes the row holding the name: if that write fails the reference rolls
+back with it. A reference taken outside one is committed at once, and a
+caller whose row write then fails must release it with `delete()`, as the
+threaded product upload does; otherwise the file is never reclaimed.
+"""
+import hashlib
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import Storage, default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils.deconstruct import deconstructible
+
+SPOOL_MAX_SIZE = 2 * 1024 * 1024
+
+
+@deconstructible
+class ContentAddressedStorage(Storage):
+    """Wrap another storage backend and store files by content digest"""
+    prefix = 'cas'
+
+    def __init__(self, backend=None):
+        self.backend = backend or default_storage
+
+    def digest_name(self, digest, name):
+        ext = os.path.splitext(name)[1].lower()
+        return f'{self.prefix}/{digest[:2]}/{digest[2:4]}/{digest}{ext}'
+
+    def get_available_name(self, name, max_length=None):
+        # Identical content must map to the identical name.
+        return name
+
+    def _lock_entry(self, name):
+        from core.models import StoredFile
+
+        while True:
+            try:
+                with transaction.atomic():
+                    StoredFile.objects.get_or_create(path=name)
+            except IntegrityError:
+                pass
+            try:
+                return StoredFile.objects.select_for_update().get(path=name)
+            except StoredFile.DoesNotExist:
+                # The last reference was released in between; start over.
+                continue
+
+    def _save(self, name, content):
+        hasher = hashlib.sha256()
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as spool:
+            if hasattr(content, 'seek'):
+                content.seek(0)
+            for chunk in content.chunks():
+                hasher.update(chunk)
+                spool.write(chunk)
+            spool.seek(0)
+
+            target = self.digest_name(hasher.hexdigest(), name)
+            with transaction.atomic():
+                entry = self._lock_entry(target)
+                if not self.backend.exists(target):
+                    saved = self.backend.save(target, File(spool))
+                    if saved != target:
+                        self.backend.delete(saved)
+                        raise IOError(f'Could not store {target}')
+                type(entry).objects.filter(pk=entry.pk).update(
+                    refs=F('refs') + 1
+                )
+        return target
+
+    def delete(self, name):
+        from core.models import StoredFile
+
+        with transaction.atomic():
+            entry = StoredFile.objects.select_for_update().filter(
+                path=name
+            ).first()
+            if entry is not None and entry.refs > 1:
+                StoredFile.objects.filter(pk=entry.pk).update(
+                    refs=F('refs') - 1
+                )
+                return
+            if entry is not None:
+                entry.delete()
+            # Untracked names predate content addressing; delete directly.
+            self.backend.delete(name)
+
+    def _open(self, name, mode='rb'):
+        return self.backend.open(name, mode)
+
+    def exists(self, name):
+        return self.backend.exists(name)
+
+    def url(self, name):
+        return self.backend.url(name)
+
+    def size(self, name):
+        return self.backend.size(name)
+
+    def path(self, name):
+        return self.backend.path(name)
+
+    def listdir(self, path):
+        return self.backend.listdir(path)
+
+    def get_modified_time(self, name):
+        return self.backend.get_modified_time(name)
+
+
+def get_image_storage():
+    """Storage for recipe and product images, chosen by settings"""
+    if settings.CONTENT_ADDRESSED_MEDIA:
+        return ContentAddressedStorage()
+    return default_storage
@@ -6,7 +6,11 @@ from psycopg2 import OperationalError as Psycopg2OpError
 from django.core.management import call_command
 from django.db.utils import OperationalError
 
-from django.test import SimpleTestCase
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase, TestCase
+from io import StringIO
+
+from product.models import Product, ProductImages
 
 @patch('core.management.commands.wait_for_db.Command.check')
 class CommandTests(SimpleTestCase):
@@ -28,4 +32,38 @@ class CommandTests(SimpleTestCase):
         call_command('wait_for_db')
 
         self.assertEqual(patched_check.call_count, 6)
-        patched_check.assert_called_with(databases=['default'])
\ No newline at end of file
+        patched_check.assert_called_with(databases=['default'])
+
+
+class CleanupOrphanedFilesTests(TestCase):
+    """Test removing image files nothing refers to"""
+
+    def setUp(self):
+        self.storage = ProductImages._meta.get_field('image').storage
+        product = Product.objects.create(name='Pan', category='Kitchen')
+        self.image = ProductImages(product=product)
+        self.image.image.save('kept.jpg', ContentFile(b'jpg'), save=True)
+        self.orphan = self.storage.save(
+            'products/orphan.jpg', ContentFile(b'x')
+        )
+        self.addCleanup(self.storage.delete, self.image.image.name)
+        self.addCleanup(self.storage.delete, self.orphan)
+
+    def test_dry_run_lists_orphans(self):
+        out = StringIO()
+
+        call_command(
+            'cleanup_orphaned_files', dry_run=True, min_age=0, stdout=out
+        )
+
+        self.assertIn(self.orphan, out.getvalue())
+        self.assertNotIn(self.image.image.name, out.getvalue())
+        self.assertTrue(self.storage.exists(self.orphan))
+
+    def test_deletes_only_old_orphans(self):
+        call_command('cleanup_orphaned_files', stdout=StringIO())
+        self.assertTrue(self.storage.exists(self.orphan))
+
+        call_command('cleanup_orphaned_files', min_age=0, stdout=StringIO())
+        self.assertFalse(self.storage.exists(self.orphan))
+        self.assertTrue(self.storage.exists(self.image.image.name))
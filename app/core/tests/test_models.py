@@ -82,3 +82,49 @@ class ModelTests(TestCase):
         self.assertEqual(file_path, f'uploads/recipe/{uuid}.jpg')
 
 
+class RecipeSearchVectorTests(TestCase):
+    """Test the stored recipe search vector is kept current"""
+
+    def setUp(self):
+        self.user = create_user()
+        self.recipe = models.Recipe.objects.create(
+            user=self.user,
+            title='Pad Thai',
+            time_minutes=20,
+            price=Decimal('7.5'),
+            description='Rice noodles',
+        )
+
+    def matches(self, term):
+        return models.Recipe.objects.filter(search_vector=term).exists()
+
+    def test_vector_set_on_save(self):
+        self.assertTrue(self.matches('noodles'))
+
+        self.recipe.title = 'Green curry'
+        self.recipe.save()
+
+        self.assertTrue(self.matches('curry'))
+        self.assertFalse(self.matches('pad'))
+
+    def test_vector_follows_tags_and_ingredients(self):
+        tag = models.Tag.objects.create(user=self.user, name='Spicy')
+        ingredient = models.Ingredient.objects.create(
+            user=self.user, name='Tamarind'
+        )
+        self.recipe.tags.add(tag)
+        self.recipe.ingredients.add(ingredient)
+
+        self.assertTrue(self.matches('spicy'))
+        self.assertTrue(self.matches('tamarind'))
+
+        tag.name = 'Mild'
+        tag.save()
+        self.assertTrue(self.matches('mild'))
+        self.assertFalse(self.matches('spicy'))
+
+        ingredient.delete()
+        self.assertFalse(self.matches('tamarind'))
+
+        tag.recipe_set.clear()
+        self.assertFalse(self.matches('mild'))
@@ -0,0 +1,123 @@
+"""Tests for content-addressed image storage"""
+import shutil
+import tempfile
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.db import DatabaseError
+from django.test import TestCase
+from django.urls import reverse
+from PIL import Image
+from rest_framework.test import APIClient
+
+from core.file_cleanup import flush_file_deletions
+from core.models import Recipe, StoredFile
+from core.storage import ContentAddressedStorage
+from product.models import Product, ProductImages
+
+
+class ContentAddressedStorageTests(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.storage = ContentAddressedStorage(FileSystemStorage(self.root))
+
+    def test_identical_content_stored_once(self):
+        first = self.storage.save('a.JPG', ContentFile(b'same bytes'))
+        second = self.storage.save('other/b.jpg', ContentFile(b'same bytes'))
+        third = self.storage.save('c.jpg', ContentFile(b'different'))
+
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, third)
+        self.assertTrue(first.startswith('cas/') and first.endswith('.jpg'))
+        self.assertEqual(StoredFile.objects.get(path=first).refs, 2)
+        with self.storage.open(first) as stored:
+            self.assertEqual(stored.read(), b'same bytes')
+
+    def test_file_deleted_with_last_reference(self):
+        name = self.storage.save('a.jpg', ContentFile(b'bytes'))
+        self.storage.save('b.jpg', ContentFile(b'bytes'))
+
+        self.storage.delete(name)
+        self.assertTrue(self.storage.exists(name))
+
+        self.storage.delete(name)
+        self.assertFalse(self.storage.exists(name))
+        self.assertFalse(StoredFile.objects.filter(path=name).exists())
+
+    def test_save_retries_when_entry_released_concurrently(self):
+        get_or_create = StoredFile.objects.get_or_create
+        calls = []
+
+        def released_in_between(**kwargs):
+            result = get_or_create(**kwargs)
+            calls.append(kwargs)
+            if len(calls) == 1:
+                StoredFile.objects.filter(**kwargs).delete()
+            return result
+
+        with patch.object(
+            StoredFile.objects, 'get_or_create', released_in_between
+        ):
+            name = self.storage.save('a.jpg', ContentFile(b'bytes'))
+
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(StoredFile.objects.get(path=name).refs, 1)
+        self.assertTrue(self.storage.exists(name))
+
+    def test_untracked_file_deleted_directly(self):
+        self.storage.backend.save('legacy.jpg', ContentFile(b'old'))
+
+        self.storage.delete('legacy.jpg')
+
+        self.assertFalse(self.storage.exists('legacy.jpg'))
+
+    def test_product_image_delete_keeps_shared_file(self):
+        field = ProductImages._meta.get_field('image')
+        product = Product.objects.create(name='Pan', category='Kitchen')
+
+        with patch.object(field, 'storage', self.storage):
+            first = ProductImages(product=product)
+            first.image.save('a.png', ContentFile(b'png'), save=True)
+            second = ProductImages(product=product)
+            second.image.save('b.png', ContentFile(b'png'), save=True)
+            self.assertEqual(first.image.name, second.image.name)
+
+            name = second.image.name
+
+            first.delete()
+            flush_file_deletions(storage=self.storage)
+            self.assertTrue(self.storage.exists(name))
+
+            second.delete()
+            self.assertTrue(self.storage.exists(name))
+            flush_file_deletions(storage=self.storage)
+            self.assertFalse(self.storage.exists(name))
+
+    def test_failed_recipe_upload_releases_reference(self):
+        user = get_user_model().objects.create_user(
+            email='user@example.com', password='password'
+        )
+        recipe = Recipe.objects.create(
+            user=user, title='Soup', time_minutes=5, price=1
+        )
+        client = APIClient()
+        client.force_authenticate(user)
+        upload = tempfile.NamedTemporaryFile(suffix='.png')
+        self.addCleanup(upload.close)
+        Image.new('RGB', (10, 10)).save(upload, format='PNG')
+        upload.seek(0)
+        field = Recipe._meta.get_field('image')
+
+        with patch.object(field, 'storage', self.storage), \
+                patch.object(Recipe, '_do_update', side_effect=DatabaseError):
+            res = client.post(
+                reverse('recipe:recipe-upload-image', args=[recipe.id]),
+                {'image': upload}, format='multipart',
+            )
+
+        self.assertEqual(res.status_code, 500)
+        self.assertFalse(StoredFile.objects.filter(refs__gt=0).exists())
@@ -0,0 +1,55 @@
+"""Product name autocomplete served from an in-process prefix index.
+
+The index is built on first use and follows product saves and deletes
+once their transaction commits; batch creates, which send no signals,
+index their rows explicitly. The CSV import writes with raw SQL and
+drops the index instead, so the next lookup rebuilds it.
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from product.models import Product
+from utils.prefix_index import IndexRegistry
+
+
+def _load_products(scope):
+    return Product.objects.values_list('id', 'name').iterator()
+
+
+product_names = IndexRegistry(_load_products)
+
+
+def autocomplete_products(prefix, limit):
+    return [
+        {'id': pk, 'name': name}
+        for pk, name in product_names.get().search(prefix, limit)
+    ]
+
+
+def index_products(products):
+    """Index products saved without signals, such as by bulk_create"""
+    index = product_names.loaded()
+    if index is not None:
+        names = [(product.pk, product.name) for product in products]
+
+        def add():
+            for pk, name in names:
+                index.add(pk, name)
+        transaction.on_commit(add)
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, **kwargs):
+    index = product_names.loaded()
+    if index is not None:
+        pk, name = instance.pk, instance.name
+        transaction.on_commit(lambda: index.add(pk, name))
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    index = product_names.loaded()
+    if index is not None:
+        pk = instance.pk
+        transaction.on_commit(lambda: index.remove(pk))
@@ -0,0 +1,128 @@
+"""Facet counts for the product list, computed in a single query.
+
+Every requested facet is one grouping set of the same GROUP BY over the
+filtered products, so category and brand counts, the price histogram and
+the rating distribution cost one round trip. Results are cached briefly,
+keyed on the filter values rather than the raw query string.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+from product.models import Category
+from product.pagination import RELEVANCE_SORT
+
+KEY_PREFIX = 'product-api:facets'
+FACETS = ('category', 'brand', 'price', 'rating')
+# Lower bounds of the price histogram buckets; the last one is open ended.
+PRICE_BUCKETS = (0, 25, 50, 100, 250, 500, 1000, 2500)
+MAX_BRANDS = 20
+# Expressions each facet groups on, over the filtered products `p`.
+_GROUP_EXPRESSIONS = {
+    'category': 'p.category',
+    'brand': 'p.brand',
+    'price': 'width_bucket(p.price, %s::numeric[])',
+    'rating': 'floor(p.rating)::int',
+}
+
+
+def parse_facets(value):
+    """Return the facet names in `value`, or raise ValueError"""
+    names = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = sorted(set(names) - set(FACETS))
+    if unknown:
+        raise ValueError(
+            f'Unknown facets {unknown}; choose from {list(FACETS)}.'
+        )
+    return [name for name in FACETS if name in names]
+
+
+def _signature(filterset, facets):
+    filterset.is_valid()
+    data = filterset.form.cleaned_data
+    # Sorting never changes the matches, except that relevance ranking
+    # adds fuzzy matches to a keyword search.
+    fuzzy = bool(data.get('keyword')) and data.get('sort') == RELEVANCE_SORT
+    filters = sorted(
+        (name, str(value))
+        for name, value in data.items()
+        if value not in (None, '') and (name != 'sort' or fuzzy)
+    )
+    return hashlib.md5(repr((filters, facets)).encode()).hexdigest()
+
+
+def _query(queryset, facets):
+    inner, params = (
+        queryset.order_by()
+        .values('category', 'brand', 'price', 'rating')
+        .query.sql_with_params()
+    )
+    columns, select_params = [], []
+    for name in facets:
+        if name == 'price':
+            select_params.append(list(PRICE_BUCKETS))
+        columns.append(f'{_GROUP_EXPRESSIONS[name]} AS {name}_facet')
+    keys = [f'{name}_facet' for name in facets]
+
+    # Bucket in a subquery: GROUP BY would resolve a bare `price` to the
+    # input column rather than to an output alias.
+    sql = (
+        f'SELECT GROUPING({", ".join(keys)}), {", ".join(keys)}, COUNT(*) '
+        f'FROM (SELECT {", ".join(columns)} FROM ({inner}) AS p) AS f '
+        f'GROUP BY GROUPING SETS ({", ".join(f"({key})" for key in keys)})'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [*select_params, *params])
+        return cursor.fetchall()
+
+
+def _format(rows, facets):
+    counts = {name: {} for name in facets}
+    for grouping, *values, count in rows:
+        # GROUPING() has a 0 bit for the column this row is grouped by.
+        for position, name in enumerate(facets):
+            bit = 1 << (len(facets) - 1 - position)
+            if not grouping & bit:
+                counts[name][values[position]] = count
+
+    result = {}
+    if 'category' in counts:
+        result['category'] = [
+            {'value': value, 'count': counts['category'].get(value, 0)}
+            for value, _ in Category.choices
+        ]
+    if 'brand' in counts:
+        brands = sorted(counts['brand'].items(), key=lambda b: (-b[1], b[0]))
+        result['brand'] = [
+            {'value': brand, 'count': count}
+            for brand, count in brands[:MAX_BRANDS]
+        ]
+    if 'price' in counts:
+        bounds = list(PRICE_BUCKETS) + [None]
+        # width_bucket numbers the buckets from 1.
+        result['price'] = [
+            {
+                'min': bounds[i],
+                'max': bounds[i + 1],
+                'count': counts['price'].get(i + 1, 0),
+            }
+            for i in range(len(PRICE_BUCKETS))
+        ]
+    if 'rating' in counts:
+        result['rating'] = [
+            {'value': rating, 'count': counts['rating'].get(rating, 0)}
+            for rating in range(6)
+        ]
+    return result
+
+
+def get_facets(filterset, facets):
+    """Facet counts of the products matched by `filterset`"""
+    key = f'{KEY_PREFIX}:{_signature(filterset, facets)}'
+    result = cache.get(key)
+    if result is None:
+        result = _format(_query(filterset.qs, facets), facets)
+        cache.set(key, result, settings.PRODUCT_FACET_CACHE_TIMEOUT)
+    return result
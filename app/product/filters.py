@@ -1,11 +1,55 @@
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db.models import Q
+from django.db.models.functions import Greatest, Upper
 from django_filters import rest_framework as filters
 from product.models import Product
+from product.pagination import PRODUCT_ORDERINGS, RELEVANCE_SORT
+
+# Fields matched by `keyword`; each has an UPPER(field) trigram index.
+KEYWORD_FIELDS = ('name', 'brand', 'description')
+# Short fields whose similarity to the keyword ranks and tolerates typos.
+SIMILARITY_FIELDS = ('name', 'brand')
 
 class ProductFilter(filters.FilterSet):
-    keyword = filters.CharFilter(field_name="name", lookup_expr='icontains')
+    keyword = filters.CharFilter(method='filter_keyword')
+    sort = filters.ChoiceFilter(
+        choices=[(RELEVANCE_SORT, RELEVANCE_SORT)]
+        + [(key, key) for key in PRODUCT_ORDERINGS],
+        method='filter_sort',
+    )
     min_price = filters.NumberFilter(field_name="price" or 0, lookup_expr="gte")
     max_price = filters.NumberFilter(field_name="price" or 100000, lookup_expr="lte")
 
     class Meta:
         model = Product
         fields = ('keyword' ,'min_price', 'max_price', 'category', 'brand')
+
+    def filter_keyword(self, queryset, name, value):
+        """Substring match on name, brand and description.
+
+        With `sort=relevance` names and brands that are merely similar also
+        match, so typos still find products, and the results are ordered by
+        trigram similarity.
+        """
+        condition = Q()
+        for field in KEYWORD_FIELDS:
+            condition |= Q(**{f'{field}__icontains': value})
+
+        if self.form.cleaned_data.get('sort') != RELEVANCE_SORT:
+            return queryset.filter(condition)
+
+        # Filter on the indexed UPPER() expressions so `%` can use them.
+        queryset = queryset.annotate(**{
+            f'{field}_upper': Upper(field) for field in SIMILARITY_FIELDS
+        })
+        for field in SIMILARITY_FIELDS:
+            condition |= Q(**{f'{field}_upper__trigram_similar': value})
+        return queryset.filter(condition).annotate(relevance=Greatest(*(
+            TrigramSimilarity(field, value) for field in SIMILARITY_FIELDS
+        ))).order_by('-relevance', 'id')
+
+    def filter_sort(self, queryset, name, value):
+        # Relevance ordering is applied by filter_keyword.
+        if value in PRODUCT_ORDERINGS:
+            return queryset.order_by(*PRODUCT_ORDERINGS[value])
+        return queryset
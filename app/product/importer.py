@@ -0,0 +1,203 @@
+"""Streaming CSV catalog import through a COPY-loaded staging table.
+
+Rows are validated with ProductImportSerializer, chunk by chunk, inline
+or in a process pool, and written to a temporary staging table with COPY, so
+memory stays bounded by the chunks in flight whatever the size of the
+file. A single
+INSERT ... ON CONFLICT then moves the staged rows into product_product,
+updating products whose `sku` already exists. Rejected rows go to a CSV
+with the line number and the validation errors; for uploads they are
+kept in `rejects_storage()`, outside MEDIA_ROOT. The product autocomplete
+index is dropped on commit and rebuilt on its next lookup.
+"""
+import csv
+import io
+import json
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db import connection, transaction
+from rest_framework.exceptions import ValidationError
+
+from product.autocomplete import product_names
+from product.models import Product
+from product.serializers import ProductImportSerializer
+
+IMPORT_CHUNK_SIZE = 5000
+IMPORT_FIELDS = ProductImportSerializer.Meta.fields
+REJECT_FIELDS = ('line', 'errors') + IMPORT_FIELDS
+STAGING_TABLE = 'product_import_staging'
+
+STAGING_SQL = f"""
+CREATE TEMPORARY TABLE {STAGING_TABLE} (
+    line integer NOT NULL,
+    sku varchar(64),
+    name varchar(250) NOT NULL,
+    description text NOT NULL,
+    price numeric(7, 2) NOT NULL,
+    brand varchar(200) NOT NULL,
+    category varchar(70) NOT NULL,
+    rating numeric(3, 2) NOT NULL,
+    stock integer NOT NULL
+) ON COMMIT DROP
+"""
+
+# An unquoted empty field is NULL to COPY; only sku may be NULL.
+COPY_SQL = (
+    f'COPY {STAGING_TABLE} (line, {", ".join(IMPORT_FIELDS)}) '
+    'FROM STDIN WITH (FORMAT csv, '
+    'FORCE_NOT_NULL (name, description, brand, category))'
+)
+
+# The last line wins when a file repeats a SKU; rows without one are
+# always inserted. xmax is 0 only for freshly inserted rows.
+UPSERT_SQL = f"""
+WITH upserted AS (
+    INSERT INTO product_product (
+        {", ".join(IMPORT_FIELDS)}, user_id, created_at, updated_at
+    )
+    SELECT DISTINCT ON (COALESCE('sku:' || sku, 'line:' || line))
+        {", ".join(IMPORT_FIELDS)}, %s, now(), now()
+    FROM {STAGING_TABLE}
+    ORDER BY COALESCE('sku:' || sku, 'line:' || line), line DESC
+    ON CONFLICT (sku) DO UPDATE SET
+        {", ".join(
+            f'{field} = EXCLUDED.{field}'
+            for field in IMPORT_FIELDS if field != 'sku'
+        )},
+        updated_at = EXCLUDED.updated_at
+    RETURNING xmax = 0 AS inserted
+)
+SELECT
+    count(*) FILTER (WHERE inserted),
+    count(*) FILTER (WHERE NOT inserted)
+FROM upserted
+"""
+
+
+def rejects_storage():
+    """Private storage for the rejected rows of uploaded imports"""
+    return FileSystemStorage(location=settings.PRODUCT_IMPORT_REJECTS_DIR)
+
+
+def rejects_name(user, report):
+    """Name of a user's rejects file in `rejects_storage()`"""
+    return f'{user.pk}/{report}.csv'
+
+
+def _defaults():
+    return {
+        field: Product._meta.get_field(field).get_default()
+        for field in IMPORT_FIELDS
+    }
+
+
+def validate_chunk(first_line, rows):
+    """Validate consecutive CSV rows starting at `first_line`.
+
+    Returns the COPY values of the valid rows, each prefixed with its line
+    number, and the rejected rows with their line and errors. Runs in a
+    worker process, so it must not touch the database.
+    """
+    serializer = ProductImportSerializer()
+    defaults = _defaults()
+    valid, rejected = [], []
+    for line, row in enumerate(rows, start=first_line):
+        data = {
+            key: value for key, value in row.items()
+            if key in IMPORT_FIELDS and value not in (None, '')
+        }
+        try:
+            validated = {**defaults, **serializer.run_validation(data)}
+        except ValidationError as exc:
+            rejected.append({
+                **row, 'line': line, 'errors': json.dumps(exc.detail)
+            })
+            continue
+        valid.append([line] + [
+            '' if validated[field] is None else str(validated[field])
+            for field in IMPORT_FIELDS
+        ])
+    return valid, rejected
+
+
+def _chunks(rows, size):
+    # Line 1 is the header.
+    chunk, first_line = [], 2
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield first_line, chunk
+            first_line += len(chunk)
+            chunk = []
+    if chunk:
+        yield first_line, chunk
+
+
+def _validated_chunks(rows, chunk_size, workers):
+    """Validate chunks in `workers` processes, yielding them in file order"""
+    if not workers:
+        for first_line, chunk in _chunks(rows, chunk_size):
+            yield validate_chunk(first_line, chunk)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for first_line, chunk in _chunks(rows, chunk_size):
+            pending.append(pool.submit(validate_chunk, first_line, chunk))
+            # Bound the rows held in memory while workers catch up.
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _copy_chunk(cursor, chunk):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows(chunk)
+    buffer.seek(0)
+    cursor.copy_expert(COPY_SQL, buffer)
+
+
+def import_products(stream, user=None, rejects=None,
+                    chunk_size=IMPORT_CHUNK_SIZE, workers=0):
+    """Import a CSV text stream of products.
+
+    `rejects` is an optional text file receiving the rejected rows.
+    `workers` processes validate the chunks; 0 validates them inline,
+    which request handlers must keep to: the pool forks the calling
+    process while it holds a transaction and, in a web worker, while
+    other threads may hold locks.
+    Returns the number of created, updated and rejected rows.
+    """
+    rows = csv.DictReader(stream)
+    if rows.fieldnames is None or 'name' not in rows.fieldnames:
+        raise ValueError('The CSV needs a header row with at least "name".')
+
+    writer = None
+    if rejects:
+        writer = csv.DictWriter(rejects, REJECT_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+
+    rejected = 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(STAGING_SQL)
+        for valid, invalid in _validated_chunks(rows, chunk_size, workers):
+            if valid:
+                _copy_chunk(cursor, valid)
+            if invalid:
+                rejected += len(invalid)
+                if writer:
+                    writer.writerows(invalid)
+
+        cursor.execute(UPSERT_SQL, [user.pk if user else None])
+        created, updated = cursor.fetchone()
+        # Also gone on commit; dropped now for imports in an outer atomic.
+        cursor.execute(f'DROP TABLE {STAGING_TABLE}')
+        # The upsert fired no model signals for the autocomplete index.
+        transaction.on_commit(product_names.clear)
+
+    return {'created': created, 'updated': updated, 'rejected': rejected}
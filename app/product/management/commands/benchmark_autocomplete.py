@@ -0,0 +1,80 @@
+"""Measure the product name autocomplete index"""
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from product.management.commands.benchmark_product_search import (
+    Command as SearchBenchmark,
+    Rollback,
+    WORDS,
+)
+from product.models import Product
+from utils.prefix_index import PrefixIndex
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a throwaway product table, build the autocomplete index over '
+        'it and report build time, memory and lookup latency against '
+        'name__icontains.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100000)
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def _percentiles(self, lookup, prefixes):
+        timings = []
+        for prefix in prefixes:
+            start = time.perf_counter()
+            lookup(prefix)
+            timings.append(time.perf_counter() - start)
+        timings.sort()
+        return (
+            timings[len(timings) // 2],
+            timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+        )
+
+    def _run(self, options):
+        rng = random.Random(options['seed'])
+        SearchBenchmark()._seed(options, rng)
+
+        # Build time includes streaming the names from the database.
+        index = PrefixIndex(
+            Product.objects.values_list('id', 'name').iterator()
+        )
+        stats = index.stats()
+        self.stdout.write(
+            f"{stats['names']} names, {stats['keys']} word keys: "
+            f"built in {stats['build_seconds']:.2f} s, "
+            f"{stats['memory_bytes'] / 2 ** 20:.1f} MiB"
+        )
+
+        prefixes = [
+            rng.choice(WORDS)[:rng.randint(1, 5)]
+            for _ in range(options['queries'])
+        ]
+        variants = [
+            ('index', lambda prefix: index.search(prefix, 10)),
+            ('icontains', lambda prefix: list(
+                Product.objects.filter(name__icontains=prefix)
+                .values_list('id', 'name')[:10]
+            )),
+        ]
+        for name, lookup in variants:
+            p50, p95 = self._percentiles(lookup, prefixes)
+            self.stdout.write(
+                f'{name:>10}: p50 {p50 * 1000:8.3f} ms  '
+                f'p95 {p95 * 1000:8.3f} ms'
+            )
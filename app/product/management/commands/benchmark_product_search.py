@@ -0,0 +1,121 @@
+"""Time product keyword search against the trigram indexes"""
+import random
+import string
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.http import QueryDict
+
+from product.filters import ProductFilter
+from product.models import Category, Product
+
+WORDS = (
+    'laptop', 'phone', 'camera', 'kettle', 'blender', 'canvas', 'speaker',
+    'monitor', 'keyboard', 'toaster', 'printer', 'charger', 'headphones',
+)
+
+
+class Rollback(Exception):
+    """Raised to discard the seeded dataset"""
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a throwaway product table and report p50/p95 latency of '
+        'keyword search, plain and with sort=relevance.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100000)
+        parser.add_argument('--queries', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--explain', action='store_true',
+            help='Print the query plan of each variant'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def _seed(self, options, rng):
+        categories = [choice for choice, _ in Category.choices]
+
+        def word():
+            return rng.choice(WORDS) + ''.join(
+                rng.choices(string.ascii_lowercase, k=3)
+            )
+
+        Product.objects.bulk_create(
+            (
+                Product(
+                    name=f'{word()} {word()} {i}',
+                    brand=word(),
+                    description=' '.join(word() for _ in range(12)),
+                    category=rng.choice(categories),
+                    price=Decimal(rng.randint(100, 99999)) / 100,
+                )
+                for i in range(options['products'])
+            ),
+            batch_size=5000,
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE product_product')
+
+    def _typo(self, rng, keyword):
+        i = rng.randrange(len(keyword))
+        typo = rng.choice(string.ascii_lowercase)
+        return keyword[:i] + typo + keyword[i + 1:]
+
+    def _percentiles(self, params_list):
+        timings = []
+        for params in params_list:
+            queryset = ProductFilter(QueryDict(params)).qs[:20]
+            start = time.perf_counter()
+            list(queryset.values_list('id', flat=True))
+            timings.append(time.perf_counter() - start)
+        timings.sort()
+        return (
+            timings[len(timings) // 2],
+            timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+        )
+
+    def _run(self, options):
+        rng = random.Random(options['seed'])
+        self._seed(options, rng)
+
+        keywords = [rng.choice(WORDS) for _ in range(options['queries'])]
+        variants = [
+            ('keyword', [f'keyword={k}' for k in keywords]),
+            (
+                'relevance',
+                [f'keyword={k}&sort=relevance' for k in keywords],
+            ),
+            (
+                'relevance+typo',
+                [
+                    f'keyword={self._typo(rng, k)}&sort=relevance'
+                    for k in keywords
+                ],
+            ),
+        ]
+
+        self.stdout.write(
+            f"{options['products']} products, {options['queries']} queries "
+            'per variant, first page of 20'
+        )
+        for name, params_list in variants:
+            p50, p95 = self._percentiles(params_list)
+            self.stdout.write(
+                f'{name:>15}: p50 {p50 * 1000:8.2f} ms  '
+                f'p95 {p95 * 1000:8.2f} ms'
+            )
+            if options['explain']:
+                queryset = ProductFilter(QueryDict(params_list[0])).qs[:20]
+                self.stdout.write(queryset.explain(analyze=True))
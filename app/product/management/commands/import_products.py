@@ -0,0 +1,59 @@
+"""Import a product catalog CSV through COPY and a single upsert"""
+import csv
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from product.importer import IMPORT_CHUNK_SIZE, import_products
+
+
+class Command(BaseCommand):
+    help = (
+        'Stream a product CSV into the catalog, updating products whose '
+        'sku already exists. Rejected rows are written to a CSV.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV file with a header row')
+        parser.add_argument(
+            '--rejects',
+            help='Where to write rejected rows (defaults to PATH.rejects.csv)',
+        )
+        parser.add_argument(
+            '--user', help='Email of the user owning new products'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=IMPORT_CHUNK_SIZE
+        )
+        parser.add_argument(
+            '--workers', type=int, default=settings.PRODUCT_IMPORT_WORKERS,
+            help='Processes validating rows; 0 validates them inline',
+        )
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            try:
+                user = get_user_model().objects.get(email=options['user'])
+            except get_user_model().DoesNotExist:
+                raise CommandError(f"No user with email {options['user']}")
+
+        path = options['path']
+        rejects_path = options['rejects'] or f'{path}.rejects.csv'
+        try:
+            with open(path, newline='', encoding='utf-8-sig') as source, \
+                    open(rejects_path, 'w', newline='') as rejects:
+                report = import_products(
+                    source, user, rejects, options['chunk_size'],
+                    options['workers'],
+                )
+        except (OSError, ValueError, csv.Error) as exc:
+            raise CommandError(f'Could not import products: {exc}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {report['created']}, updated {report['updated']}, "
+            f"rejected {report['rejected']} products."
+        ))
+        if report['rejected']:
+            self.stdout.write(f'Rejected rows written to {rejects_path}')
@@ -0,0 +1,17 @@
+"""Recompute the per-category product statistics from scratch"""
+from django.core.management.base import BaseCommand
+
+from product.stats import get_category_stats, rebuild_category_stats
+
+
+class Command(BaseCommand):
+    help = 'Rebuild product_categorystats from product_product.'
+
+    def handle(self, *args, **options):
+        rebuild_category_stats()
+        for row in get_category_stats():
+            self.stdout.write(
+                f"{row['category']:>12}: {row['product_count']} products, "
+                f"{row['total_stock']} in stock"
+            )
+        self.stdout.write(self.style.SUCCESS('Category statistics rebuilt.'))
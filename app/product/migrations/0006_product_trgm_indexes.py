@@ -0,0 +1,28 @@
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+# Django's icontains compiles to `UPPER(col::text) LIKE UPPER(...)`, so the
+# trigram indexes are built on that expression. Django 3.2 cannot declare
+# an operator class on an expression index, hence the raw SQL.
+TRGM_INDEXES = {
+    'product_name_trgm_idx': 'name',
+    'product_brand_trgm_idx': 'brand',
+    'product_description_trgm_idx': 'description',
+}
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('product', '0005_productimages_image_variants'),
+    ]
+
+    operations = [TrigramExtension()] + [
+        migrations.RunSQL(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} '
+            f'ON product_product USING gin (UPPER({column}::text) gin_trgm_ops);',
+            f'DROP INDEX CONCURRENTLY IF EXISTS {name};',
+        )
+        for name, column in TRGM_INDEXES.items()
+    ]
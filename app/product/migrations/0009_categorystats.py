@@ -0,0 +1,101 @@
+# Generated by Django 3.2.25 on 2026-10-18 20:53
+
+from django.db import migrations, models
+
+# Fold the rows a statement changed into the per-category aggregates.
+# min/max are re-read through the (category, price, id) index, which is
+# cheap and stays correct when the current extreme is deleted.
+APPLY_SQL = """
+WITH delta AS (
+    SELECT category, sum(n) AS n, sum(price) AS price, sum(stock) AS stock
+    FROM ({changes}) AS changes
+    GROUP BY category
+)
+INSERT INTO product_categorystats AS s (
+    category, product_count, price_sum, total_stock, min_price, max_price
+)
+SELECT
+    d.category, d.n, d.price, d.stock,
+    (SELECT min(p.price) FROM product_product p WHERE p.category = d.category),
+    (SELECT max(p.price) FROM product_product p WHERE p.category = d.category)
+FROM delta d
+ON CONFLICT (category) DO UPDATE SET
+    product_count = s.product_count + EXCLUDED.product_count,
+    price_sum = s.price_sum + EXCLUDED.price_sum,
+    total_stock = s.total_stock + EXCLUDED.total_stock,
+    min_price = EXCLUDED.min_price,
+    max_price = EXCLUDED.max_price;
+"""
+NEW_ROWS = 'SELECT category, 1 AS n, price, stock FROM new_rows'
+OLD_ROWS = (
+    'SELECT category, -1 AS n, -price AS price, -stock AS stock FROM old_rows'
+)
+
+# Transition tables allow only one event per trigger.
+TRIGGERS = {
+    'INSERT': ('REFERENCING NEW TABLE AS new_rows', NEW_ROWS),
+    'UPDATE': (
+        'REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows',
+        f'{NEW_ROWS} UNION ALL {OLD_ROWS}',
+    ),
+    'DELETE': ('REFERENCING OLD TABLE AS old_rows', OLD_ROWS),
+}
+
+
+def _create_trigger(event, referencing, changes):
+    name = f'product_category_stats_{event.lower()}'
+    return f"""
+CREATE FUNCTION {name}() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+{APPLY_SQL.format(changes=changes)}
+RETURN NULL;
+END
+$$;
+CREATE TRIGGER {name} AFTER {event} ON product_product
+{referencing} FOR EACH STATEMENT EXECUTE FUNCTION {name}();
+"""
+
+
+def _drop_trigger(event):
+    name = f'product_category_stats_{event.lower()}'
+    return (
+        f'DROP TRIGGER IF EXISTS {name} ON product_product; '
+        f'DROP FUNCTION IF EXISTS {name}();'
+    )
+
+
+BACKFILL_SQL = """
+INSERT INTO product_categorystats (
+    category, product_count, price_sum, total_stock, min_price, max_price
+)
+SELECT category, count(*), sum(price), sum(stock), min(price), max(price)
+FROM product_product
+GROUP BY category;
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0008_product_sku'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryStats',
+            fields=[
+                ('category', models.CharField(choices=[('Laptop', 'Laptop'), ('Electronics', 'Electronics'), ('Art', 'Art'), ('Food', 'Food'), ('Home', 'Home'), ('Kitchen', 'Kitchen')], max_length=70, primary_key=True, serialize=False)),
+                ('product_count', models.IntegerField(default=0)),
+                ('price_sum', models.DecimalField(decimal_places=2, default=0, max_digits=19)),
+                ('min_price', models.DecimalField(decimal_places=2, max_digits=7, null=True)),
+                ('max_price', models.DecimalField(decimal_places=2, max_digits=7, null=True)),
+                ('total_stock', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunSQL(BACKFILL_SQL, migrations.RunSQL.noop),
+    ] + [
+        migrations.RunSQL(
+            _create_trigger(event, referencing, changes), _drop_trigger(event)
+        )
+        for event, (referencing, changes) in TRIGGERS.items()
+    ]
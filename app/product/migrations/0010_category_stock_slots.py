@@ -0,0 +1,165 @@
+# Generated by Django 3.2.25 on 2026-10-18 21:19
+
+# Replace the 0009 triggers. Those read min/max in the statement's snapshot
+# before the upsert waited on the stats row, so concurrent writers could
+# store stale extremes, and every stock change held its category's stats
+# row until commit. Now the stats rows of a statement's categories are
+# created if missing and locked in category order first; the deltas and
+# then min/max are applied in later statements, which see everything the
+# writers they waited for committed. Only rows whose category or price
+# changed touch the stats rows at all; stock totals go to
+# CategoryStockSlot rows keyed by product id % SLOTS, so stock
+# adjustments in one category only contend when their products share a
+# slot.
+import importlib
+
+from django.db import migrations, models
+
+initial = importlib.import_module('product.migrations.0009_categorystats')
+
+SLOTS = 16
+EVENTS = ('INSERT', 'UPDATE', 'DELETE')
+
+# Rows changing count/price aggregates, as (category, n, price).
+NEW_ROWS = 'SELECT category, 1 AS n, price FROM new_rows'
+OLD_ROWS = 'SELECT category, -1 AS n, -price AS price FROM old_rows'
+MOVED = (
+    'FROM new_rows n JOIN old_rows o USING (id) '
+    'WHERE (n.category, n.price) IS DISTINCT FROM (o.category, o.price)'
+)
+# Rows changing stock totals, as (category, slot, stock).
+NEW_STOCK = f'SELECT category, id % {SLOTS} AS slot, stock::bigint AS stock FROM new_rows'
+OLD_STOCK = f'SELECT category, id % {SLOTS} AS slot, -stock::bigint AS stock FROM old_rows'
+RESTOCKED = (
+    'FROM new_rows n JOIN old_rows o USING (id) '
+    'WHERE (n.category, n.stock) IS DISTINCT FROM (o.category, o.stock)'
+)
+
+CHANGES = {
+    'INSERT': (NEW_ROWS, NEW_STOCK),
+    'DELETE': (OLD_ROWS, OLD_STOCK),
+    'UPDATE': (
+        f'SELECT n.category, 1 AS n, n.price {MOVED} UNION ALL '
+        f'SELECT o.category, -1 AS n, -o.price {MOVED}',
+        f'SELECT n.category, n.id % {SLOTS} AS slot, n.stock::bigint AS stock '
+        f'{RESTOCKED} UNION ALL '
+        f'SELECT o.category, o.id % {SLOTS} AS slot, -o.stock::bigint AS stock '
+        f'{RESTOCKED}',
+    ),
+}
+
+APPLY_SQL = """
+INSERT INTO product_categorystats (
+    category, product_count, price_sum, min_price, max_price
+)
+SELECT DISTINCT category, 0, 0, NULL::numeric, NULL::numeric
+FROM ({changes}) AS c
+ORDER BY category
+ON CONFLICT (category) DO NOTHING;
+
+PERFORM 1 FROM product_categorystats
+WHERE category IN (SELECT category FROM ({changes}) AS c)
+ORDER BY category
+FOR UPDATE;
+
+UPDATE product_categorystats AS s
+SET product_count = s.product_count + d.n, price_sum = s.price_sum + d.price
+FROM (
+    SELECT category, sum(n) AS n, sum(price) AS price
+    FROM ({changes}) AS c
+    GROUP BY category
+) AS d
+WHERE s.category = d.category;
+
+UPDATE product_categorystats AS s
+SET min_price = (
+        SELECT min(p.price) FROM product_product p
+        WHERE p.category = s.category
+    ),
+    max_price = (
+        SELECT max(p.price) FROM product_product p
+        WHERE p.category = s.category
+    )
+WHERE s.category IN (SELECT category FROM ({changes}) AS c);
+
+INSERT INTO product_categorystockslot AS t (category, slot, total_stock)
+SELECT category, slot, sum(stock)
+FROM ({stock_changes}) AS c
+GROUP BY category, slot
+ORDER BY category, slot
+ON CONFLICT (category, slot) DO UPDATE
+SET total_stock = t.total_stock + EXCLUDED.total_stock;
+"""
+
+
+def _create_trigger(event):
+    changes, stock_changes = CHANGES[event]
+    referencing = initial.TRIGGERS[event][0]
+    name = f'product_category_stats_{event.lower()}'
+    body = APPLY_SQL.format(changes=changes, stock_changes=stock_changes)
+    return f"""
+CREATE FUNCTION {name}() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+{body}
+RETURN NULL;
+END
+$$;
+CREATE TRIGGER {name} AFTER {event} ON product_product
+{referencing} FOR EACH STATEMENT EXECUTE FUNCTION {name}();
+"""
+
+
+def _create_initial_trigger(event):
+    referencing, changes = initial.TRIGGERS[event]
+    return initial._create_trigger(event, referencing, changes)
+
+
+BACKFILL_SLOTS_SQL = f"""
+INSERT INTO product_categorystockslot (category, slot, total_stock)
+SELECT category, id % {SLOTS}, sum(stock)
+FROM product_product
+GROUP BY category, id % {SLOTS};
+"""
+RESTORE_TOTAL_STOCK_SQL = """
+UPDATE product_categorystats AS s
+SET total_stock = COALESCE((
+    SELECT sum(t.total_stock) FROM product_categorystockslot t
+    WHERE t.category = s.category
+), 0);
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0009_categorystats'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            [initial._drop_trigger(event) for event in EVENTS],
+            [_create_initial_trigger(event) for event in EVENTS],
+        ),
+        migrations.CreateModel(
+            name='CategoryStockSlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(choices=[('Laptop', 'Laptop'), ('Electronics', 'Electronics'), ('Art', 'Art'), ('Food', 'Food'), ('Home', 'Home'), ('Kitchen', 'Kitchen')], max_length=70)),
+                ('slot', models.SmallIntegerField()),
+                ('total_stock', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='categorystockslot',
+            constraint=models.UniqueConstraint(fields=('category', 'slot'), name='product_stock_slot_uniq'),
+        ),
+        migrations.RunSQL(BACKFILL_SLOTS_SQL, RESTORE_TOTAL_STOCK_SQL),
+        migrations.RemoveField(
+            model_name='categorystats',
+            name='total_stock',
+        ),
+        migrations.RunSQL(
+            [_create_trigger(event) for event in EVENTS],
+            [initial._drop_trigger(event) for event in EVENTS],
+        ),
+    ]
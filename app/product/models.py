@@ -1,8 +1,14 @@
 
+import threading
+
 from django.db import models
 from django.conf import settings
 from django.dispatch import receiver
-from django.db.models.signals import post_delete
+from django.db.models.functions import Now
+from django.db.models.signals import post_delete, post_save
+from core.file_cleanup import enqueue_file_deletions
+from core.storage import get_image_storage
+from utils.image_variants import variants_generated
 # Create your models here.
 
 class Category(models.TextChoices):
@@ -14,6 +20,8 @@ class Category(models.TextChoices):
     KITCHEN = 'Kitchen'
 
 class Product(models.Model):
+    # Supplier stock keeping unit; catalog imports upsert on it.
+    sku = models.CharField(max_length=64, unique=True, null=True, blank=True)
     name = models.CharField(max_length=250, default="", blank=False)
     description = models.TextField(max_length=1000, default="", blank=False)
     price = models.DecimalField(max_digits=7, decimal_places=2, default=0)
@@ -23,15 +31,124 @@ class Product(models.Model):
     stock = models.IntegerField(default=0)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True)
     created_at= models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        # One index per sort order for the whole catalog and one for
+        # browsing a category; see product.pagination.PRODUCT_ORDERINGS.
+        indexes = [
+            models.Index(fields=['category', 'id'], name='product_cat_id_idx'),
+            models.Index(fields=['price', 'id'], name='product_price_idx'),
+            models.Index(
+                fields=['category', 'price', 'id'],
+                name='product_cat_price_idx',
+            ),
+            models.Index(fields=['rating', 'id'], name='product_rating_idx'),
+            models.Index(
+                fields=['category', 'rating', 'id'],
+                name='product_cat_rating_idx'
+            ),
+            models.Index(
+                fields=['created_at', 'id'], name='product_created_idx'
+            ),
+            models.Index(
+                fields=['category', 'created_at', 'id'],
+                name='product_cat_created_idx'
+            ),
+            models.Index(fields=['stock', 'id'], name='product_stock_idx'),
+            models.Index(
+                fields=['category', 'stock', 'id'],
+                name='product_cat_stock_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.name
 
+    def delete(self, *args, **kwargs):
+        deleting = _deleting_products()
+        deleting.add(self.pk)
+        try:
+            return super().delete(*args, **kwargs)
+        finally:
+            deleting.discard(self.pk)
+
+
+class CategoryStats(models.Model):
+    """Per-category product aggregates.
+
+    Kept current by statement-level triggers on product_product (see
+    migration 0010), so raw SQL writes such as the COPY import and stock
+    adjustments are counted too. `manage.py rebuild_category_stats`
+    recomputes it from scratch. Stock totals live in CategoryStockSlot.
+    """
+    category = models.CharField(
+        max_length=70, choices=Category.choices, primary_key=True
+    )
+    product_count = models.IntegerField(default=0)
+    price_sum = models.DecimalField(max_digits=19, decimal_places=2, default=0)
+    min_price = models.DecimalField(max_digits=7, decimal_places=2, null=True)
+    max_price = models.DecimalField(max_digits=7, decimal_places=2, null=True)
+
+    def __str__(self):
+        return self.category
+
+
+class CategoryStockSlot(models.Model):
+    """Part of a category's stock total, for the products with id % 16 == slot.
+
+    Stock changes only lock the slot row of each product, so concurrent
+    stock adjustments in one category rarely wait on each other; a
+    category's total is the sum of its slots.
+    """
+    SLOTS = 16
+
+    category = models.CharField(max_length=70, choices=Category.choices)
+    slot = models.SmallIntegerField()
+    total_stock = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['category', 'slot'], name='product_stock_slot_uniq'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.category}/{self.slot}'
+
 class ProductImages(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, null=True, related_name='images')
-    image = models.ImageField(upload_to='products/', )
+    image = models.ImageField(upload_to='products/', storage=get_image_storage)
+    image_variants = models.JSONField(default=dict, blank=True)
+
+
+# Products being deleted by Product.delete in this thread. The cascade
+# deletes their images, and touching the product once per image would
+# only add writes to a row that is about to go.
+_deleting = threading.local()
+
+
+def _deleting_products():
+    if not hasattr(_deleting, 'pks'):
+        _deleting.pks = set()
+    return _deleting.pks
+
+
+@receiver(post_save, sender=ProductImages)
+@receiver(post_delete, sender=ProductImages)
+@receiver(variants_generated, sender=ProductImages)
+def touch_product(sender, instance, **kwargs):
+    """Images are part of the product payload, so bump its version"""
+    if instance.product_id in _deleting_products():
+        return
+    Product.objects.filter(pk=instance.product_id).update(updated_at=Now())
 
 @receiver(post_delete, sender=ProductImages)
 def auto_delete_image(sender, instance,**kwargs):
+    # The files are removed by a background flush after commit; with
+    # content-addressed storage that only drops a reference.
     if instance.image:
-        instance.image.delete(save=False)
+        enqueue_file_deletions(
+            [instance.image.name, *instance.image_variants.values()]
+        )
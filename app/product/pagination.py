@@ -0,0 +1,167 @@
+"""Page number and keyset pagination for the product list"""
+from django.core.exceptions import ValidationError
+from django.core.paginator import InvalidPage, Paginator
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from utils.keyset import (
+    cursor_values,
+    decode_cursor,
+    encode_cursor,
+    keyset_filter,
+)
+
+# Every ordering ends with a unique tiebreaker so the keyset is total.
+# Each one is backed by a (col, id) and a (category, col, id) index on
+# product.Product.
+PRODUCT_ORDERINGS = {
+    'id': ('id',),
+    'price': ('price', 'id'),
+    '-price': ('-price', '-id'),
+    'rating': ('rating', 'id'),
+    '-rating': ('-rating', '-id'),
+    'created_at': ('created_at', 'id'),
+    '-created_at': ('-created_at', '-id'),
+    'stock': ('stock', 'id'),
+    '-stock': ('-stock', '-id'),
+}
+DEFAULT_PRODUCT_ORDERING = 'id'
+RELEVANCE_SORT = 'relevance'
+
+
+def get_product_ordering(request):
+    """Return the requested ordering key, or None for relevance ranking"""
+    sort = request.query_params.get('sort', DEFAULT_PRODUCT_ORDERING)
+    if sort == RELEVANCE_SORT and request.query_params.get('keyword'):
+        return None
+    if sort not in PRODUCT_ORDERINGS:
+        return DEFAULT_PRODUCT_ORDERING
+    return sort
+
+
+class CountedPaginator(Paginator):
+    """Paginator that can reuse a count the caller already has"""
+
+    def __init__(self, object_list, per_page, count=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        if count is not None:
+            # Overrides the cached_property, so no COUNT(*) is issued.
+            self.count = count
+
+
+class ProductPagination(PageNumberPagination):
+    """Page numbers with a client page size and an optional count-free mode.
+
+    With `count=false` the total is never computed: one extra row is
+    fetched to tell whether a next page exists and `count` is `None`.
+    Count-free `next` links carry a keyset `cursor` instead of a page
+    number, so following them costs the same at any depth. Relevance
+    ranked searches have no keyset and keep using page numbers.
+    """
+    page_size = 20
+    max_page_size = 100
+    page_size_query_param = 'page_size'
+    count_query_param = 'count'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+    django_paginator_class = CountedPaginator
+
+    def counts_enabled(self, request):
+        if request.query_params.get(self.cursor_query_param):
+            return False
+        value = request.query_params.get(self.count_query_param, '')
+        return value.lower() not in ('0', 'false', 'no')
+
+    def paginate_queryset(self, queryset, request, view=None, count=None):
+        """Return the rows of the requested page.
+
+        `count` is the size of `queryset` when the caller already knows it.
+        """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.with_count = self.counts_enabled(request)
+        self.ordering_key = get_product_ordering(request)
+        self.cursor = request.query_params.get(self.cursor_query_param)
+        if self.with_count:
+            paginator = self.django_paginator_class(
+                queryset, self.page_size, count=count
+            )
+            self.page = self._get_page(paginator, request)
+            self.count = paginator.count
+            self.page_number = self.page.number
+            self.has_next = self.page.has_next()
+            return list(self.page)
+
+        self.count = None
+        if self.cursor:
+            queryset = self._after_cursor(queryset)
+            offset = 0
+        else:
+            offset = (self._get_page_number(request) - 1) * self.page_size
+
+        rows = list(queryset[offset:offset + self.page_size + 1])
+        if not rows and offset:
+            raise NotFound(self.invalid_page_message)
+        self.has_next = len(rows) > self.page_size
+        self.rows = rows[:self.page_size]
+        return self.rows
+
+    def _get_page(self, paginator, request):
+        page_number = self.get_page_number(request, paginator)
+        try:
+            return paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(
+                page_number=page_number, message=str(exc)
+            ))
+
+    def _get_page_number(self, request):
+        try:
+            self.page_number = int(
+                request.query_params.get(self.page_query_param, 1)
+            )
+            if self.page_number < 1:
+                raise ValueError
+        except ValueError:
+            raise NotFound(self.invalid_page_message)
+        return self.page_number
+
+    def _after_cursor(self, queryset):
+        if self.ordering_key is None:
+            raise NotFound(self.invalid_cursor_message)
+        ordering = PRODUCT_ORDERINGS[self.ordering_key]
+        try:
+            values = decode_cursor(self.cursor, self.ordering_key, ordering)
+            return queryset.filter(
+                keyset_filter(ordering, values)
+            ).order_by(*ordering)
+        except (ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        if self.with_count or self.ordering_key is None:
+            return replace_query_param(
+                url, self.page_query_param, self.page_number + 1
+            )
+
+        ordering = PRODUCT_ORDERINGS[self.ordering_key]
+        cursor = encode_cursor(
+            self.ordering_key, cursor_values(self.rows[-1], ordering)
+        )
+        url = remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_previous_link(self):
+        # Keyset pages only move forward.
+        if self.cursor or self.page_number <= 1:
+            return None
+        url = self.request.build_absolute_uri()
+        if self.page_number == 2:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(
+            url, self.page_query_param, self.page_number - 1
+        )
@@ -1,12 +1,21 @@
 from rest_framework import serializers
+from rest_framework.settings import api_settings
 from product.models import Product, ProductImages
+from utils.image_variants import variant_urls
 
 
 class ProductImageSerializer(serializers.ModelSerializer):
+    image_variants = serializers.SerializerMethodField()
+
     class Meta:
         model = ProductImages
         fields = '__all__'
 
+    def get_image_variants(self, obj):
+        return variant_urls(
+            obj.image, obj.image_variants, self.context.get('request')
+        )
+
 class ProductSerializer(serializers.ModelSerializer):
     images = ProductImageSerializer(many=True, read_only=True)
     class Meta:
@@ -17,3 +26,83 @@ class ProductSerializer(serializers.ModelSerializer):
             'name': {'required': True, 'allow_blank': False}
         }
 
+
+class ProductImportSerializer(ProductSerializer):
+    """Validates one catalog import row; the owner comes from the importer"""
+
+    class Meta(ProductSerializer.Meta):
+        fields = (
+            'sku', 'name', 'description', 'price', 'brand', 'category',
+            'rating', 'stock',
+        )
+        extra_kwargs = {
+            **ProductSerializer.Meta.extra_kwargs,
+            # Existing SKUs are updated by the upsert, not rejected.
+            'sku': {'validators': []},
+        }
+
+
+class ProductBatchListSerializer(serializers.ListSerializer):
+    """Keeps the valid items of a batch instead of rejecting all of them.
+
+    `validated_data` holds the valid items and `item_errors` the index and
+    errors of each invalid one. `save()` inserts with one bulk_create.
+    """
+    max_items = 1000
+    default_error_messages = {
+        **serializers.ListSerializer.default_error_messages,
+        'max_items': 'Ensure this list has at most {max_items} items.',
+    }
+
+    def to_internal_value(self, data):
+        self.item_errors = []
+        if not isinstance(data, list) or not data:
+            # Non-lists and, unless allowed, empty lists fail as a whole.
+            return super().to_internal_value(data)
+        if len(data) > self.max_items:
+            raise serializers.ValidationError({
+                api_settings.NON_FIELD_ERRORS_KEY: [
+                    self.error_messages['max_items'].format(
+                        max_items=self.max_items
+                    )
+                ]
+            }, code='max_items')
+
+        valid = []
+        for index, item in enumerate(data):
+            try:
+                valid.append(self.child.run_validation(item))
+            except serializers.ValidationError as exc:
+                self.item_errors.append({'index': index, 'errors': exc.detail})
+        return valid
+
+    def create(self, validated_data):
+        return Product.objects.bulk_create(
+            [Product(**attrs) for attrs in validated_data]
+        )
+
+
+class ProductCreateSerializer(ProductSerializer):
+    """A new product; the owner comes from the request"""
+
+    class Meta(ProductSerializer.Meta):
+        fields = (
+            'id', 'name', 'description', 'stock', 'price', 'rating',
+            'brand', 'category', 'user',
+        )
+        read_only_fields = ('user',)
+
+
+class ProductBatchSerializer(ProductCreateSerializer):
+    """One item of a batch create"""
+
+    class Meta(ProductCreateSerializer.Meta):
+        list_serializer_class = ProductBatchListSerializer
+
+
+class StockAdjustmentSerializer(serializers.Serializer):
+    """One relative stock change; negative deltas take stock out"""
+    product = serializers.IntegerField(min_value=1)
+    delta = serializers.IntegerField(
+        min_value=-2 ** 31 + 1, max_value=2 ** 31 - 1
+    )
@@ -0,0 +1,66 @@
+"""Read and rebuild the per-category product statistics"""
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from product.models import Category, CategoryStats, CategoryStockSlot
+
+REBUILD_SQL = """
+INSERT INTO product_categorystats (
+    category, product_count, price_sum, min_price, max_price
+)
+SELECT category, count(*), sum(price), min(price), max(price)
+FROM product_product
+GROUP BY category
+"""
+REBUILD_SLOTS_SQL = """
+INSERT INTO product_categorystockslot (category, slot, total_stock)
+SELECT category, id %% %s, sum(stock)
+FROM product_product
+GROUP BY category, id %% %s
+"""
+CENT = Decimal('0.01')
+
+
+def get_category_stats():
+    """Statistics for every category, zero-filled, from the summary table"""
+    slots = CategoryStockSlot.objects.filter(
+        category=OuterRef('category')
+    ).values('category').annotate(total=Sum('total_stock')).values('total')
+    stats = {
+        row.category: row for row in CategoryStats.objects.annotate(
+            total_stock=Coalesce(Subquery(slots), Value(0))
+        )
+    }
+    result = []
+    for category, _ in Category.choices:
+        row = stats.get(category)
+        if row is None:
+            row = CategoryStats(category=category)
+            row.total_stock = 0
+        count = row.product_count
+        result.append({
+            'category': category,
+            'product_count': count,
+            'avg_price': (
+                (row.price_sum / count).quantize(CENT) if count else None
+            ),
+            'min_price': row.min_price,
+            'max_price': row.max_price,
+            'total_stock': row.total_stock,
+        })
+    return result
+
+
+def rebuild_category_stats():
+    """Recompute the summary table from product_product"""
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Let in-flight writes finish and hold off new ones meanwhile, so
+        # no trigger delta is lost or counted twice.
+        cursor.execute('LOCK TABLE product_product IN SHARE MODE')
+        cursor.execute('DELETE FROM product_categorystats')
+        cursor.execute('DELETE FROM product_categorystockslot')
+        cursor.execute(REBUILD_SQL)
+        cursor.execute(REBUILD_SLOTS_SQL, [CategoryStockSlot.SLOTS] * 2)
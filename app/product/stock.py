@@ -0,0 +1,81 @@
+"""Relative stock adjustments applied in a single conditional UPDATE.
+
+No row is read first: each product's stock moves by the sum of its deltas
+only if it would stay within 0 and MAX_STOCK, and the row lock taken by the
+UPDATE serialises concurrent checkouts, which re-check the condition
+against the committed stock instead of overwriting it.
+"""
+from django.db import OperationalError, connection, transaction
+
+# Joining the batch against product_product in the same statement reads
+# the pre-update snapshot, which explains why an adjustment was rejected.
+ADJUST_SQL = """
+WITH adjustment AS (
+    SELECT product_id, sum(delta)::bigint AS delta
+    FROM unnest(%s::bigint[], %s::integer[]) AS a(product_id, delta)
+    GROUP BY product_id
+), updated AS (
+    UPDATE product_product AS p
+    SET stock = (p.stock + adjustment.delta)::integer, updated_at = now()
+    FROM adjustment
+    WHERE p.id = adjustment.product_id
+        AND p.stock + adjustment.delta BETWEEN 0 AND %s
+    RETURNING p.id, p.stock
+)
+SELECT adjustment.product_id, adjustment.delta, updated.stock, p.id, p.stock
+FROM adjustment
+LEFT JOIN updated ON updated.id = adjustment.product_id
+LEFT JOIN product_product AS p ON p.id = adjustment.product_id
+ORDER BY adjustment.product_id
+"""
+# Largest value of the integer stock column; the sum is taken as bigint
+# so an overflowing batch is rejected instead of failing the statement.
+MAX_STOCK = 2 ** 31 - 1
+DEADLOCK_RETRIES = 3
+
+
+def _apply(product_ids, deltas):
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(ADJUST_SQL, [product_ids, deltas, MAX_STOCK])
+        return cursor.fetchall()
+
+
+def adjust_stock(adjustments):
+    """Apply `(product_id, delta)` pairs; returns `(applied, rejected)`.
+
+    Deltas for the same product are summed and succeed or fail together.
+    """
+    product_ids = [product_id for product_id, _ in adjustments]
+    deltas = [delta for _, delta in adjustments]
+    if not adjustments:
+        return [], []
+
+    for attempt in range(DEADLOCK_RETRIES):
+        try:
+            rows = _apply(product_ids, deltas)
+            break
+        except OperationalError as exc:
+            # Two batches locking shared products in a different order.
+            deadlock = getattr(exc.__cause__, 'pgcode', None) == '40P01'
+            if not deadlock or attempt == DEADLOCK_RETRIES - 1:
+                raise
+
+    applied, rejected = [], []
+    for product_id, delta, new_stock, existing_id, current_stock in rows:
+        if new_stock is not None:
+            applied.append({'product': product_id, 'stock': new_stock})
+        elif existing_id is None:
+            rejected.append({
+                'product': product_id, 'delta': delta, 'reason': 'not_found',
+            })
+        elif current_stock + delta > MAX_STOCK:
+            rejected.append({
+                'product': product_id, 'delta': delta,
+                'reason': 'out_of_range', 'stock': current_stock,
+            })
+        else:
+            rejected.append({
+                'product': product_id, 'delta': delta,
+                'reason': 'insufficient_stock', 'stock': current_stock,
+            })
+    return applied, rejected
@@ -1,3 +1,1437 @@
-from django.test import TestCase
+import csv
+import io
+import os
+import shutil
+import tempfile
+import threading
+from decimal import Decimal
+from unittest.mock import patch
 
-# Create your tests here.
+from PIL import Image
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.db.models import Count, F, Max, Min, Sum
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.file_cleanup import flush_file_deletions
+from core.models import PendingFileDeletion
+from product.autocomplete import product_names
+from product.filters import ProductFilter
+from product.importer import import_products
+from product.models import (
+    CategoryStats, CategoryStockSlot, Product, ProductImages,
+)
+from product.serializers import ProductSerializer
+from product.stats import get_category_stats
+from product.stock import adjust_stock
+from utils.image_resize import ResizeCache, resize_image
+from utils import image_variants
+from utils.image_variants import generate_variants
+
+PRODUCTS_URL = reverse('products')
+UPLOAD_URL = reverse('upload_product_images')
+
+
+def product_url(product_id):
+    return reverse('get_product_details', args=[product_id])
+
+
+def create_product(**params):
+    defaults = {
+        'name': 'Laptop',
+        'description': 'Fast',
+        'price': 999,
+        'brand': 'Acme',
+        'category': 'Laptop',
+        'stock': 5,
+    }
+    defaults.update(params)
+    return Product.objects.create(**defaults)
+
+
+class ProductETagTests(TestCase):
+    """Test conditional GET on products"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.product = create_product()
+
+    def test_product_not_modified_skips_serialization(self):
+        etag = self.client.get(product_url(self.product.id))['ETag']
+
+        with patch.object(ProductSerializer, 'to_representation') as patched:
+            res = self.client.get(
+                product_url(self.product.id), HTTP_IF_NONE_MATCH=etag
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        patched.assert_not_called()
+
+    def test_product_fetched_once(self):
+        # The product, then its images.
+        with self.assertNumQueries(2):
+            etag = self.client.get(product_url(self.product.id))['ETag']
+        with self.assertNumQueries(1):
+            self.client.get(
+                product_url(self.product.id), HTTP_IF_NONE_MATCH=etag
+            )
+
+    def test_product_etag_changes_on_update(self):
+        etag = self.client.get(product_url(self.product.id))['ETag']
+
+        self.product.stock = 1
+        self.product.save()
+        res = self.client.get(
+            product_url(self.product.id), HTTP_IF_NONE_MATCH=etag
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['product']['stock'], 1)
+
+    def test_missing_product_is_not_found(self):
+        res = self.client.get(product_url(0), HTTP_IF_NONE_MATCH='*')
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_products_not_modified_skips_serialization(self):
+        etag = self.client.get(PRODUCTS_URL)['ETag']
+
+        with patch.object(ProductSerializer, 'to_representation') as patched:
+            res = self.client.get(PRODUCTS_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        patched.assert_not_called()
+
+    def test_products_etag_changes_on_create_and_delete(self):
+        etag = self.client.get(PRODUCTS_URL)['ETag']
+        create_product(name='Phone')
+        res = self.client.get(PRODUCTS_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        etag = res['ETag']
+        self.product.delete()
+        res = self.client.get(PRODUCTS_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+
+class ProductPaginationTests(TestCase):
+    """Test paging through the product list"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.products = []
+        for i in range(5):
+            product = create_product(name=f'Laptop {i}')
+            for _ in range(2):
+                ProductImages.objects.create(
+                    product=product, image=f'products/{i}.jpg'
+                )
+            self.products.append(product)
+
+    def test_page_size_param(self):
+        res = self.client.get(PRODUCTS_URL, {'page_size': 2, 'page': 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['reqPerPage'], 2)
+        self.assertEqual(res.data['count'], 5)
+        self.assertEqual(
+            [p['id'] for p in res.data['products']],
+            [p.id for p in self.products[2:4]],
+        )
+        self.assertIn('page=3', res.data['next'])
+        self.assertNotIn('page=', res.data['previous'])
+
+    def test_page_size_is_capped(self):
+        with patch('product.pagination.ProductPagination.max_page_size', 3):
+            res = self.client.get(PRODUCTS_URL, {'page_size': 1000})
+
+        self.assertEqual(res.data['reqPerPage'], 3)
+        self.assertEqual(len(res.data['products']), 3)
+
+    def test_invalid_page_returns_404(self):
+        res = self.client.get(PRODUCTS_URL, {'page': 9})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_page_queries_are_constant(self):
+        # Aggregate (ETag and count), page, prefetched images.
+        with self.assertNumQueries(3):
+            res = self.client.get(PRODUCTS_URL, {'page_size': 2})
+        self.assertEqual(len(res.data['products'][0]['images']), 2)
+
+        for i in range(5):
+            product = create_product(name=f'Phone {i}')
+            ProductImages.objects.create(
+                product=product, image='products/p.jpg'
+            )
+
+        with self.assertNumQueries(3):
+            res = self.client.get(PRODUCTS_URL, {'page_size': 10})
+        self.assertEqual(len(res.data['products']), 10)
+
+    def test_count_is_computed_once(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(PRODUCTS_URL, {'page_size': 2})
+
+        counts = [q for q in ctx.captured_queries if 'COUNT(' in q['sql']]
+        self.assertEqual(len(counts), 1)
+
+    def test_count_free_mode(self):
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(
+                PRODUCTS_URL, {'page_size': 2, 'page': 3, 'count': 'false'}
+            )
+
+        self.assertEqual(len(ctx.captured_queries), 2)
+        self.assertFalse(
+            any('COUNT(' in q['sql'] for q in ctx.captured_queries)
+        )
+        self.assertIsNone(res.data['count'])
+        self.assertIsNone(res.data['next'])
+        self.assertEqual(
+            [p['id'] for p in res.data['products']], [self.products[4].id]
+        )
+
+        res = self.client.get(
+            PRODUCTS_URL, {'page_size': 2, 'count': 'false'}
+        )
+        self.assertIn('cursor=', res.data['next'])
+
+    def test_count_free_mode_etag(self):
+        params = {'page_size': 2, 'count': 'false'}
+        etag = self.client.get(PRODUCTS_URL, params)['ETag']
+
+        res = self.client.get(PRODUCTS_URL, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.products[0].stock = 0
+        self.products[0].save()
+        res = self.client.get(PRODUCTS_URL, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+
+class ProductSearchTests(TestCase):
+    """Test trigram-backed keyword search"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.laptop = create_product(name='Gaming Laptop', brand='Zentra')
+        self.kettle = create_product(
+            name='Kettle', brand='Boilwell', category='Kitchen',
+            description='Steel kettle with a laptop-sized footprint',
+        )
+        self.mixer = create_product(
+            name='Stand Mixer', brand='Whiskit', category='Kitchen',
+            description='Bakes bread',
+        )
+
+    def _search(self, **params):
+        res = self.client.get(PRODUCTS_URL, params)
+        return [p['id'] for p in res.data['products']]
+
+    def test_keyword_matches_name_brand_and_description(self):
+        self.assertEqual(
+            self._search(keyword='LAPTOP'), [self.laptop.id, self.kettle.id]
+        )
+        self.assertEqual(self._search(keyword='whisk'), [self.mixer.id])
+
+    def test_relevance_tolerates_typos(self):
+        self.assertEqual(self._search(keyword='Gamng Laptp'), [])
+
+        ids = self._search(keyword='Gamng Laptp', sort='relevance')
+
+        self.assertEqual(ids, [self.laptop.id])
+
+    def test_relevance_orders_by_similarity(self):
+        ids = self._search(keyword='laptop', sort='relevance')
+
+        self.assertEqual(ids, [self.laptop.id, self.kettle.id])
+
+    def test_search_uses_trigram_indexes(self):
+        queryset = ProductFilter({'keyword': 'laptop'}).qs
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        plan = queryset.explain()
+
+        self.assertIn('product_name_trgm_idx', plan)
+        self.assertIn('product_description_trgm_idx', plan)
+
+
+class ProductKeysetTests(TestCase):
+    """Test sorting the catalog and paging it with cursors"""
+
+    def setUp(self):
+        self.client = APIClient()
+        prices = [5, 3, 3, 8, 1, 3, 9]
+        self.products = [
+            create_product(
+                name=f'Item {i}', price=price, stock=i,
+                category='Kitchen' if i % 2 else 'Art',
+            )
+            for i, price in enumerate(prices)
+        ]
+
+    def _walk(self, params):
+        """Follow `next` links and return the ids of every page"""
+        pages = []
+        res = self.client.get(PRODUCTS_URL, params)
+        while True:
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            pages.append([p['id'] for p in res.data['products']])
+            if not res.data['next']:
+                return pages
+            res = self.client.get(res.data['next'])
+
+    def test_sort_orders_counted_pages(self):
+        res = self.client.get(PRODUCTS_URL, {'sort': '-stock'})
+
+        self.assertEqual(
+            [p['id'] for p in res.data['products']],
+            [p.id for p in reversed(self.products)],
+        )
+
+    def test_cursor_walks_every_product_once(self):
+        pages = self._walk(
+            {'sort': '-price', 'page_size': 2, 'count': 'false'}
+        )
+
+        expected = sorted(
+            self.products, key=lambda p: (p.price, p.id), reverse=True
+        )
+        self.assertEqual(sum(pages, []), [p.id for p in expected])
+        self.assertEqual(len(pages), 4)
+
+    def test_cursor_within_category(self):
+        pages = self._walk({
+            'sort': 'price', 'category': 'Kitchen',
+            'page_size': 1, 'count': 'false',
+        })
+
+        kitchen = sorted(
+            (p for p in self.products if p.category == 'Kitchen'),
+            key=lambda p: (p.price, p.id),
+        )
+        self.assertEqual(sum(pages, []), [p.id for p in kitchen])
+
+    def test_cursor_page_queries_are_constant(self):
+        res = self.client.get(
+            PRODUCTS_URL, {'sort': 'price', 'page_size': 2, 'count': 'false'}
+        )
+        for _ in range(2):
+            res = self.client.get(res.data['next'])
+
+        # Page and prefetched images, with no COUNT or OFFSET.
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(res.data['next'])
+        self.assertEqual(len(ctx.captured_queries), 2)
+        self.assertNotIn('OFFSET', ctx.captured_queries[0]['sql'])
+        self.assertIsNone(res.data['previous'])
+
+    def test_invalid_cursor_returns_404(self):
+        res = self.client.get(PRODUCTS_URL, {'cursor': 'nope'})
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+        res = self.client.get(
+            PRODUCTS_URL, {'sort': 'price', 'page_size': 2, 'count': 'false'}
+        )
+        res = self.client.get(res.data['next'] + '&sort=stock')
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_category_sort_uses_composite_index(self):
+        queryset = ProductFilter(
+            {'category': 'Kitchen', 'sort': '-rating'},
+            queryset=Product.objects.all(),
+        ).qs[:20]
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+
+        self.assertIn('product_cat_rating_idx', queryset.explain())
+
+
+class ProductFacetTests(TestCase):
+    """Test facet counts alongside the product list"""
+
+    def setUp(self):
+        self.client = APIClient()
+        cache.clear()
+        create_product(brand='Acme', price=10, rating=4.5)
+        create_product(brand='Acme', price=30, rating=4.1)
+        create_product(
+            brand='Boilwell', price=30, rating=2, category='Kitchen'
+        )
+        create_product(brand='Zentra', price=3000, rating=5, category='Art')
+
+    def _facets(self, **params):
+        res = self.client.get(PRODUCTS_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res.data['facets']
+
+    def test_all_facets_in_one_query(self):
+        with CaptureQueriesContext(connection) as ctx:
+            facets = self._facets(facets='category,brand,price,rating')
+
+        facet_queries = [
+            q for q in ctx.captured_queries if 'GROUPING SETS' in q['sql']
+        ]
+        self.assertEqual(len(facet_queries), 1)
+        categories = {f['value']: f['count'] for f in facets['category']}
+        self.assertEqual(categories['Laptop'], 2)
+        self.assertEqual(categories['Kitchen'], 1)
+        self.assertEqual(categories['Food'], 0)
+        self.assertEqual(facets['brand'][0], {'value': 'Acme', 'count': 2})
+        prices = {f['min']: f['count'] for f in facets['price']}
+        self.assertEqual(prices[0], 1)
+        self.assertEqual(prices[25], 2)
+        self.assertEqual(prices[2500], 1)
+        self.assertIsNone(facets['price'][-1]['max'])
+        ratings = {f['value']: f['count'] for f in facets['rating']}
+        self.assertEqual(ratings, {0: 0, 1: 0, 2: 1, 3: 0, 4: 2, 5: 1})
+
+    def test_facets_follow_filters(self):
+        facets = self._facets(facets='brand', min_price=20, max_price=100)
+
+        self.assertEqual(facets, {'brand': [
+            {'value': 'Acme', 'count': 1},
+            {'value': 'Boilwell', 'count': 1},
+        ]})
+
+    def test_facets_cached_by_filter_values(self):
+        self._facets(facets='category', brand='Acme')
+
+        with CaptureQueriesContext(connection) as ctx:
+            # Page and sort parameters do not change the facet signature.
+            self._facets(facets='category', brand='Acme', page_size=1)
+        self.assertFalse(
+            any('GROUPING SETS' in q['sql'] for q in ctx.captured_queries)
+        )
+
+    def test_relevance_matches_cached_separately(self):
+        create_product(name='Laptob', brand='Qwerty', category='Food')
+
+        fuzzy = self._facets(
+            facets='category', keyword='laptop', sort='relevance'
+        )
+        plain = self._facets(facets='category', keyword='laptop')
+
+        counts = [
+            {f['value']: f['count'] for f in facets['category']}['Food']
+            for facets in (fuzzy, plain)
+        ]
+        self.assertEqual(counts, [1, 0])
+
+    def test_facets_omitted_by_default(self):
+        res = self.client.get(PRODUCTS_URL)
+
+        self.assertNotIn('facets', res.data)
+
+    def test_unknown_facet_is_rejected(self):
+        res = self.client.get(PRODUCTS_URL, {'facets': 'category,colour'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ProductImageVariantTests(TestCase):
+    """Test derivatives of uploaded product images"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.product = create_product()
+
+    def tearDown(self):
+        for image in ProductImages.objects.all():
+            image.delete()
+        flush_file_deletions()
+
+    def _upload(self, count=1):
+        files = []
+        for _ in range(count):
+            image_file = tempfile.NamedTemporaryFile(suffix='.png')
+            Image.new('RGBA', (800, 400)).save(image_file, format='PNG')
+            image_file.seek(0)
+            files.append(image_file)
+        try:
+            return self.client.post(
+                UPLOAD_URL,
+                {'product': self.product.id, 'images': files},
+                format='multipart',
+            )
+        finally:
+            for image_file in files:
+                image_file.close()
+
+    @override_settings(IMAGE_VARIANT_WORKERS=0)
+    def test_upload_schedules_variants(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            res = self._upload(count=2)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(callbacks), 2)
+        for image in ProductImages.objects.all():
+            self.assertTrue(image.image_variants['thumb'].endswith('.png'))
+
+        res = self.client.get(product_url(self.product.id))
+        variants = res.data['product']['images'][0]['image_variants']
+        self.assertIn('medium', variants)
+
+    @override_settings(IMAGE_VARIANT_WORKERS=0)
+    def test_generated_variants_change_product_etag(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self._upload()
+        etag = self.client.get(product_url(self.product.id))['ETag']
+
+        for callback in callbacks:
+            callback()
+
+        res = self.client.get(
+            product_url(self.product.id), HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        variants = res.data['product']['images'][0]['image_variants']
+        self.assertIn('thumb', variants)
+
+    @override_settings(IMAGE_VARIANT_WORKERS=1)
+    def test_variants_rendered_in_process_pool(self):
+        self._upload()
+        image = ProductImages.objects.get()
+
+        variants = generate_variants('product.ProductImages', image.pk)
+
+        image.refresh_from_db()
+        self.assertEqual(image.image_variants, variants)
+        with image.image.storage.open(variants['medium']) as medium:
+            self.assertEqual(Image.open(medium).size, (600, 300))
+        # Forking the threaded web process could deadlock the child.
+        render_pool = image_variants._pools()[0]
+        self.assertEqual(render_pool._mp_context.get_start_method(), 'spawn')
+
+    @override_settings(IMAGE_VARIANT_WORKERS=0, FILE_DELETION_WORKERS=0)
+    def test_delete_removes_variant_files(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._upload()
+        image = ProductImages.objects.get()
+        storage = image.image.storage
+        paths = [image.image.name, *image.image_variants.values()]
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            image.delete()
+            # Nothing is removed from storage before the commit.
+            self.assertTrue(all(storage.exists(path) for path in paths))
+
+        self.assertEqual(len(callbacks), 1)
+        self.assertFalse(any(storage.exists(path) for path in paths))
+        self.assertFalse(PendingFileDeletion.objects.exists())
+
+
+class ProductImageUploadTests(TestCase):
+    """Test uploading several product images at once"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.product = create_product()
+
+    def tearDown(self):
+        for image in ProductImages.objects.all():
+            image.delete()
+        flush_file_deletions()
+
+    def _image_file(self):
+        image_file = tempfile.NamedTemporaryFile(suffix='.jpg')
+        Image.new('RGB', (10, 10)).save(image_file, format='JPEG')
+        image_file.seek(0)
+        return image_file
+
+    def _post(self, files, product_id=None):
+        try:
+            return self.client.post(
+                UPLOAD_URL,
+                {'product': product_id or self.product.id, 'images': files},
+                format='multipart',
+            )
+        finally:
+            for image_file in files:
+                image_file.close()
+
+    def test_upload_inserts_images_in_one_query(self):
+        files = [self._image_file() for _ in range(3)]
+
+        with CaptureQueriesContext(connection) as ctx:
+            res = self._post(files)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['data']), 3)
+        self.assertEqual(res.data['errors'], [])
+        inserts = [
+            q for q in ctx.captured_queries
+            if q['sql'].startswith('INSERT INTO "product_productimages"')
+        ]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(self.product.images.count(), 3)
+
+    def test_upload_reports_invalid_files(self):
+        bad_file = tempfile.NamedTemporaryFile(suffix='.jpg')
+        bad_file.write(b'not an image')
+        bad_file.seek(0)
+        bad_name = os.path.basename(bad_file.name)
+
+        res = self._post([self._image_file(), bad_file])
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['data']), 1)
+        self.assertEqual(len(res.data['errors']), 1)
+        self.assertEqual(res.data['errors'][0]['file'], bad_name)
+        self.assertEqual(self.product.images.count(), 1)
+
+    def test_upload_unknown_product_returns_404(self):
+        res = self._post([self._image_file()], product_id=999999)
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(ProductImages.objects.exists())
+
+    @override_settings(PRODUCT_IMAGE_UPLOAD_WORKERS=3)
+    def test_files_are_written_concurrently(self):
+        storage = ProductImages._meta.get_field('image').storage
+        barrier = threading.Barrier(3, timeout=5)
+        original_save = storage.save
+
+        def save(*args, **kwargs):
+            # Only passes if all three writes are in flight together.
+            barrier.wait()
+            return original_save(*args, **kwargs)
+
+        with patch.object(storage, 'save', side_effect=save):
+            res = self._post([self._image_file() for _ in range(3)])
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['errors'], [])
+        self.assertEqual(self.product.images.count(), 3)
+
+
+class ProductDeleteTests(TestCase):
+    """Test deleting products and their image files"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.product = create_product()
+        self.storage = ProductImages._meta.get_field('image').storage
+        self.paths = []
+        for _ in range(3):
+            image = ProductImages(product=self.product)
+            image.image.save('a.jpg', ContentFile(b'jpg'), save=True)
+            self.paths.append(image.image.name)
+
+    def tearDown(self):
+        for path in self.paths:
+            self.storage.delete(path)
+
+    @override_settings(FILE_DELETION_WORKERS=0)
+    def test_delete_queues_files_until_commit(self):
+        url = reverse('delete_product', args=[self.product.id])
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            res = self.client.delete(url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertFalse(Product.objects.filter(id=self.product.id).exists())
+        self.assertTrue(all(self.storage.exists(p) for p in self.paths))
+        self.assertCountEqual(
+            PendingFileDeletion.objects.values_list('path', flat=True),
+            self.paths,
+        )
+
+        for callback in callbacks:
+            callback()
+
+        self.assertFalse(any(self.storage.exists(p) for p in self.paths))
+        self.assertFalse(PendingFileDeletion.objects.exists())
+
+    def test_delete_queues_all_files_with_one_insert(self):
+        url = reverse('delete_product', args=[self.product.id])
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.delete(url)
+
+        inserts = [
+            q for q in queries.captured_queries
+            if q['sql'].startswith('INSERT INTO "core_pendingfiledeletion"')
+        ]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(PendingFileDeletion.objects.count(), 3)
+        touches = [
+            q for q in queries.captured_queries
+            if q['sql'].startswith('UPDATE "product_product"')
+        ]
+        self.assertEqual(touches, [])
+
+    def test_failed_deletions_stay_queued(self):
+        ProductImages.objects.all().delete()
+        failing = self.paths[0]
+        original_delete = self.storage.delete
+
+        def delete(path):
+            if path == failing:
+                raise OSError('storage unavailable')
+            original_delete(path)
+
+        with patch.object(self.storage, 'delete', side_effect=delete):
+            deleted, failed = flush_file_deletions(batch_size=2)
+
+        self.assertEqual((deleted, failed), (2, 1))
+        entry = PendingFileDeletion.objects.get()
+        self.assertEqual((entry.path, entry.attempts), (failing, 1))
+
+        self.assertEqual(flush_file_deletions(), (1, 0))
+        self.assertFalse(self.storage.exists(failing))
+
+
+IMPORT_URL = reverse('import_products')
+
+
+def catalog_csv(*rows, header='sku,name,price,brand,category,stock'):
+    return '\n'.join((header,) + rows) + '\n'
+
+
+class ProductImportTests(TestCase):
+    """Test the streaming CSV catalog import"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='supplier@example.com', password='testpass123'
+        )
+        self.client.force_authenticate(self.user)
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+
+    def _upload(self, content):
+        upload = io.BytesIO(content.encode())
+        upload.name = 'catalog.csv'
+        with override_settings(
+            MEDIA_ROOT=self.media, PRODUCT_IMPORT_REJECTS_DIR=self.media
+        ):
+            return self.client.post(
+                IMPORT_URL, {'file': upload}, format='multipart'
+            )
+
+    def test_import_creates_products_and_rejects_rows(self):
+        res = self._upload(catalog_csv(
+            'A1,Kettle,19.99,Boilwell,Kitchen,4',
+            'A2,Mystery box,5,Acme,Toys,1',
+            'A3,,5,Acme,Art,1',
+            ',Easel,45,Artisan,Art,2',
+        ))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            (res.data['created'], res.data['updated'], res.data['rejected']),
+            (2, 0, 2),
+        )
+        kettle = Product.objects.get(sku='A1')
+        self.assertEqual(kettle.user, self.user)
+        self.assertEqual(str(kettle.price), '19.99')
+        self.assertIsNone(Product.objects.get(name='Easel').sku)
+
+        with override_settings(PRODUCT_IMPORT_REJECTS_DIR=self.media):
+            download = self.client.get(res.data['rejects'])
+            other = APIClient()
+            other.force_authenticate(get_user_model().objects.create_user(
+                email='other@example.com', password='testpass123'
+            ))
+            self.assertEqual(
+                other.get(res.data['rejects']).status_code,
+                status.HTTP_404_NOT_FOUND,
+            )
+            self.assertEqual(
+                APIClient().get(res.data['rejects']).status_code,
+                status.HTTP_401_UNAUTHORIZED,
+            )
+        content = b''.join(download.streaming_content).decode()
+        rejects = list(csv.DictReader(io.StringIO(content)))
+        self.assertEqual([row['line'] for row in rejects], ['3', '4'])
+        self.assertIn('category', rejects[0]['errors'])
+        self.assertIn('name', rejects[1]['errors'])
+
+    def test_import_upserts_on_sku(self):
+        create_product(sku='A1', name='Old kettle', stock=1)
+
+        res = self._upload(catalog_csv(
+            'A1,Kettle,19.99,Boilwell,Kitchen,4',
+            'A2,Toaster,29,Acme,Kitchen,2',
+            'A2,Toaster XL,39,Acme,Kitchen,3',
+        ))
+
+        self.assertEqual((res.data['created'], res.data['updated']), (1, 1))
+        self.assertIsNone(res.data['rejects'])
+        self.assertEqual(Product.objects.get(sku='A1').name, 'Kettle')
+        self.assertEqual(Product.objects.get(sku='A2').stock, 3)
+
+    def test_import_queries_do_not_grow_with_rows(self):
+        rows = [f'S{i},Item {i},1,Acme,Art,1' for i in range(50)]
+
+        with CaptureQueriesContext(connection) as ctx:
+            self._upload(catalog_csv(*rows))
+
+        self.assertEqual(Product.objects.count(), 50)
+        # Auth, savepoints, staging table, upsert and drop; COPY is not
+        # logged by the query capture.
+        self.assertLessEqual(len(ctx.captured_queries), 8)
+
+    def test_http_import_validates_inline(self):
+        with patch('product.importer.ProcessPoolExecutor') as pool:
+            res = self._upload(
+                catalog_csv('A1,Kettle,19.99,Boilwell,Kitchen,4')
+            )
+
+        pool.assert_not_called()
+        self.assertEqual(res.data['created'], 1)
+
+    def test_import_requires_authentication(self):
+        self.client.force_authenticate(None)
+
+        res = self._upload(catalog_csv('A1,Kettle,19.99,Boilwell,Kitchen,4'))
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertFalse(Product.objects.exists())
+
+    def test_import_without_header_is_rejected(self):
+        res = self._upload('')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_import_command(self):
+        path = os.path.join(self.media, 'catalog.csv')
+        with open(path, 'w') as source:
+            source.write(catalog_csv(
+                'A1,Kettle,19.99,Boilwell,Kitchen,4',
+                'A2,Kettle,abc,Boilwell,Kitchen,4',
+            ))
+        out = io.StringIO()
+
+        call_command(
+            'import_products', path, user=self.user.email,
+            chunk_size=1, workers=2, stdout=out,
+        )
+
+        self.assertIn('Created 1, updated 0, rejected 1', out.getvalue())
+        with open(f'{path}.rejects.csv') as rejects:
+            self.assertIn('price', rejects.read())
+        self.assertEqual(Product.objects.get(sku='A1').user, self.user)
+
+
+STOCK_URL = reverse('adjust_product_stock')
+
+
+class ProductStockTests(TestCase):
+    """Test relative stock adjustments"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(get_user_model().objects.create_user(
+            email='shop@example.com', password='testpass123'
+        ))
+        self.kettle = create_product(name='Kettle', stock=5)
+        self.toaster = create_product(name='Toaster', stock=1)
+
+    def _adjust(self, *pairs):
+        return self.client.post(STOCK_URL, {'adjustments': [
+            {'product': product_id, 'delta': delta}
+            for product_id, delta in pairs
+        ]}, format='json')
+
+    def test_batch_applied_in_one_statement(self):
+        with CaptureQueriesContext(connection) as ctx:
+            res = self._adjust(
+                (self.kettle.id, -2), (self.toaster.id, -3), (999999, 1),
+                (self.kettle.id, 4),
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        updates = [
+            q for q in ctx.captured_queries if 'UPDATE' in q['sql']
+        ]
+        self.assertEqual(len(updates), 1)
+        self.assertFalse(any(
+            q['sql'].startswith('SELECT') and 'product_product' in q['sql']
+            for q in ctx.captured_queries
+        ))
+        self.assertEqual(
+            res.data['applied'], [{'product': self.kettle.id, 'stock': 7}]
+        )
+        self.assertEqual(res.data['rejected'], [
+            {
+                'product': self.toaster.id, 'delta': -3,
+                'reason': 'insufficient_stock', 'stock': 1,
+            },
+            {'product': 999999, 'delta': 1, 'reason': 'not_found'},
+        ])
+        self.toaster.refresh_from_db()
+        self.assertEqual(self.toaster.stock, 1)
+
+    def test_stock_can_reach_zero(self):
+        res = self._adjust((self.toaster.id, -1))
+
+        self.assertEqual(
+            res.data['applied'], [{'product': self.toaster.id, 'stock': 0}]
+        )
+
+    def test_overflowing_adjustment_is_rejected(self):
+        big = 2 ** 31 - 1
+        res = self._adjust(
+            (self.kettle.id, big), (self.kettle.id, big), (self.toaster.id, 1)
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            res.data['applied'], [{'product': self.toaster.id, 'stock': 2}]
+        )
+        self.assertEqual(res.data['rejected'], [{
+            'product': self.kettle.id, 'delta': 2 * big,
+            'reason': 'out_of_range', 'stock': 5,
+        }])
+
+    def test_invalid_batch_is_rejected(self):
+        for delta in ('many', 2 ** 31):
+            res = self._adjust((self.kettle.id, delta))
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_requires_authentication(self):
+        self.client.force_authenticate(None)
+
+        res = self._adjust((self.kettle.id, -1))
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class ProductStockConcurrencyTests(TransactionTestCase):
+    """Stress stock adjustments from concurrent threads"""
+
+    def test_concurrent_checkouts_never_oversell(self):
+        first = create_product(name='Kettle', stock=40)
+        second = create_product(name='Toaster', stock=40)
+        threads, per_thread = 8, 10
+        results = []
+        barrier = threading.Barrier(threads)
+
+        def checkout(reverse):
+            pairs = [(first.id, -1), (second.id, -1)]
+            try:
+                barrier.wait()
+                for _ in range(per_thread):
+                    # Opposite orders in one batch exercise lock ordering.
+                    applied, rejected = adjust_stock(
+                        pairs[::-1] if reverse else pairs
+                    )
+                    results.append((len(applied), len(rejected)))
+            finally:
+                connection.close()
+
+        workers = [
+            threading.Thread(target=checkout, args=(i % 2,))
+            for i in range(threads)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.stock, second.stock), (0, 0))
+        self.assertEqual(sum(applied for applied, _ in results), 80)
+        self.assertEqual(sum(rejected for _, rejected in results), 80)
+
+
+STATS_URL = reverse('category_stats')
+
+
+class CategoryStatsTests(TestCase):
+    """Test the trigger-maintained per-category statistics"""
+
+    def assertStatsFresh(self):
+        expected = {
+            row['category']: row for row in Product.objects.values(
+                'category'
+            ).annotate(
+                product_count=Count('id'),
+                price_sum=Sum('price'),
+                min_price=Min('price'),
+                max_price=Max('price'),
+                total_stock=Sum('stock'),
+            )
+        }
+        stock = {
+            row['category']: row['total_stock']
+            for row in CategoryStockSlot.objects.values('category').annotate(
+                total_stock=Sum('total_stock')
+            )
+        }
+        for row in CategoryStats.objects.all():
+            row.total_stock = stock.pop(row.category, 0)
+            fresh = expected.pop(row.category, None)
+            if fresh is None:
+                self.assertEqual(row.product_count, 0)
+                self.assertEqual(row.total_stock, 0)
+                self.assertIsNone(row.min_price)
+                continue
+            for field in ('product_count', 'price_sum', 'min_price',
+                          'max_price', 'total_stock'):
+                self.assertEqual(getattr(row, field), fresh[field], field)
+        self.assertEqual(expected, {})
+        self.assertFalse(any(stock.values()))
+
+    def test_orm_writes_update_stats(self):
+        laptop = create_product(price=1000, stock=3)
+        create_product(price=500, stock=2)
+        create_product(category='Food', price=4, stock=10)
+        self.assertStatsFresh()
+
+        laptop.price = 1500
+        laptop.category = 'Home'
+        laptop.save()
+        self.assertStatsFresh()
+
+        Product.objects.filter(category='Food').update(stock=F('stock') + 5)
+        Product.objects.filter(price=500).delete()
+        self.assertStatsFresh()
+        stats = CategoryStats.objects.get(category='Laptop')
+        self.assertEqual(stats.product_count, 0)
+        self.assertIsNone(stats.max_price)
+
+    def test_raw_sql_writes_update_stats(self):
+        product = create_product(stock=5)
+        adjust_stock([(product.id, -2)])
+        import_products(io.StringIO(catalog_csv(
+            'A1,Pan,30,Acme,Kitchen,4', 'A2,Pot,50,Acme,Kitchen,6',
+        )))
+        self.assertStatsFresh()
+        kitchen = next(
+            row for row in get_category_stats() if row['category'] == 'Kitchen'
+        )
+        self.assertEqual(kitchen['total_stock'], 10)
+
+    def test_stats_endpoint_single_query(self):
+        create_product(price=100, stock=1)
+        create_product(price=300, stock=2)
+        with CaptureQueriesContext(connection) as queries:
+            res = APIClient().get(STATS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(res.data['categories'], get_category_stats())
+        laptop, electronics = res.data['categories'][:2]
+        self.assertEqual(laptop['product_count'], 2)
+        self.assertEqual(laptop['avg_price'], Decimal('200.00'))
+        self.assertEqual(laptop['min_price'], Decimal('100.00'))
+        self.assertEqual(laptop['max_price'], Decimal('300.00'))
+        self.assertEqual(laptop['total_stock'], 3)
+        self.assertEqual(electronics['product_count'], 0)
+        self.assertIsNone(electronics['avg_price'])
+
+    def test_rebuild_command_repairs_drift(self):
+        create_product(price=100, stock=1)
+        create_product(category='Art', price=20, stock=4)
+        CategoryStats.objects.filter(category='Laptop').update(
+            product_count=99
+        )
+        CategoryStockSlot.objects.filter(category='Art').update(total_stock=-1)
+        CategoryStats.objects.create(category='Food', product_count=3)
+
+        call_command('rebuild_category_stats', stdout=io.StringIO())
+
+        self.assertStatsFresh()
+        self.assertFalse(CategoryStats.objects.filter(category='Food'))
+
+
+class CategoryStatsConcurrencyTests(TransactionTestCase):
+    """Test the statistics triggers under concurrent writers"""
+
+    def _in_thread(self, target):
+        errors = []
+
+        def run():
+            try:
+                target()
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        return thread, errors
+
+    def _wait_for_lock_waiter(self):
+        for _ in range(100):
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT count(*) FROM pg_locks WHERE NOT granted'
+                )
+                if cursor.fetchone()[0]:
+                    return
+            threading.Event().wait(0.05)
+        self.fail('No writer waited on the statistics lock')
+
+    def test_concurrent_inserts_keep_min_and_max(self):
+        create_product(price=100)
+
+        def insert_expensive():
+            create_product(price=5000)
+
+        with transaction.atomic():
+            create_product(price=10)
+            thread, errors = self._in_thread(insert_expensive)
+            self._wait_for_lock_waiter()
+        thread.join()
+
+        self.assertEqual(errors, [])
+        stats = CategoryStats.objects.get(category='Laptop')
+        self.assertEqual(
+            (stats.min_price, stats.max_price),
+            (Decimal('10.00'), Decimal('5000.00')),
+        )
+
+    def test_stock_adjustments_do_not_lock_the_category(self):
+        kettle = create_product(name='Kettle', stock=5)
+        toaster = create_product(name='Toaster', stock=5)
+
+        def adjust_toaster():
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute("SET LOCAL lock_timeout = '2s'")
+                adjust_stock([(toaster.id, -1)])
+
+        with transaction.atomic():
+            adjust_stock([(kettle.id, -1)])
+            thread, errors = self._in_thread(adjust_toaster)
+            thread.join()
+
+        self.assertEqual(errors, [])
+        laptop = get_category_stats()[0]
+        self.assertEqual(laptop['total_stock'], 8)
+
+
+AUTOCOMPLETE_URL = reverse('autocomplete_products')
+
+
+class ProductAutocompleteTests(TestCase):
+    """Test product name autocomplete from the in-memory index"""
+
+    def setUp(self):
+        product_names.clear()
+        self.client = APIClient()
+
+    def test_autocomplete_matches_words(self):
+        create_product(name='Gaming Laptop')
+        create_product(name='Laptop Stand')
+        create_product(name='Desk Lamp')
+
+        res = self.client.get(AUTOCOMPLETE_URL, {'q': 'lapt'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [product['name'] for product in res.data['results']],
+            ['Gaming Laptop', 'Laptop Stand'],
+        )
+
+    def test_index_follows_signals_and_imports(self):
+        laptop = create_product(name='Laptop')
+        self.client.get(AUTOCOMPLETE_URL, {'q': 'l'})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            laptop.name = 'Notebook'
+            laptop.save()
+        with self.assertNumQueries(0):
+            res = self.client.get(AUTOCOMPLETE_URL, {'q': 'no'})
+        self.assertEqual(res.data['results'], [
+            {'id': laptop.id, 'name': 'Notebook'}
+        ])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            import_products(
+                io.StringIO(catalog_csv('S1,Nozzle,5,Acme,Home,1'))
+            )
+        res = self.client.get(AUTOCOMPLETE_URL, {'q': 'no'})
+        self.assertEqual(len(res.data['results']), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            laptop.delete()
+        res = self.client.get(AUTOCOMPLETE_URL, {'q': 'no'})
+        self.assertEqual(
+            [product['name'] for product in res.data['results']], ['Nozzle']
+        )
+
+
+BATCH_URL = reverse('new_products_batch')
+NEW_PRODUCT_URL = reverse('new_product')
+
+
+class ProductBatchCreateTests(TestCase):
+    """Test creating products in batches"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email='batch@example.com', password='password'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_batch_creates_valid_items_and_reports_errors(self):
+        payload = [
+            {'name': 'Kettle', 'price': '25.00', 'category': 'Kitchen'},
+            {'name': '', 'price': '10.00'},
+            {'name': 'Toaster', 'price': 'cheap'},
+            {'name': 'Lamp', 'price': '40.00', 'category': 'Home',
+             'user': 999999},
+            {'name': 'Mug', 'category': 'Mugs'},
+        ]
+
+        res = self.client.post(BATCH_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['created']), 2)
+        self.assertEqual(
+            [error['index'] for error in res.data['errors']], [1, 2, 4]
+        )
+        self.assertIn('name', res.data['errors'][0]['errors'])
+        self.assertIn('price', res.data['errors'][1]['errors'])
+        self.assertIn('category', res.data['errors'][2]['errors'])
+        products = Product.objects.filter(id__in=res.data['created'])
+        self.assertEqual(
+            sorted(products.values_list('name', 'category', 'user')),
+            [('Kettle', 'Kitchen', self.user.id),
+             ('Lamp', 'Home', self.user.id)],
+        )
+
+    def test_single_create_saves_validated_data(self):
+        payload = {
+            'name': 'Kettle', 'price': '25.00', 'brand': 'Acme',
+            'category': 'Kitchen', 'user': 999999, 'colour': 'red',
+        }
+
+        res = self.client.post(NEW_PRODUCT_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        product = Product.objects.get(id=res.data['product']['id'])
+        self.assertEqual(
+            (product.name, product.brand, product.category, product.user),
+            ('Kettle', 'Acme', 'Kitchen', None),
+        )
+
+    def test_large_batch_uses_few_queries(self):
+        payload = {'products': [
+            {'name': f'Item {i}', 'category': 'Food', 'stock': i}
+            for i in range(1000)
+        ]}
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.post(BATCH_URL, payload, format='json')
+
+        self.assertEqual(len(res.data['created']), 1000)
+        self.assertLessEqual(len(queries), 3)
+        self.assertEqual(Product.objects.count(), 1000)
+
+    def test_batch_products_are_autocompleted(self):
+        product_names.clear()
+        self.client.get(AUTOCOMPLETE_URL, {'q': 'k'})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                BATCH_URL, [{'name': 'Kettle', 'category': 'Kitchen'}],
+                format='json',
+            )
+
+        res = self.client.get(AUTOCOMPLETE_URL, {'q': 'k'})
+        self.assertEqual(res.data['results'][0]['name'], 'Kettle')
+
+    def test_malformed_batches_rejected(self):
+        for payload in ({'products': {'name': 'Kettle'}}, [],
+                        [{'name': 'Kettle'}] * 1001):
+            res = self.client.post(BATCH_URL, payload, format='json')
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Product.objects.exists())
+
+    def test_auth_required(self):
+        res = APIClient().post(BATCH_URL, [{'name': 'Kettle'}], format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+def resize_url(image_id):
+    return reverse('resize_product_image', args=[image_id])
+
+
+class ProductImageResizeTests(TestCase):
+    """Test the on-demand resize endpoint and its disk cache"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.cache_dir = tempfile.mkdtemp()
+        self.settings_override = override_settings(
+            IMAGE_RESIZE_CACHE_DIR=self.cache_dir,
+            IMAGE_RESIZE_CACHE_MAX_BYTES=10 * 1024 * 1024,
+        )
+        self.settings_override.enable()
+        product = create_product()
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            Image.new('RGB', (800, 400)).save(image_file, format='JPEG')
+            image_file.seek(0)
+            self.client.post(
+                UPLOAD_URL,
+                {'product': product.id, 'images': [image_file]},
+                format='multipart',
+            )
+        self.image = ProductImages.objects.get()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.cache_dir)
+        self.image.delete()
+        flush_file_deletions()
+
+    def _get(self, **params):
+        return self.client.get(resize_url(self.image.id), params)
+
+    def test_resize_and_cache(self):
+        res = self._get(width=200, image_format='png')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'image/png')
+        content = b''.join(res.streaming_content)
+        self.assertEqual(Image.open(io.BytesIO(content)).size, (200, 100))
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+        with patch('utils.image_resize.resize_image') as patched:
+            res = self._get(width=200, image_format='png')
+            b''.join(res.streaming_content)
+        patched.assert_not_called()
+
+    def test_reused_file_name_is_not_served_stale(self):
+        etag = self._get(width=100)['ETag']
+        product, name = self.image.product, self.image.image.name
+        with self.captureOnCommitCallbacks(execute=True):
+            self.image.delete()
+        flush_file_deletions()
+
+        buffer = io.BytesIO()
+        Image.new('RGB', (200, 400)).save(buffer, format='JPEG')
+        storage = ProductImages._meta.get_field('image').storage
+        saved = storage.save(name, ContentFile(buffer.getvalue()))
+        self.assertEqual(saved, name)
+        self.image = ProductImages.objects.create(product=product, image=name)
+
+        res = self._get(width=100, v=etag.strip('"'))
+
+        self.assertNotEqual(res['ETag'], etag)
+        self.assertNotIn('immutable', res['Cache-Control'])
+        content = b''.join(res.streaming_content)
+        self.assertEqual(Image.open(io.BytesIO(content)).size, (100, 200))
+
+    def test_never_upscales(self):
+        res = self._get(width=2000)
+
+        content = b''.join(res.streaming_content)
+        self.assertEqual(Image.open(io.BytesIO(content)).size, (800, 400))
+
+    def test_versioned_request_is_immutable(self):
+        res = self._get(width=100)
+        self.assertIn('no-cache', res['Cache-Control'])
+        etag = res['ETag']
+
+        res = self._get(width=100, v=etag.strip('"'))
+        self.assertIn('immutable', res['Cache-Control'])
+        self.assertIn('max-age=31536000', res['Cache-Control'])
+
+        res = self.client.get(
+            resize_url(self.image.id), {'width': 100},
+            HTTP_IF_NONE_MATCH=etag,
+        )
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_invalid_params(self):
+        for params in ({}, {'width': 'wide'}, {'width': 5},
+                       {'width': 100, 'image_format': 'gif'}):
+            res = self._get(**params)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ResizeCacheTests(TestCase):
+    """Test LRU eviction and request coalescing"""
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_evicts_least_recently_used(self):
+        cache = ResizeCache(self.cache_dir, max_bytes=25)
+        cache.put('a', b'x' * 10)
+        cache.put('b', b'x' * 10)
+        cache.get('a')
+
+        cache.put('c', b'x' * 10)
+
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(sorted(os.listdir(self.cache_dir)), ['a', 'c'])
+        self.assertEqual(cache.total_bytes, 20)
+
+    def test_index_rebuilt_from_disk(self):
+        ResizeCache(self.cache_dir, max_bytes=100).put('a', b'x' * 10)
+
+        cache = ResizeCache(self.cache_dir, max_bytes=100)
+
+        self.assertEqual(cache.total_bytes, 10)
+        self.assertIsNotNone(cache.get('a'))
+
+    def test_processes_share_renders_and_byte_limit(self):
+        first = ResizeCache(self.cache_dir, max_bytes=25)
+        second = ResizeCache(self.cache_dir, max_bytes=25)
+        first.put('a', b'x' * 10)
+        second.put('b', b'x' * 10)
+
+        self.assertEqual(second.get('a'), os.path.join(self.cache_dir, 'a'))
+        first.put('c', b'x' * 10)
+
+        self.assertEqual(sorted(os.listdir(self.cache_dir)), ['a', 'c'])
+        self.assertEqual(second.total_bytes, 20)
+
+    def test_concurrent_requests_render_once(self):
+        cache = ResizeCache(self.cache_dir, max_bytes=1024)
+        calls = []
+        release = threading.Event()
+
+        def render():
+            calls.append(1)
+            release.wait(5)
+            return b'image'
+
+        threads = [
+            threading.Thread(target=cache.get_or_create, args=('k', render))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(cache.get('k'), os.path.join(self.cache_dir, 'k'))
+
+    def test_resize_image_keeps_aspect_ratio(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (300, 150)).save(buffer, format='PNG')
+
+        content = resize_image(buffer.getvalue(), 100, 'JPEG')
+
+        self.assertEqual(Image.open(io.BytesIO(content)).size, (100, 50))
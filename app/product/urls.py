@@ -4,7 +4,18 @@ from product import views
 urlpatterns = [
     path("products/", views.get_products, name='products'),
     path("upload-images/", views.upload_product_images, name="upload_product_images"),
+    path("images/<str:pk>/resize/", views.resize_product_image,
+         name="resize_product_image"),
     path("new/", views.new_product, name='new_product'),
+    path("new/batch/", views.new_products_batch, name='new_products_batch'),
+    path("import/", views.import_products_csv, name='import_products'),
+    path("import/rejects/<uuid:report>/", views.import_rejects,
+         name='import_rejects'),
+    path("autocomplete/", views.autocomplete_product_names,
+         name='autocomplete_products'),
+    path("stats/", views.category_stats, name='category_stats'),
+    path("stock/adjust/", views.adjust_product_stock,
+         name='adjust_product_stock'),
     path("product/<str:pk>/", views.get_product, name='get_product_details'),
     path("product/<str:pk>/update/", views.update_product, name='update_product'),
     path("product/<str:pk>/delete/", views.delete_product, name='delete_product')
@@ -1,51 +1,136 @@
 from django.shortcuts import render,get_object_or_404
-from rest_framework.decorators import api_view
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.decorators import (
+    api_view,
+    authentication_classes,
+    permission_classes,
+)
+from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.pagination import PageNumberPagination
-from product.serializers import ProductSerializer, ProductImageSerializer
+from core.file_cleanup import collect_file_deletions
+from product.serializers import (
+    ProductBatchSerializer,
+    ProductCreateSerializer,
+    ProductImageSerializer,
+    ProductSerializer,
+    StockAdjustmentSerializer,
+)
 from product.models import Product, ProductImages
+from product.autocomplete import autocomplete_products, index_products
+from product.facets import get_facets, parse_facets
 from product.filters import ProductFilter
+from product.importer import import_products, rejects_name, rejects_storage
+from product.pagination import ProductPagination
+from product.stats import get_category_stats
+from product.stock import adjust_stock
+import csv
+import io
+import tempfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.files import File
+from django.db import connection, transaction
+from django.db.models import Count, Max
+from django.db.models.functions import Now
+from django.http import FileResponse, Http404
+from django.urls import reverse
+from rest_framework.exceptions import ValidationError
+from rest_framework.fields import ImageField
+from utils.conditional import etag_matches, make_etag, not_modified
+from utils.image_resize import resized_image_response
+from utils.image_variants import schedule_variants
+from utils.prefix_index import parse_autocomplete_params
 # Create your views here.
 @api_view(['GET'])
 def get_products(request):
 
     #products = Product.objects.all()
 
-    filterset = ProductFilter(request.GET,queryset=Product.objects.all().order_by('id'))
+    filterset = ProductFilter(
+        request.GET,
+        queryset=Product.objects.prefetch_related('images').order_by('id'),
+    )
 
-    reqPerPage = 1
+    facets = None
+    if request.query_params.get('facets'):
+        try:
+            facet_names = parse_facets(request.query_params['facets'])
+        except ValueError as exc:
+            return Response(
+                {'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST
+            )
+        facets = get_facets(filterset, facet_names)
 
-    paginator = PageNumberPagination()
+    paginator = ProductPagination()
 
-    paginator.page_size = reqPerPage
-
-    queryset = paginator.paginate_queryset(filterset.qs, request)
+    if paginator.counts_enabled(request):
+        # The same aggregate versions the response and counts the rows.
+        stats = filterset.qs.order_by().aggregate(
+            total=Count('id'), last=Max('updated_at')
+        )
+        etag = make_etag(
+            request.get_full_path(), stats['total'], stats['last'], facets
+        )
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        products = paginator.paginate_queryset(
+            filterset.qs, request, count=stats['total']
+        )
+    else:
+        # Count-free mode never scans the whole result; version the page.
+        products = paginator.paginate_queryset(filterset.qs, request)
+        etag = make_etag(
+            request.get_full_path(),
+            paginator.has_next,
+            [(product.id, product.updated_at) for product in products],
+            facets,
+        )
+        if etag_matches(request, etag):
+            return not_modified(etag)
 
-    count = filterset.qs.count()
+    serailzier = ProductSerializer(products, many=True)
 
-    serailzier = ProductSerializer(queryset, many=True)
+    data = {
+        'reqPerPage': paginator.page_size,
+        'count': paginator.count,
+        'next': paginator.get_next_link(),
+        'previous': paginator.get_previous_link(),
+        'products': serailzier.data,
+    }
+    if facets is not None:
+        data['facets'] = facets
 
-    return Response({'reqPerPage': reqPerPage,'count': count, 'products': serailzier.data})
+    response = Response(data)
+    response['ETag'] = etag
+    return response
 
 @api_view(['GET'])
 def get_product(request, pk):
+    # The row fetched for the ETag is the one serialized; images are only
+    # loaded when the client's copy is stale.
     product = get_object_or_404(Product,id=pk)
+    etag = make_etag(request.get_full_path(), product.updated_at)
+    if etag_matches(request, etag):
+        return not_modified(etag)
 
     serializer = ProductSerializer(product,many=False)
 
-    return Response({'product': serializer.data})
+    response = Response({'product': serializer.data})
+    response['ETag'] = etag
+    return response
 
 
 @api_view(['POST'])
 def new_product(request):
     data  = request.data
 
-    serializer = ProductSerializer(data=data)
+    serializer = ProductCreateSerializer(data=data)
 
     if serializer.is_valid():
 
-        product = Product.objects.create(**data)
+        product = serializer.save()
 
         res = ProductSerializer(product,many=False)
 
@@ -53,19 +138,137 @@ def new_product(request):
     else:
         return Response({'error': serializer.errors})
 
+
+@api_view(["POST"])
+@authentication_classes([TokenAuthentication])
+@permission_classes([IsAuthenticated])
+def new_products_batch(request):
+    """Create the valid products of a list with one bulk insert"""
+    data = request.data
+    if isinstance(data, dict):
+        data = data.get('products')
+    serializer = ProductBatchSerializer(
+        data=data, many=True, allow_empty=False
+    )
+    if not serializer.is_valid():
+        return Response(
+            {'error': serializer.errors}, status=status.HTTP_400_BAD_REQUEST
+        )
+
+    products = serializer.save(user=request.user)
+    index_products(products)
+    return Response({
+        'created': [product.id for product in products],
+        'errors': serializer.item_errors,
+    })
+
+
+@api_view(["POST"])
+@authentication_classes([TokenAuthentication])
+@permission_classes([IsAuthenticated])
+def import_products_csv(request):
+    """Import a catalog CSV uploaded as `file`, upserting on sku"""
+    upload = request.FILES.get('file')
+    if upload is None:
+        return Response(
+            {'error': 'Upload the CSV as "file".'},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+    with tempfile.TemporaryFile('w+', newline='') as rejects:
+        try:
+            report = import_products(stream, request.user, rejects)
+        except (ValueError, csv.Error) as exc:
+            return Response(
+                {'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        report['rejects'] = None
+        if report['rejected']:
+            rejects.seek(0)
+            report_id = uuid.uuid4()
+            rejects_storage().save(
+                rejects_name(request.user, report_id), File(rejects)
+            )
+            report['rejects'] = request.build_absolute_uri(
+                reverse('import_rejects', args=[report_id])
+            )
+
+    return Response(report)
+
+
+@api_view(["GET"])
+@authentication_classes([TokenAuthentication])
+@permission_classes([IsAuthenticated])
+def import_rejects(request, report):
+    """Download the rejected rows of one of the user's imports"""
+    storage = rejects_storage()
+    name = rejects_name(request.user, report)
+    if not storage.exists(name):
+        raise Http404
+    return FileResponse(
+        storage.open(name, 'rb'), as_attachment=True,
+        filename='rejects.csv', content_type='text/csv',
+    )
+
+
+def _store_image(file):
+    """Validate one upload and write it to storage, returning its name"""
+    field = ProductImages._meta.get_field('image')
+    try:
+        ImageField().to_internal_value(file)
+        name = field.generate_filename(None, file.name)
+        return field.storage.save(name, file, max_length=field.max_length)
+    finally:
+        connection.close()
+
 @api_view(["POST"])
 def upload_product_images(request):
     data = request.data
 
+    product = get_object_or_404(Product, id=data.get('product'))
+
     files = request.FILES.getlist('images')
+    errors = []
     images = []
-    for file in files:
-        image = ProductImages.objects.create(product=Product(data['product']), image=file)
-        images.append(image)
+    if files:
+        workers = min(len(files), settings.PRODUCT_IMAGE_UPLOAD_WORKERS)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_store_image, file) for file in files]
+
+        for file, future in zip(files, futures):
+            try:
+                images.append(
+                    ProductImages(product=product, image=future.result())
+                )
+            except ValidationError as exc:
+                errors.append({'file': file.name, 'errors': exc.detail})
+            except Exception as exc:
+                errors.append({'file': file.name, 'errors': [str(exc)]})
+
+    if images:
+        try:
+            images = ProductImages.objects.bulk_create(images)
+        except Exception:
+            for image in images:
+                image.image.delete(save=False)
+            raise
+        # bulk_create sends no post_save, so do what the signal would.
+        Product.objects.filter(pk=product.pk).update(updated_at=Now())
+        for image in images:
+            schedule_variants(image)
 
     serializer = ProductImageSerializer(images, many=True)
 
-    return Response({'data' : serializer.data})
+    return Response({'data': serializer.data, 'errors': errors})
+
+
+@api_view(["GET"])
+def resize_product_image(request, pk):
+    image = get_object_or_404(ProductImages, id=pk)
+
+    return resized_image_response(request, image.image)
 
 @api_view(["PUT"])
 def update_product(request,pk):
@@ -87,12 +290,53 @@ def update_product(request,pk):
 
     return Response({'product': res.data})
 
+
+@api_view(["POST"])
+@authentication_classes([TokenAuthentication])
+@permission_classes([IsAuthenticated])
+def adjust_product_stock(request):
+    """Apply a batch of relative stock changes in one statement"""
+    data = request.data
+    if isinstance(data, dict):
+        data = data.get('adjustments')
+    serializer = StockAdjustmentSerializer(data=data, many=True)
+    if not serializer.is_valid():
+        return Response(
+            {'error': serializer.errors}, status=status.HTTP_400_BAD_REQUEST
+        )
+
+    applied, rejected = adjust_stock([
+        (item['product'], item['delta']) for item in serializer.validated_data
+    ])
+    return Response({'applied': applied, 'rejected': rejected})
+
+
+@api_view(['GET'])
+def autocomplete_product_names(request):
+    """Product names with a word starting with `q`, from memory"""
+    try:
+        prefix, limit = parse_autocomplete_params(request.query_params)
+    except ValueError as exc:
+        return Response(
+            {'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST
+        )
+    return Response({'results': autocomplete_products(prefix, limit)})
+
+
+@api_view(['GET'])
+def category_stats(request):
+    """Per-category counts, prices and stock from the summary table"""
+    return Response({'categories': get_category_stats()})
+
 @api_view(["DELETE", "GET"])
 def delete_product(request, pk):
     if request.method == "GET":
         return Response({'message': 'Use DELETE to delete the product'}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
     
     product = get_object_or_404(Product, id=pk)
-    ProductImages.objects.filter(product=pk).delete()
-    product.delete()
+    # The cascade deletes the images; their files are queued in the same
+    # transaction, with one INSERT for all of them, and deleted in the
+    # background once it commits.
+    with transaction.atomic(), collect_file_deletions():
+        product.delete()
     return Response({'message': 'product deleted'}, status=status.HTTP_200_OK)
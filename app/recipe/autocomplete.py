@@ -0,0 +1,71 @@
+"""Per-user tag and ingredient autocomplete from in-process prefix indexes.
+
+Each user's names are indexed on their first lookup; saves and deletes
+update the loaded indexes once their transaction commits. Rows created
+with bulk_create send no signals and are indexed through `index_names`.
+"""
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.models import Ingredient, Tag
+from utils.prefix_index import IndexRegistry
+
+
+def _load_names(model, user_id):
+    return model.objects.filter(user_id=user_id).values_list('id', 'name')
+
+
+user_names = {
+    model: IndexRegistry(
+        partial(_load_names, model),
+        max_indexes=settings.AUTOCOMPLETE_MAX_USER_INDEXES,
+    )
+    for model in (Tag, Ingredient)
+}
+
+
+def autocomplete_names(model, user_id, prefix, limit):
+    return [
+        {'id': pk, 'name': name}
+        for pk, name in user_names[model].get(user_id).search(prefix, limit)
+    ]
+
+
+def index_names(model, objs):
+    """Index Tag or Ingredient rows saved without signals, e.g. bulk_create"""
+    names = [(obj.user_id, obj.pk, obj.name) for obj in objs]
+    indexes = {
+        user_id: user_names[model].loaded(user_id)
+        for user_id in {user_id for user_id, _, _ in names}
+    }
+    names = [
+        (indexes[user_id], pk, name) for user_id, pk, name in names
+        if indexes[user_id] is not None
+    ]
+    if names:
+        def add():
+            for index, pk, name in names:
+                index.add(pk, name)
+        transaction.on_commit(add)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def index_name(sender, instance, **kwargs):
+    index = user_names[sender].loaded(instance.user_id)
+    if index is not None:
+        pk, name = instance.pk, instance.name
+        transaction.on_commit(lambda: index.add(pk, name))
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def unindex_name(sender, instance, **kwargs):
+    index = user_names[sender].loaded(instance.user_id)
+    if index is not None:
+        pk = instance.pk
+        transaction.on_commit(lambda: index.remove(pk))
@@ -0,0 +1,105 @@
+"""Chunked bulk import of recipes from NDJSON"""
+import json
+from functools import partial
+from itertools import chain
+
+from django.db import transaction
+
+from core.models import Recipe, Tag, Ingredient, update_search_vector
+from recipe.cache import bump_user_version
+from recipe.serializers import RecipeDetailSerailizer, get_or_create_by_name
+
+IMPORT_CHUNK_SIZE = 500
+
+
+def _parse_lines(lines):
+    """Yield (line number, data, error) for every non-blank line"""
+    for line_number, raw in enumerate(lines, start=1):
+        if not raw.strip():
+            continue
+        try:
+            data = json.loads(raw)
+        except ValueError as exc:
+            yield line_number, None, {'non_field_errors': [str(exc)]}
+            continue
+        if not isinstance(data, dict):
+            yield line_number, None, {
+                'non_field_errors': ['Expected a JSON object.']
+            }
+            continue
+        yield line_number, data, None
+
+
+def _link(field, recipes, names_per_recipe, objs_by_name):
+    through = getattr(Recipe, field).through
+    target = getattr(Recipe, field).field.m2m_reverse_name()
+    through.objects.bulk_create(
+        through(**{'recipe_id': recipe.id, target: objs_by_name[name].id})
+        for recipe, names in zip(recipes, names_per_recipe)
+        for name in dict.fromkeys(names)
+    )
+
+
+def write_chunk(user, chunk):
+    """Insert a chunk of validated recipes in one transaction"""
+    tag_names = [
+        [tag['name'] for tag in data.pop('tags', [])] for data in chunk
+    ]
+    ingredient_names = [
+        [ing['name'] for ing in data.pop('ingredients', [])] for data in chunk
+    ]
+
+    with transaction.atomic():
+        recipes = Recipe.objects.bulk_create(
+            Recipe(user=user, **data) for data in chunk
+        )
+        tags = get_or_create_by_name(
+            Tag, user, chain.from_iterable(tag_names)
+        )
+        ingredients = get_or_create_by_name(
+            Ingredient, user, chain.from_iterable(ingredient_names)
+        )
+        _link('tags', recipes, tag_names, tags)
+        _link('ingredients', recipes, ingredient_names, ingredients)
+        update_search_vector(
+            Recipe.objects.filter(pk__in=[recipe.pk for recipe in recipes])
+        )
+
+    return recipes
+
+
+def import_recipes(lines, request, chunk_size=IMPORT_CHUNK_SIZE):
+    """Validate and import NDJSON recipe lines for `request.user`.
+
+    Lines are consumed lazily and written in chunks of `chunk_size`, each
+    committed in its own transaction, so only one chunk is held in memory.
+    Returns the number of created recipes and a per-line error report.
+    """
+    created = 0
+    errors = []
+    chunk = []
+
+    for line_number, data, error in _parse_lines(lines):
+        if error is None:
+            serializer = RecipeDetailSerailizer(
+                data=data, context={'request': request}
+            )
+            if serializer.is_valid():
+                chunk.append(serializer.validated_data)
+            else:
+                error = serializer.errors
+        if error is not None:
+            errors.append({'line': line_number, 'errors': error})
+
+        if len(chunk) >= chunk_size:
+            created += len(write_chunk(request.user, chunk))
+            chunk = []
+
+    if chunk:
+        created += len(write_chunk(request.user, chunk))
+
+    # bulk_create sends no signals, so invalidate cached lists here.
+    if created:
+        transaction.on_commit(partial(bump_user_version, request.user.pk))
+
+    return {'created': created, 'errors': errors}
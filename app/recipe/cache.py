@@ -0,0 +1,111 @@
+"""Per-user versioned cache for the recipe, tag and ingredient lists.
+
+Cached entries are keyed on the user's current version number, so any
+write by that user invalidates all of their entries with a single
+increment instead of deleting keys one by one. The version only reaches
+every process through a shared cache, so lists are cached only when
+RECIPE_LIST_CACHE_ENABLED says the default cache is one.
+"""
+import hashlib
+import time
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from rest_framework import status
+from rest_framework.response import Response
+
+from core.models import Recipe, Tag, Ingredient
+from utils.image_variants import variants_generated
+
+KEY_PREFIX = 'recipe-api'
+HITS_KEY = f'{KEY_PREFIX}:stats:hits'
+MISSES_KEY = f'{KEY_PREFIX}:stats:misses'
+
+
+def _version_key(user_id):
+    return f'{KEY_PREFIX}:version:{user_id}'
+
+
+def _incr(key, initial):
+    """Increment a counter, creating it with `initial` when missing"""
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, initial, timeout=None)
+        return cache.incr(key)
+
+
+def get_user_version(user_id):
+    # Start from a timestamp rather than 1 so an evicted counter can never
+    # fall back to a version that still has entries in the cache.
+    version = cache.get(_version_key(user_id))
+    if version is None:
+        cache.add(_version_key(user_id), time.time_ns(), timeout=None)
+        version = cache.get(_version_key(user_id))
+    return version
+
+
+def bump_user_version(user_id):
+    """Invalidate every cached list of the user"""
+    return _incr(_version_key(user_id), time.time_ns())
+
+
+def get_cache_stats():
+    return {
+        'hits': cache.get(HITS_KEY, 0),
+        'misses': cache.get(MISSES_KEY, 0),
+    }
+
+
+def make_list_key(request, endpoint):
+    params = sorted(
+        (key, value)
+        for key, values in request.query_params.lists()
+        for value in values
+    )
+    digest = hashlib.md5(repr(params).encode()).hexdigest()
+    version = get_user_version(request.user.pk)
+    return f'{KEY_PREFIX}:list:{request.user.pk}:{version}:{endpoint}:{digest}'
+
+
+class CachedListMixin:
+    """Serve `list` from the per-user versioned cache"""
+    list_cache_timeout = getattr(settings, 'RECIPE_LIST_CACHE_TIMEOUT', 300)
+
+    def list(self, request, *args, **kwargs):
+        if not settings.RECIPE_LIST_CACHE_ENABLED:
+            return super().list(request, *args, **kwargs)
+        key = make_list_key(request, self.basename)
+        data = cache.get(key)
+        if data is not None:
+            _incr(HITS_KEY, 0)
+            response = Response(data)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        _incr(MISSES_KEY, 0)
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data, self.list_cache_timeout)
+        response['X-Cache'] = 'MISS'
+        return response
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+@receiver(variants_generated, sender=Recipe)
+def invalidate_user_lists(sender, instance, **kwargs):
+    if kwargs.get('action', 'post_').startswith('post_'):
+        # Bumped before commit, a concurrent reader could cache the old
+        # rows under the new version.
+        transaction.on_commit(partial(bump_user_version, instance.user_id))
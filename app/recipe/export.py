@@ -0,0 +1,78 @@
+"""Streaming export of recipes as NDJSON or CSV"""
+import csv
+import json
+from itertools import islice
+
+from django.db.models import prefetch_related_objects
+
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_FIELDS = [
+    'id', 'title', 'description', 'time_minutes', 'price', 'link',
+    'tags', 'ingredients',
+]
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def iter_recipe_chunks(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield lists of recipes read through a server-side cursor.
+
+    `QuerySet.iterator()` ignores prefetch_related, so tags and ingredients
+    are batch-loaded once per chunk instead.
+    """
+    rows = queryset.iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        prefetch_related_objects(chunk, 'tags', 'ingredients')
+        yield chunk
+
+
+def recipe_to_dict(recipe):
+    return {
+        'id': recipe.id,
+        'title': recipe.title,
+        'description': recipe.description,
+        'time_minutes': recipe.time_minutes,
+        'price': str(recipe.price),
+        'link': recipe.link,
+        'tags': [tag.name for tag in recipe.tags.all()],
+        'ingredients': [ing.name for ing in recipe.ingredients.all()],
+    }
+
+
+class Echo:
+    """File-like object that returns what is written instead of buffering"""
+
+    def write(self, value):
+        return value
+
+
+def stream_ndjson(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    for chunk in iter_recipe_chunks(queryset, chunk_size):
+        yield ''.join(
+            json.dumps(recipe_to_dict(recipe)) + '\n' for recipe in chunk
+        )
+
+
+def stream_csv(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for chunk in iter_recipe_chunks(queryset, chunk_size):
+        rows = []
+        for recipe in chunk:
+            data = recipe_to_dict(recipe)
+            data['tags'] = ';'.join(data['tags'])
+            data['ingredients'] = ';'.join(data['ingredients'])
+            rows.append(writer.writerow([data[f] for f in EXPORT_FIELDS]))
+        yield ''.join(rows)
+
+
+def stream_recipes(queryset, export_format, chunk_size=EXPORT_CHUNK_SIZE):
+    """Return a generator of text blocks in the requested format"""
+    if export_format == 'csv':
+        return stream_csv(queryset, chunk_size)
+    return stream_ndjson(queryset, chunk_size)
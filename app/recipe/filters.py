@@ -0,0 +1,29 @@
+"""Semi-join filters for recipes"""
+from django.db.models import Exists, OuterRef
+
+from core.models import Recipe
+
+
+def filter_by_related(queryset, field, ids, match_all=False):
+    """Filter recipes linked to `ids` through the `field` M2M.
+
+    Uses correlated EXISTS subqueries on the through-table, so recipes are
+    never multiplied by a JOIN and no DISTINCT is needed. With `match_all`
+    a recipe must be linked to every id, otherwise to any of them.
+    """
+    ids = set(ids)
+    if not ids:
+        return queryset
+
+    through = getattr(Recipe, field).through
+    target = getattr(Recipe, field).field.m2m_reverse_name()
+    links = through.objects.filter(recipe_id=OuterRef('pk'))
+
+    if not match_all:
+        return queryset.filter(Exists(links.filter(**{f'{target}__in': ids})))
+
+    for related_id in ids:
+        queryset = queryset.filter(
+            Exists(links.filter(**{target: related_id}))
+        )
+    return queryset
@@ -0,0 +1,105 @@
+"""Compare JOIN + DISTINCT and EXISTS plans for recipe tag filtering"""
+import random
+import time
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from core.models import Recipe, Tag
+from recipe.filters import filter_by_related
+
+
+class Rollback(Exception):
+    """Raised to discard the seeded dataset"""
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a throwaway dataset and time the legacy JOIN + DISTINCT tag '
+        'filter against the EXISTS semi-join filter.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=5000)
+        parser.add_argument('--tags', type=int, default=50)
+        parser.add_argument('--tags-per-recipe', type=int, default=5)
+        parser.add_argument('--filter-tags', type=int, default=3)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--explain', action='store_true',
+            help='Print the query plan of each variant'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def _seed(self, options):
+        rng = random.Random(options['seed'])
+        user = get_user_model().objects.create_user(
+            email='benchmark@example.com', password='benchmark'
+        )
+        tags = Tag.objects.bulk_create(
+            Tag(user=user, name=f'Tag {i}') for i in range(options['tags'])
+        )
+        recipes = Recipe.objects.bulk_create(
+            Recipe(
+                user=user,
+                title=f'Recipe {i}',
+                time_minutes=rng.randint(1, 120),
+                price=Decimal(rng.randint(100, 9999)) / 100,
+            )
+            for i in range(options['recipes'])
+        )
+        per_recipe = min(options['tags_per_recipe'], len(tags))
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe_id=recipe.id, tag_id=tag.id)
+            for recipe in recipes
+            for tag in rng.sample(tags, per_recipe)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+        tag_ids = [t.id for t in rng.sample(tags, options['filter_tags'])]
+        return user, tag_ids
+
+    def _time(self, queryset, repeat):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            rows = list(queryset.values_list('id', flat=True))
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best, len(rows)
+
+    def _run(self, options):
+        user, tag_ids = self._seed(options)
+        base = Recipe.objects.filter(user=user).order_by('-id')
+
+        variants = [
+            ('join+distinct', base.filter(tags__id__in=tag_ids).distinct()),
+            ('exists any', filter_by_related(base, 'tags', tag_ids)),
+            (
+                'exists all',
+                filter_by_related(base, 'tags', tag_ids, match_all=True)
+            ),
+        ]
+
+        self.stdout.write(
+            f"{options['recipes']} recipes, {options['tags']} tags, "
+            f"filtering on {len(tag_ids)} tags, best of {options['repeat']}"
+        )
+        for name, queryset in variants:
+            best, count = self._time(queryset, options['repeat'])
+            self.stdout.write(
+                f'{name:>14}: {best * 1000:8.2f} ms  ({count} rows)'
+            )
+            if options['explain']:
+                self.stdout.write(queryset.explain(analyze=True))
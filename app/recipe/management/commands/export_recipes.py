@@ -0,0 +1,45 @@
+"""Stream every recipe to a file as NDJSON or CSV"""
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Recipe
+from recipe.export import EXPORT_CHUNK_SIZE, EXPORT_FORMATS, stream_recipes
+
+
+class Command(BaseCommand):
+    help = 'Export recipes as NDJSON or CSV using a server-side cursor.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--format', dest='export_format', default='ndjson',
+            choices=list(EXPORT_FORMATS),
+        )
+        parser.add_argument(
+            '--output', help='File to write to (defaults to stdout)'
+        )
+        parser.add_argument(
+            '--user', help='Only export recipes owned by this email'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=EXPORT_CHUNK_SIZE
+        )
+
+    def handle(self, *args, **options):
+        queryset = Recipe.objects.order_by('id')
+        if options['user']:
+            queryset = queryset.filter(user__email=options['user'])
+
+        blocks = stream_recipes(
+            queryset, options['export_format'], options['chunk_size']
+        )
+
+        if not options['output']:
+            for block in blocks:
+                self.stdout.write(block, ending='')
+            return
+
+        try:
+            with open(options['output'], 'w', newline='') as output:
+                for block in blocks:
+                    output.write(block)
+        except OSError as exc:
+            raise CommandError(f'Could not write export: {exc}')
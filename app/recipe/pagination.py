@@ -0,0 +1,143 @@
+"""Keyset pagination for the recipe API"""
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from utils.keyset import (
+    cursor_values,
+    decode_cursor,
+    encode_cursor,
+    keyset_filter,
+)
+
+# Every ordering ends with a unique tiebreaker so the keyset is total.
+# Each one is backed by a matching (user, ...) index on core.Recipe.
+RECIPE_ORDERINGS = {
+    '-id': ('-id',),
+    'price': ('price', 'id'),
+    '-price': ('-price', '-id'),
+    'time_minutes': ('time_minutes', 'id'),
+    '-time_minutes': ('-time_minutes', '-id'),
+    'title': ('title', 'id'),
+    '-title': ('-title', '-id'),
+    # Only available with `search`, which annotates the rank as a
+    # fixed-scale numeric so cursors compare exactly.
+    'rank': ('-rank', '-id'),
+}
+DEFAULT_RECIPE_ORDERING = '-id'
+SEARCH_RECIPE_ORDERING = 'rank'
+
+
+def get_recipe_ordering(request):
+    """Return the ordering key requested by the client"""
+    searching = bool(request.query_params.get('search'))
+    default = SEARCH_RECIPE_ORDERING if searching else DEFAULT_RECIPE_ORDERING
+    ordering = request.query_params.get('ordering', default)
+    if ordering not in RECIPE_ORDERINGS:
+        return default
+    if ordering == SEARCH_RECIPE_ORDERING and not searching:
+        return DEFAULT_RECIPE_ORDERING
+    return ordering
+
+
+class RecipeKeysetPagination(BasePagination):
+    """Opt-in keyset pagination without COUNT(*).
+
+    Pagination is only applied when the client sends `page_size` or
+    `cursor`, so the plain list keeps returning every recipe.
+    """
+    page_size = 20
+    max_page_size = 100
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def is_enabled(self, request):
+        return (
+            self.page_size_query_param in request.query_params
+            or self.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.is_enabled(request):
+            return None
+
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering_key = get_recipe_ordering(request)
+        self.ordering = RECIPE_ORDERINGS[self.ordering_key]
+
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            try:
+                values = decode_cursor(
+                    cursor, self.ordering_key, self.ordering
+                )
+                queryset = queryset.filter(
+                    keyset_filter(self.ordering, values)
+                )
+            except (ValueError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+
+        rows = list(queryset.order_by(*self.ordering)[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Opaque cursor returned as `next`.',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Number of results per page; enables paging.',
+                'schema': {'type': 'integer'},
+            },
+        ]
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(
+            self.base_url,
+            self.cursor_query_param,
+            encode_cursor(
+                self.ordering_key, cursor_values(self.page[-1], self.ordering)
+            ),
+        )
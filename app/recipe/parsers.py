@@ -0,0 +1,14 @@
+"""Request parsers for the recipe API"""
+from rest_framework.parsers import BaseParser
+
+
+class NDJSONParser(BaseParser):
+    """Expose a newline-delimited JSON body as a lazy iterator of lines.
+
+    Nothing is read or decoded up front; the view pulls one line at a time
+    so the upload never has to fit in memory.
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return iter(stream)
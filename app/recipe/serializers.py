@@ -1,5 +1,34 @@
+from django.db import transaction
 from rest_framework import serializers
 from core.models import (Recipe,Tag, Ingredient)
+from recipe.autocomplete import index_names
+from utils.image_variants import variant_urls
+
+
+def get_or_create_by_name(model, user, names):
+    """Return a name -> object dict for the user's Tag or Ingredient rows.
+
+    Existing rows are looked up in one query and the missing ones are
+    inserted with a single bulk_create, then added to the autocomplete
+    index once the transaction commits.
+    """
+    names = list(dict.fromkeys(names))
+    if not names:
+        return {}
+
+    existing = {}
+    for obj in model.objects.filter(user=user, name__in=names):
+        existing.setdefault(obj.name, obj)
+
+    missing = [
+        model(user=user, name=name) for name in names if name not in existing
+    ]
+    for obj in model.objects.bulk_create(missing):
+        existing[obj.name] = obj
+    index_names(model, missing)
+
+    return {name: existing[name] for name in names}
+
 
 class IngredientSerializer(serializers.ModelSerializer):
     class Meta:
@@ -26,26 +55,25 @@ class RecipeSerializer(serializers.ModelSerializer):
                    ]
         ready_only_fields = ['id']
     
-    def _get_or_create_tags(self,tags, recipe):
-        """Handle getting or creating tags as needed"""
+    def _get_or_create_objects(self, model, items):
+        """Resolve names to the user's objects, bulk creating missing ones"""
         auth_user = self.context['request'].user
-        for tag in tags:
-            tag_obj,created = Tag.objects.get_or_create(
-                user=auth_user,
-                **tag
-            )
-            recipe.tags.add(tag_obj)
+        objs = get_or_create_by_name(
+            model, auth_user, [item['name'] for item in items]
+        )
+        return list(objs.values())
+
+    def _get_or_create_tags(self, tags, recipe):
+        """Handle getting or creating tags as needed"""
+        with transaction.atomic():
+            recipe.tags.add(*self._get_or_create_objects(Tag, tags))
 
     def _get_or_create_ingredients(self, ingredients, recipe):
         """Handle get or create ingredients for a recipe."""
-        auth_user = self.context['request'].user
-
-        for ingredient in ingredients:
-            ingredient_obj, created = Ingredient.objects.get_or_create(
-                user=auth_user,
-                name=ingredient['name']
+        with transaction.atomic():
+            recipe.ingredients.add(
+                *self._get_or_create_objects(Ingredient, ingredients)
             )
-            recipe.ingredients.add(ingredient_obj)
 
 
     def create(self, validated_data):
@@ -66,13 +94,14 @@ class RecipeSerializer(serializers.ModelSerializer):
         tags = validate_data.pop('tags', None)
         ingredients = validate_data.pop('ingredients', None)
          
-        if tags is not None:
-            instance.tags.clear()
-            self._get_or_create_tags(tags, instance)
+        with transaction.atomic():
+            if tags is not None:
+                instance.tags.set(self._get_or_create_objects(Tag, tags))
 
-        if ingredients is not None:
-            instance.ingredients.clear()
-            self._get_or_create_ingredients(ingredients, instance)
+            if ingredients is not None:
+                instance.ingredients.set(
+                    self._get_or_create_objects(Ingredient, ingredients)
+                )
 
         for attr, value in validate_data.items():
             setattr(instance, attr, value)
@@ -84,17 +113,33 @@ class RecipeSerializer(serializers.ModelSerializer):
 
 class RecipeDetailSerailizer(RecipeSerializer):
     """Serializer for recipe details vierw"""
+    image_variants = serializers.SerializerMethodField()
+
     class Meta(RecipeSerializer.Meta):
-        fields = RecipeSerializer.Meta.fields + ['description']
+        fields = RecipeSerializer.Meta.fields + [
+            'description', 'image_variants',
+        ]
+
+    def get_image_variants(self, obj):
+        return variant_urls(
+            obj.image, obj.image_variants, self.context.get('request')
+        )
 
 class RecipeImageSerializer(serializers.ModelSerializer):
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
-        fields = ['id', 'image']
+        fields = ['id', 'image', 'image_variants']
         ready_only_fields = ['id']
         extrax_kwargs = {'image': {'required': "True"}}
 
+    def get_image_variants(self, obj):
+        """Resized/WebP derivatives; empty until the pipeline finishes"""
+        return variant_urls(
+            obj.image, obj.image_variants, self.context.get('request')
+        )
+
 
 
 
@@ -0,0 +1,214 @@
+"""Tests for tag and ingredient autocomplete"""
+import threading
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Ingredient, Tag
+from recipe.autocomplete import user_names
+from utils.prefix_index import IndexRegistry, PrefixIndex, index_keys
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAG_AUTOCOMPLETE_URL = reverse('recipe:tag-autocomplete')
+INGREDIENT_AUTOCOMPLETE_URL = reverse('recipe:ingredient-autocomplete')
+
+
+def create_user(email='user@example.com', password='password'):
+    return get_user_model().objects.create_user(email=email, password=password)
+
+
+class PrefixIndexTests(TestCase):
+    """Test the in-memory prefix index"""
+
+    def test_matches_word_prefixes_case_insensitively(self):
+        index = PrefixIndex([(1, 'Gaming Laptop'), (2, 'laptop stand'),
+                             (3, 'Lamp')])
+
+        self.assertEqual(index_keys('Gaming  Laptop'),
+                         ['gaming laptop', 'laptop'])
+        self.assertEqual(index.search('LAP'),
+                         [(1, 'Gaming Laptop'), (2, 'laptop stand')])
+        self.assertEqual(index.search('la', limit=2),
+                         [(3, 'Lamp'), (1, 'Gaming Laptop')])
+        self.assertEqual(index.search('gaming l'), [(1, 'Gaming Laptop')])
+        self.assertEqual(index.search(' '), [])
+
+    def test_add_replaces_and_remove_drops(self):
+        index = PrefixIndex([(1, 'Kettle'), (2, 'Kettle')])
+        index.add(1, 'Teapot')
+        index.remove(2)
+        index.remove(99)
+
+        self.assertEqual(index.search('ke'), [])
+        self.assertEqual(index.search('te'), [(1, 'Teapot')])
+        stats = index.stats()
+        self.assertEqual((stats['names'], stats['keys']), (1, 1))
+        self.assertGreater(stats['memory_bytes'], 0)
+
+
+class IndexRegistryTests(TestCase):
+    """Test building and rebuilding registry indexes"""
+
+    @override_settings(AUTOCOMPLETE_INDEX_MAX_AGE=-1)
+    def test_stale_index_served_while_rebuilding(self):
+        started, release = threading.Event(), threading.Event()
+        rows = [[(1, 'Kettle')], [(1, 'Kettle'), (2, 'Teapot')]]
+
+        def loader(scope):
+            if len(rows) == 1:
+                started.set()
+                self.assertTrue(release.wait(5))
+            return rows.pop(0)
+
+        registry = IndexRegistry(loader)
+        stale = registry.get()
+        rebuilt = []
+        rebuild = threading.Thread(
+            target=lambda: rebuilt.append(registry.get())
+        )
+        rebuild.start()
+        self.assertTrue(started.wait(5))
+
+        self.assertIs(registry.get(), stale)
+        registry.loaded().add(3, 'Tea cosy')
+        release.set()
+        rebuild.join()
+        stale.add(4, 'Teacup')
+
+        index = registry.loaded()
+        self.assertEqual(rebuilt, [index])
+        self.assertEqual([pk for pk, _ in index.search('tea')], [3, 4, 2])
+
+    def test_concurrent_first_gets_build_once(self):
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def loader(scope):
+            calls.append(scope)
+            started.set()
+            self.assertTrue(release.wait(5))
+            return [(1, 'Kettle')]
+
+        registry = IndexRegistry(loader)
+        results = []
+        first = threading.Thread(target=lambda: results.append(registry.get()))
+        first.start()
+        self.assertTrue(started.wait(5))
+        second = threading.Thread(
+            target=lambda: results.append(registry.get())
+        )
+        second.start()
+        release.set()
+        first.join()
+        second.join()
+
+        self.assertEqual(calls, [None])
+        self.assertIs(results[0], results[1])
+        self.assertIs(results[0], registry.loaded())
+
+    def test_clear_discards_a_running_build(self):
+        release = threading.Event()
+
+        def loader(scope):
+            self.assertTrue(release.wait(5))
+            return [(1, 'Kettle')]
+
+        registry = IndexRegistry(loader)
+        build = threading.Thread(target=registry.get)
+        build.start()
+        registry.clear()
+        release.set()
+        build.join()
+
+        self.assertIsNone(registry.loaded())
+
+
+class AutocompleteAPITests(TestCase):
+    """Test the tag and ingredient autocomplete actions"""
+
+    def setUp(self):
+        for registry in user_names.values():
+            registry.clear()
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_auth_required(self):
+        res = APIClient().get(TAG_AUTOCOMPLETE_URL, {'q': 'v'})
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_autocomplete_limited_to_user(self):
+        Tag.objects.create(user=self.user, name='Vegan')
+        Tag.objects.create(user=self.user, name='Quick Vegetarian')
+        Tag.objects.create(user=create_user('other@example.com'), name='Veg')
+        Ingredient.objects.create(user=self.user, name='Vinegar')
+
+        res = self.client.get(TAG_AUTOCOMPLETE_URL, {'q': 've'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        names = [tag['name'] for tag in res.data['results']]
+        self.assertEqual(names, ['Vegan', 'Quick Vegetarian'])
+        res = self.client.get(INGREDIENT_AUTOCOMPLETE_URL, {'q': 'vi'})
+        self.assertEqual(res.data['results'][0]['name'], 'Vinegar')
+
+    def test_index_follows_signals_without_queries(self):
+        tag = Tag.objects.create(user=self.user, name='Dinner')
+        self.client.get(TAG_AUTOCOMPLETE_URL, {'q': 'd'})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.create(user=self.user, name='Dessert')
+            tag.name = 'Supper'
+            tag.save()
+        with self.assertNumQueries(0):
+            res = self.client.get(TAG_AUTOCOMPLETE_URL, {'q': 'd'})
+        self.assertEqual(
+            [tag['name'] for tag in res.data['results']], ['Dessert']
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.filter(name='Dessert').get().delete()
+        res = self.client.get(TAG_AUTOCOMPLETE_URL, {'q': 'd'})
+        self.assertEqual(res.data['results'], [])
+
+    def test_names_created_with_recipes_are_indexed(self):
+        self.client.get(TAG_AUTOCOMPLETE_URL, {'q': 'b'})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(RECIPES_URL, {
+                'title': 'Pancakes', 'time_minutes': 20, 'price': '5.00',
+                'tags': [{'name': 'Brunch'}],
+            }, format='json')
+
+        with self.assertNumQueries(0):
+            res = self.client.get(TAG_AUTOCOMPLETE_URL, {'q': 'b'})
+        self.assertEqual(
+            [tag['name'] for tag in res.data['results']], ['Brunch']
+        )
+
+    def test_rolled_back_writes_are_not_indexed(self):
+        self.client.get(TAG_AUTOCOMPLETE_URL, {'q': 'd'})
+
+        with self.captureOnCommitCallbacks(execute=False):
+            Tag.objects.create(user=self.user, name='Dinner')
+
+        res = self.client.get(TAG_AUTOCOMPLETE_URL, {'q': 'd'})
+        self.assertEqual(res.data['results'], [])
+
+    @override_settings(AUTOCOMPLETE_INDEX_MAX_AGE=-1)
+    def test_stale_index_is_rebuilt(self):
+        self.client.get(TAG_AUTOCOMPLETE_URL, {'q': 'd'})
+        Tag.objects.bulk_create([Tag(user=self.user, name='Dinner')])
+
+        res = self.client.get(TAG_AUTOCOMPLETE_URL, {'q': 'd'})
+
+        self.assertEqual(res.data['results'][0]['name'], 'Dinner')
+
+    def test_invalid_limit(self):
+        res = self.client.get(TAG_AUTOCOMPLETE_URL, {'q': 'd', 'limit': 500})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
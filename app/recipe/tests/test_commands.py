@@ -0,0 +1,24 @@
+"""Test recipe management commands"""
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from core.models import Recipe
+
+
+class BenchmarkRecipeFiltersTests(TestCase):
+    """Test the filter benchmark command"""
+
+    def test_benchmark_reports_all_variants_and_rolls_back(self):
+        out = StringIO()
+
+        call_command(
+            'benchmark_recipe_filters',
+            recipes=50, tags=5, repeat=1, stdout=out
+        )
+
+        output = out.getvalue()
+        for name in ('join+distinct', 'exists any', 'exists all'):
+            self.assertIn(name, output)
+        self.assertFalse(Recipe.objects.exists())
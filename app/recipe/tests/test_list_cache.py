@@ -0,0 +1,124 @@
+"""Test the per-user versioned list cache"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+from recipe.cache import get_cache_stats
+
+RECIPE_URL = reverse('recipe:recipe-list')
+TAG_URL = reverse('recipe:tag-list')
+INGREDIENT_URL = reverse('recipe:ingredient-list')
+
+
+def create_user(email='cache@example.com'):
+    return get_user_model().objects.create_user(
+        email=email, password='testpassword'
+    )
+
+
+def create_recipe(user, **params):
+    defaults = {
+        'title': 'Sample Title',
+        'time_minutes': 5,
+        'price': Decimal('5.5'),
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
+
+
+@override_settings(RECIPE_LIST_CACHE_ENABLED=True)
+class ListCacheTests(TestCase):
+    """Test list responses are cached per user until they write"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_second_request_is_served_from_cache(self):
+        create_recipe(self.user)
+        first = self.client.get(RECIPE_URL)
+
+        with self.assertNumQueries(0):
+            second = self.client.get(RECIPE_URL)
+
+        self.assertEqual(first['X-Cache'], 'MISS')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(get_cache_stats(), {'hits': 1, 'misses': 1})
+
+    def test_query_params_are_normalized(self):
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.client.get(RECIPE_URL, {'tags': tag.id, 'match': 'all'})
+
+        res = self.client.get(f'{RECIPE_URL}?match=all&tags={tag.id}')
+        self.assertEqual(res['X-Cache'], 'HIT')
+
+        res = self.client.get(RECIPE_URL, {'tags': tag.id})
+        self.assertEqual(res['X-Cache'], 'MISS')
+
+    def test_writes_invalidate_all_lists_of_user(self):
+        recipe = create_recipe(self.user)
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        for url in (RECIPE_URL, TAG_URL, INGREDIENT_URL):
+            self.client.get(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.tags.add(tag)
+
+        for url in (RECIPE_URL, TAG_URL, INGREDIENT_URL):
+            self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+
+    def test_api_writes_are_visible(self):
+        self.client.get(RECIPE_URL)
+        payload = {
+            'title': 'New', 'time_minutes': 5, 'price': '1.00',
+            'ingredients': [{'name': 'Salt'}],
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(RECIPE_URL, payload, format='json')
+
+        res = self.client.get(RECIPE_URL)
+        self.assertEqual(len(res.data), 1)
+
+        res = self.client.get(INGREDIENT_URL)
+        ingredient = Ingredient.objects.get(user=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(
+                reverse('recipe:ingredient-detail', args=[ingredient.id])
+            )
+
+        res = self.client.get(INGREDIENT_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, [])
+
+    def test_other_users_cache_untouched(self):
+        other = create_user('other@example.com')
+        other_client = APIClient()
+        other_client.force_authenticate(other)
+        other_client.get(RECIPE_URL)
+
+        create_recipe(self.user)
+
+        self.assertEqual(other_client.get(RECIPE_URL)['X-Cache'], 'HIT')
+        self.assertEqual(self.client.get(RECIPE_URL)['X-Cache'], 'MISS')
+
+    @override_settings(RECIPE_LIST_CACHE_ENABLED=False)
+    def test_disabled_without_a_shared_cache(self):
+        create_recipe(self.user)
+        self.client.get(RECIPE_URL)
+
+        res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(len(res.data), 1)
+        self.assertNotIn('X-Cache', res)
+        self.assertNotIn('ETag', res)
+        self.assertEqual(get_cache_stats(), {'hits': 0, 'misses': 0})
@@ -1,9 +1,14 @@
 from decimal import Decimal
+import io
+import shutil
 import tempfile
 import os
-from PIL import Image
+from PIL import Image, features
+from unittest.mock import patch
 
-from django.test import TestCase
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 
@@ -17,12 +22,14 @@ def recipe_details_url(recipe_id):
 
 
 from core.models import (
+    PendingFileDeletion,
     Recipe,
     Tag,
     Ingredient
     )
 
 from recipe.serializers import (RecipeSerializer, RecipeDetailSerailizer)
+from utils.image_variants import delete_variants, generate_variants
 
 def image_upload_url(recipe_id):
     return reverse('recipe:recipe-upload-image', args=[recipe_id])
@@ -403,7 +410,509 @@ class PrivateRecipeAPITests(TestCase):
         self.assertIn(s2.data, res.data)
         self.assertNotIn(s3.data, res.data)
 
+    def test_filter_match_all_tags(self):
+        """Test match=all only returns recipes carrying every tag"""
+        tag1 = Tag.objects.create(user=self.user, name='Vegan')
+        tag2 = Tag.objects.create(user=self.user, name='Quick')
+        both = create_recipe(user=self.user, title='Both')
+        both.tags.add(tag1, tag2)
+        one = create_recipe(user=self.user, title='One')
+        one.tags.add(tag1)
 
+        params = {'tags': f'{tag1.id},{tag2.id}', 'match': 'all'}
+        res = self.client.get(RECIPE_URL, params)
+
+        self.assertEqual([r['id'] for r in res.data], [both.id])
+
+    def test_filter_does_not_duplicate_or_distinct(self):
+        """Test a recipe matching several ids is returned once"""
+        tag1 = Tag.objects.create(user=self.user, name='Vegan')
+        tag2 = Tag.objects.create(user=self.user, name='Quick')
+        ing = Ingredient.objects.create(user=self.user, name='Salt')
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(tag1, tag2)
+        recipe.ingredients.add(ing)
+
+        params = {'tags': f'{tag1.id},{tag2.id}', 'ingredients': f'{ing.id}'}
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(RECIPE_URL, params)
+
+        self.assertEqual([r['id'] for r in res.data], [recipe.id])
+        self.assertIn('EXISTS', ctx.captured_queries[0]['sql'])
+        self.assertNotIn('DISTINCT', ctx.captured_queries[0]['sql'])
+
+
+class RecipeQueryCountTests(TestCase):
+    """Test the number of queries does not grow with the number of rows"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='queries@example.com',
+            password='testpassword'
+        )
+        self.client.force_authenticate(self.user)
+
+    def _create_recipes(self, count):
+        for i in range(count):
+            recipe = create_recipe(user=self.user, title=f'Recipe {i}')
+            recipe.tags.add(
+                Tag.objects.create(user=self.user, name=f'Tag {i}')
+            )
+            recipe.ingredients.add(
+                Ingredient.objects.create(user=self.user, name=f'Ing {i}')
+            )
+
+    def _count_queries(self, method, url, *args, **kwargs):
+        with CaptureQueriesContext(connection) as ctx:
+            res = getattr(self.client, method)(url, *args, **kwargs)
+        self.assertIn(
+            res.status_code, (status.HTTP_200_OK, status.HTTP_201_CREATED)
+        )
+        return len(ctx.captured_queries)
+
+    def test_list_query_count_is_constant(self):
+        self._create_recipes(2)
+        small = self._count_queries('get', RECIPE_URL)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self._create_recipes(10)
+        large = self._count_queries('get', RECIPE_URL)
+
+        self.assertEqual(small, large)
+        self.assertEqual(large, 3)
+
+    def test_retrieve_query_count_is_constant(self):
+        recipe = create_recipe(user=self.user)
+        for i in range(10):
+            recipe.tags.add(Tag.objects.create(user=self.user, name=f'T{i}'))
+
+        with self.assertNumQueries(3):
+            res = self.client.get(recipe_details_url(recipe.id))
+
+        self.assertEqual(len(res.data['tags']), 10)
+
+    def test_create_query_count_is_constant(self):
+        def payload(prefix):
+            return {
+                'title': 'Sample recipe',
+                'time_minutes': 30,
+                'price': Decimal('5.99'),
+                'tags': [{'name': f'{prefix} tag'}],
+                'ingredients': [{'name': f'{prefix} ingredient'}],
+            }
+
+        small = self._count_queries(
+            'post', RECIPE_URL, payload('a'), format='json'
+        )
+        self._create_recipes(10)
+        large = self._count_queries(
+            'post', RECIPE_URL, payload('b'), format='json'
+        )
+
+        self.assertEqual(small, large)
+
+    def test_create_query_count_independent_of_payload_size(self):
+        Tag.objects.create(user=self.user, name='Tag 0')
+        Ingredient.objects.create(user=self.user, name='Ing 0')
+
+        def payload(count):
+            return {
+                'title': 'Sample recipe',
+                'time_minutes': 30,
+                'price': Decimal('5.99'),
+                'tags': [{'name': f'Tag {i}'} for i in range(count)],
+                'ingredients': [{'name': f'Ing {i}'} for i in range(count)],
+            }
+
+        small = self._count_queries(
+            'post', RECIPE_URL, payload(2), format='json'
+        )
+        large = self._count_queries(
+            'post', RECIPE_URL, payload(30), format='json'
+        )
+
+        self.assertEqual(small, large)
+        recipe = Recipe.objects.filter(user=self.user).order_by('-id')[0]
+        self.assertEqual(recipe.tags.count(), 30)
+        self.assertEqual(recipe.ingredients.count(), 30)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 30)
+
+    def test_update_query_count_independent_of_payload_size(self):
+        recipe = create_recipe(user=self.user)
+
+        def payload(count):
+            return {'tags': [{'name': f'Tag {i}'} for i in range(count)]}
+
+        url = recipe_details_url(recipe.id)
+        small = self._count_queries('patch', url, payload(2), format='json')
+        large = self._count_queries('patch', url, payload(30), format='json')
+
+        self.assertEqual(small, large)
+        self.assertEqual(recipe.tags.count(), 30)
+
+    def test_duplicate_names_in_payload_create_one_object(self):
+        payload = {
+            'title': 'Sample recipe',
+            'time_minutes': 30,
+            'price': Decimal('5.99'),
+            'tags': [{'name': 'Vegan'}, {'name': 'Vegan'}],
+        }
+
+        res = self.client.post(RECIPE_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(len(res.data['tags']), 1)
+
+    def _through_table_writes(self, url, payload):
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.patch(url, payload, format='json')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [
+            q['sql'] for q in ctx.captured_queries
+            if q['sql'].startswith(('INSERT', 'DELETE'))
+            and ('core_recipe_tags' in q['sql']
+                 or 'core_recipe_ingredients' in q['sql'])
+        ]
+
+    def test_unchanged_relations_skip_through_table_writes(self):
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+        recipe.ingredients.add(
+            Ingredient.objects.create(user=self.user, name='Salt')
+        )
+
+        payload = {
+            'title': 'Renamed',
+            'tags': [{'name': 'Vegan'}],
+            'ingredients': [{'name': 'Salt'}],
+        }
+        writes = self._through_table_writes(
+            recipe_details_url(recipe.id), payload
+        )
+
+        self.assertEqual(writes, [])
+
+    def test_changed_relations_write_only_the_difference(self):
+        recipe = create_recipe(user=self.user)
+        keep = Tag.objects.create(user=self.user, name='Keep')
+        drop = Tag.objects.create(user=self.user, name='Drop')
+        recipe.tags.add(keep, drop)
+
+        payload = {'tags': [{'name': 'Keep'}, {'name': 'Add'}]}
+        writes = self._through_table_writes(
+            recipe_details_url(recipe.id), payload
+        )
+
+        self.assertEqual(len(writes), 2)
+        self.assertEqual(
+            set(recipe.tags.values_list('name', flat=True)), {'Keep', 'Add'}
+        )
+        self.assertIn(keep, recipe.tags.all())
+
+    def test_update_response_uses_fresh_relations(self):
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Old'))
+
+        payload = {'tags': [{'name': 'New'}]}
+        res = self.client.patch(
+            recipe_details_url(recipe.id), payload, format='json'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([t['name'] for t in res.data['tags']], ['New'])
+
+
+class RecipePaginationTests(TestCase):
+    """Test opt-in keyset pagination of the recipe list"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='pages@example.com',
+            password='testpassword'
+        )
+        self.client.force_authenticate(self.user)
+        for i in range(7):
+            create_recipe(
+                user=self.user,
+                title=f'Recipe {i % 3}',
+                price=Decimal(f'{i % 2}.50'),
+                time_minutes=i,
+            )
+
+    def _walk(self, params):
+        ids = []
+        res = self.client.get(RECIPE_URL, params)
+        while True:
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            ids.extend(r['id'] for r in res.data['results'])
+            if not res.data['next']:
+                return ids
+            res = self.client.get(res.data['next'])
+
+    def test_list_is_not_paginated_by_default(self):
+        res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 7)
+
+    def test_pages_follow_default_ordering(self):
+        res = self.client.get(RECIPE_URL, {'page_size': 3})
+
+        self.assertEqual(len(res.data['results']), 3)
+        self.assertIsNotNone(res.data['next'])
+        self.assertNotIn('count', res.data)
+
+        expected = list(
+            Recipe.objects.filter(user=self.user)
+            .order_by('-id').values_list('id', flat=True)
+        )
+        self.assertEqual(self._walk({'page_size': 3}), expected)
+
+    def test_orderings_with_ties_are_stable(self):
+        for ordering in ('price', '-price', 'title', '-title', 'time_minutes'):
+            fields = [f.lstrip('-') for f in (ordering, 'id')]
+            expected = [
+                r.id for r in sorted(
+                    Recipe.objects.filter(user=self.user),
+                    key=lambda r: tuple(getattr(r, f) for f in fields),
+                    reverse=ordering.startswith('-'),
+                )
+            ]
+
+            ids = self._walk({'page_size': 2, 'ordering': ordering})
+
+            self.assertEqual(ids, expected, ordering)
+
+    def test_page_queries_do_not_count(self):
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(RECIPE_URL, {'page_size': 2})
+
+        self.assertFalse(
+            any('COUNT(' in q['sql'] for q in ctx.captured_queries)
+        )
+
+    def test_deep_page_costs_same_as_first(self):
+        with CaptureQueriesContext(connection) as first_ctx:
+            first = self.client.get(RECIPE_URL, {'page_size': 2})
+        res = self.client.get(first.data['next'])
+        res = self.client.get(res.data['next'])
+        with CaptureQueriesContext(connection) as deep_ctx:
+            self.client.get(res.data['next'])
+
+        self.assertEqual(
+            len(first_ctx.captured_queries), len(deep_ctx.captured_queries)
+        )
+        self.assertNotIn('OFFSET', deep_ctx.captured_queries[0]['sql'])
+
+    def test_invalid_cursor_returns_404(self):
+        res = self.client.get(RECIPE_URL, {'cursor': 'not-a-cursor'})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_cursor_from_other_ordering_is_rejected(self):
+        res = self.client.get(
+            RECIPE_URL, {'page_size': 2, 'ordering': 'price'}
+        )
+
+        cursor = res.data['next'].split('cursor=')[1].split('&')[0]
+        res = self.client.get(
+            RECIPE_URL, {'cursor': cursor, 'ordering': 'title'}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class RecipeSearchTests(TestCase):
+    """Test full-text search of the recipe list"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='search@example.com',
+            password='testpassword'
+        )
+        self.client.force_authenticate(self.user)
+
+    def test_search_ranks_title_above_description(self):
+        in_description = create_recipe(
+            user=self.user, title='Soup', description='Made with lentils'
+        )
+        in_title = create_recipe(
+            user=self.user, title='Lentil stew', description='Hearty'
+        )
+        create_recipe(user=self.user, title='Toast', description='Bread')
+
+        res = self.client.get(RECIPE_URL, {'search': 'lentil'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [r['id'] for r in res.data], [in_title.id, in_description.id]
+        )
+
+    def test_search_matches_tag_and_ingredient_names(self):
+        recipe = create_recipe(user=self.user, title='Bowl')
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+        recipe.ingredients.add(
+            Ingredient.objects.create(user=self.user, name='Tofu')
+        )
+
+        for term in ('vegan', 'tofu'):
+            res = self.client.get(RECIPE_URL, {'search': term})
+            self.assertEqual([r['id'] for r in res.data], [recipe.id])
+
+    def test_search_limited_to_user(self):
+        other = get_user_model().objects.create_user(
+            email='other@example.com', password='testpassword'
+        )
+        create_recipe(user=other, title='Lentil stew')
+
+        res = self.client.get(RECIPE_URL, {'search': 'lentil'})
+
+        self.assertEqual(res.data, [])
+
+    def test_search_results_paginate_by_rank(self):
+        for i in range(5):
+            create_recipe(user=self.user, title=f'Lentil {"lentil " * i}')
+
+        ids = []
+        res = self.client.get(RECIPE_URL, {'search': 'lentil', 'page_size': 2})
+        while True:
+            ids.extend(r['id'] for r in res.data['results'])
+            if not res.data['next']:
+                break
+            res = self.client.get(res.data['next'])
+
+        expected = list(
+            Recipe.objects.filter(user=self.user)
+            .order_by('-id').values_list('id', flat=True)
+        )
+        self.assertEqual(ids, expected)
+
+    def test_search_pages_through_tied_ranks(self):
+        for _ in range(7):
+            create_recipe(user=self.user, title='Lentil stew')
+
+        ids = []
+        res = self.client.get(RECIPE_URL, {'search': 'lentil', 'page_size': 2})
+        while True:
+            ids.extend(r['id'] for r in res.data['results'])
+            if not res.data['next']:
+                break
+            self.assertLess(len(ids), 8)
+            res = self.client.get(res.data['next'])
+
+        expected = list(
+            Recipe.objects.filter(user=self.user)
+            .order_by('-id').values_list('id', flat=True)
+        )
+        self.assertEqual(ids, expected)
+
+
+@override_settings(RECIPE_LIST_CACHE_ENABLED=True)
+class RecipeETagTests(TestCase):
+    """Test conditional GET on the recipe list and detail"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='etag@example.com',
+            password='testpassword'
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(user=self.user)
+
+    def test_detail_not_modified_skips_serialization(self):
+        url = recipe_details_url(self.recipe.id)
+        etag = self.client.get(url)['ETag']
+
+        with patch.object(
+            RecipeDetailSerailizer, 'to_representation'
+        ) as patched:
+            res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res['ETag'], etag)
+        patched.assert_not_called()
+
+    def test_detail_etag_changes_with_tags(self):
+        url = recipe_details_url(self.recipe.id)
+        etag = self.client.get(url)['ETag']
+
+        self.recipe.tags.add(Tag.objects.create(user=self.user, name='New'))
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+
+    def test_list_not_modified_skips_serialization(self):
+        etag = self.client.get(RECIPE_URL)['ETag']
+
+        with patch.object(RecipeSerializer, 'to_representation') as patched:
+            with self.assertNumQueries(0):
+                res = self.client.get(RECIPE_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        patched.assert_not_called()
+
+    def test_list_etag_changes_on_delete(self):
+        etag = self.client.get(RECIPE_URL)['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(recipe_details_url(self.recipe.id))
+        res = self.client.get(RECIPE_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, [])
+
+    def test_list_etag_depends_on_query(self):
+        etag = self.client.get(RECIPE_URL)['ETag']
+
+        res = self.client.get(
+            RECIPE_URL, {'ordering': 'price'}, HTTP_IF_NONE_MATCH=etag
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+
+class RecipeDeleteTests(TestCase):
+    """Test deleting a recipe queues its image files"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='delete@example.com', password='testpassword'
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(user=self.user)
+
+    @override_settings(IMAGE_VARIANT_WORKERS=0, FILE_DELETION_WORKERS=0)
+    def test_delete_queues_image_and_variants(self):
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            Image.new('RGB', (300, 300)).save(image_file, format='JPEG')
+            image_file.seek(0)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(
+                    image_upload_url(self.recipe.id),
+                    {'image': image_file},
+                    format='multipart',
+                )
+        self.recipe.refresh_from_db()
+        paths = [self.recipe.image.name, *self.recipe.image_variants.values()]
+        storage = self.recipe.image.storage
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            res = self.client.delete(recipe_details_url(self.recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertCountEqual(
+            PendingFileDeletion.objects.values_list('path', flat=True), paths
+        )
+        for callback in callbacks:
+            callback()
+        self.assertFalse(any(storage.exists(path) for path in paths))
 
 
 class ImageUploadTest(TestCase):
@@ -420,6 +929,8 @@ class ImageUploadTest(TestCase):
         self.recipe = create_recipe(user=self.user)
 
     def tearDown(self):
+        self.recipe.refresh_from_db()
+        delete_variants(self.recipe.image.storage, self.recipe.image_variants)
         self.recipe.image.delete()
     
     def test_upload_image(self):
@@ -437,10 +948,92 @@ class ImageUploadTest(TestCase):
             self.recipe.refresh_from_db()
             self.assertEqual(res.status_code, status.HTTP_200_OK)
 
+    def _upload(self, size=(1600, 800)):
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            Image.new('RGB', size).save(image_file, format='JPEG')
+            image_file.seek(0)
+            return self.client.post(
+                image_upload_url(self.recipe.id),
+                {'image': image_file},
+                format='multipart',
+            )
+
+    @override_settings(IMAGE_VARIANT_WORKERS=0)
+    def test_variants_generated_after_commit(self):
+        """Test the upload returns before variants exist"""
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            res = self._upload()
 
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['image_variants'], {})
+        # Rendering the variants and invalidating the cached lists.
+        self.assertEqual(len(callbacks), 2)
+
+        for callback in callbacks:
+            callback()
+        self.recipe.refresh_from_db()
+
+        variants = self.recipe.image_variants
+        self.assertTrue({'thumb', 'medium', 'large'} <= set(variants))
+        if features.check('webp'):
+            self.assertIn('thumb_webp', variants)
+        storage = self.recipe.image.storage
+        with storage.open(variants['thumb']) as thumb:
+            self.assertEqual(Image.open(thumb).size, (150, 75))
+        with storage.open(variants['large']) as large:
+            self.assertEqual(Image.open(large).size, (1200, 600))
+
+    @override_settings(IMAGE_VARIANT_WORKERS=0, RECIPE_LIST_CACHE_ENABLED=True)
+    def test_generated_variants_are_visible(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            self._upload()
+        url = recipe_details_url(self.recipe.id)
+        etag = self.client.get(url)['ETag']
+        self.client.get(RECIPE_URL)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            generate_variants(self.recipe._meta.label, self.recipe.id)
+
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('thumb', res.data['image_variants'])
+        self.assertEqual(self.client.get(RECIPE_URL)['X-Cache'], 'MISS')
 
-                                               
+    @override_settings(IMAGE_VARIANT_WORKERS=0)
+    def test_reupload_replaces_variants(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._upload()
+        self.recipe.refresh_from_db()
+        old_thumb = self.recipe.image_variants['thumb']
 
-        
+        with self.captureOnCommitCallbacks(execute=True):
+            self._upload()
+        self.recipe.refresh_from_db()
+
+        self.assertNotEqual(self.recipe.image_variants['thumb'], old_thumb)
+        self.assertFalse(self.recipe.image.storage.exists(old_thumb))
+
+        res = self.client.get(recipe_details_url(self.recipe.id))
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_resized_image_limited_to_owner(self):
+        self._upload()
+        url = reverse('recipe:recipe-resized-image', args=[self.recipe.id])
+        other = get_user_model().objects.create_user(
+            email='other@gmail.com', password='other'
+        )
+        other_client = APIClient()
+        other_client.force_authenticate(other)
+
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+
+        with override_settings(IMAGE_RESIZE_CACHE_DIR=cache_dir):
+            res = self.client.get(url, {'width': 64})
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertTrue(res['Cache-Control'].startswith('private'))
+            content = b''.join(res.streaming_content)
+            self.assertEqual(Image.open(io.BytesIO(content)).width, 64)
 
-    
\ No newline at end of file
+            res = other_client.get(url, {'width': 64})
+            self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
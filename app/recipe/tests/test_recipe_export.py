@@ -0,0 +1,107 @@
+"""Test the streaming recipe export"""
+import csv
+import io
+import json
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+from recipe.views import RecipeViewSet
+
+EXPORT_URL = reverse('recipe:recipe-export')
+
+
+def create_recipe(user, i):
+    recipe = Recipe.objects.create(
+        user=user,
+        title=f'Recipe {i}',
+        time_minutes=i,
+        price=Decimal('2.50'),
+    )
+    recipe.tags.add(Tag.objects.create(user=user, name=f'Tag {i}'))
+    recipe.ingredients.add(Ingredient.objects.create(user=user, name='Salt'))
+    return recipe
+
+
+class RecipeExportTests(TestCase):
+    """Test exporting recipes"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='export@example.com',
+            password='testpassword'
+        )
+        self.client.force_authenticate(self.user)
+
+    def _export(self, **params):
+        res = self.client.get(EXPORT_URL, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return b''.join(res.streaming_content).decode()
+
+    def test_export_ndjson(self):
+        recipe = create_recipe(self.user, 1)
+        other = get_user_model().objects.create_user(
+            email='other@example.com', password='testpassword'
+        )
+        create_recipe(other, 2)
+
+        lines = self._export().splitlines()
+
+        self.assertEqual(len(lines), 1)
+        row = json.loads(lines[0])
+        self.assertEqual(row['id'], recipe.id)
+        self.assertEqual(row['tags'], ['Tag 1'])
+        self.assertEqual(row['ingredients'], ['Salt'])
+        self.assertEqual(row['price'], '2.50')
+
+    def test_export_csv(self):
+        create_recipe(self.user, 1)
+
+        rows = list(csv.DictReader(io.StringIO(
+            self._export(export_format='csv')
+        )))
+
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['tags'], 'Tag 1')
+        self.assertEqual(rows[0]['title'], 'Recipe 1')
+
+    def test_invalid_format_rejected(self):
+        res = self.client.get(EXPORT_URL, {'export_format': 'xml'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @patch.object(RecipeViewSet, 'export_chunk_size', 10)
+    def test_queries_grow_per_chunk_not_per_row(self):
+        def count():
+            with CaptureQueriesContext(connection) as ctx:
+                self._export()
+            return len(ctx.captured_queries)
+
+        create_recipe(self.user, 0)
+        small = count()
+        for i in range(1, 10):
+            create_recipe(self.user, i)
+        large = count()
+
+        self.assertEqual(small, large)
+
+    def test_export_command(self):
+        create_recipe(self.user, 1)
+        create_recipe(self.user, 2)
+        out = io.StringIO()
+
+        call_command('export_recipes', stdout=out, chunk_size=1)
+
+        rows = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([r['title'] for r in rows], ['Recipe 1', 'Recipe 2'])
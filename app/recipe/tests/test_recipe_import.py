@@ -0,0 +1,123 @@
+"""Test the NDJSON recipe bulk import"""
+import json
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+from recipe import bulk
+from recipe.views import RecipeViewSet
+
+IMPORT_URL = reverse('recipe:recipe-bulk-import')
+
+
+def ndjson(*rows):
+    return '\n'.join(
+        row if isinstance(row, str) else json.dumps(row) for row in rows
+    )
+
+
+def recipe_row(i, **params):
+    row = {
+        'title': f'Recipe {i}',
+        'time_minutes': 10,
+        'price': '4.50',
+        'tags': [{'name': 'Vegan'}, {'name': f'Tag {i}'}],
+        'ingredients': [{'name': 'Salt'}],
+    }
+    row.update(params)
+    return row
+
+
+class RecipeImportTests(TestCase):
+    """Test importing recipes in bulk"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            email='import@example.com',
+            password='testpassword'
+        )
+        self.client.force_authenticate(self.user)
+
+    def _post(self, body):
+        return self.client.post(
+            IMPORT_URL, data=body, content_type='application/x-ndjson'
+        )
+
+    def test_auth_required(self):
+        res = APIClient().post(
+            IMPORT_URL, data=ndjson(recipe_row(1)),
+            content_type='application/x-ndjson'
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_import_creates_recipes_and_links(self):
+        Tag.objects.create(user=self.user, name='Vegan')
+
+        res = self._post(ndjson(recipe_row(1), recipe_row(2)))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, {'created': 2, 'errors': []})
+        recipes = Recipe.objects.filter(user=self.user).order_by('id')
+        self.assertEqual(recipes.count(), 2)
+        self.assertEqual(
+            set(recipes[0].tags.values_list('name', flat=True)),
+            {'Vegan', 'Tag 1'},
+        )
+        self.assertEqual(Tag.objects.filter(name='Vegan').count(), 1)
+        self.assertEqual(Ingredient.objects.filter(name='Salt').count(), 1)
+        self.assertEqual(recipes[1].ingredients.get().name, 'Salt')
+
+    def test_import_reports_errors_per_line(self):
+        body = ndjson(
+            recipe_row(1),
+            '{not json',
+            '',
+            recipe_row(2, time_minutes='soon'),
+            '[1, 2]',
+            recipe_row(3),
+        )
+
+        res = self._post(body)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['created'], 2)
+        self.assertEqual([e['line'] for e in res.data['errors']], [2, 4, 5])
+        self.assertIn('time_minutes', res.data['errors'][1]['errors'])
+
+    def test_query_count_independent_of_rows_in_chunk(self):
+        def count(rows):
+            with CaptureQueriesContext(connection) as ctx:
+                self._post(ndjson(*rows))
+            return len(ctx.captured_queries)
+
+        def rows(numbers):
+            return [
+                recipe_row(i, ingredients=[{'name': f'Ing {i}'}])
+                for i in numbers
+            ]
+
+        small = count(rows(range(2)))
+        large = count(rows(range(100, 150)))
+
+        self.assertEqual(small, large)
+
+    @patch('recipe.bulk.write_chunk', wraps=bulk.write_chunk)
+    @patch.object(RecipeViewSet, 'import_chunk_size', 2)
+    def test_import_writes_in_chunks(self, patched_write):
+        res = self._post(ndjson(*[recipe_row(i) for i in range(5)]))
+
+        self.assertEqual(res.data['created'], 5)
+        self.assertEqual(
+            [len(call.args[1]) for call in patched_write.call_args_list],
+            [2, 2, 1],
+        )
@@ -5,17 +5,40 @@ from drf_spectacular.utils import (
     OpenApiParameter,
     OpenApiTypes
 )
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import transaction
+from django.db.models import DecimalField, F, prefetch_related_objects
+from django.db.models.functions import Cast
+from django.http import StreamingHttpResponse
 from rest_framework import (
                             viewsets,
                             mixins,
                             status, )
 from rest_framework.decorators import action
+from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
 
 from recipe import serializers
-from core.models import (Recipe, Tag, Ingredient)
+from recipe.autocomplete import autocomplete_names
+from recipe.cache import CachedListMixin, get_user_version
+from recipe.bulk import IMPORT_CHUNK_SIZE, import_recipes
+from recipe.export import EXPORT_CHUNK_SIZE, EXPORT_FORMATS, stream_recipes
+from recipe.parsers import NDJSONParser
+from recipe.filters import filter_by_related
+from recipe.pagination import (
+    RECIPE_ORDERINGS,
+    RecipeKeysetPagination,
+    get_recipe_ordering,
+)
+from core.file_cleanup import enqueue_file_deletions
+from core.models import (Recipe, Tag, Ingredient, SEARCH_CONFIG)
+from user.authentication import CachedTokenAuthentication
+from utils.conditional import etag_matches, make_etag, not_modified
+from utils.image_resize import resized_image_response
+from utils.image_variants import schedule_variant_cleanup, schedule_variants
+from utils.prefix_index import parse_autocomplete_params
 # Create your views here.
 
 @extend_schema_view(
@@ -30,15 +53,36 @@ from core.models import (Recipe, Tag, Ingredient)
                 'ingredients',
                 OpenApiTypes.STR,
                 description='Comma separated list of ingredients IDs to filter'
+            ),
+            OpenApiParameter(
+                'match',
+                OpenApiTypes.STR,
+                enum=['any', 'all'],
+                description='Match any (default) or all of the given IDs'
+            ),
+            OpenApiParameter(
+                'search',
+                OpenApiTypes.STR,
+                description='Full-text search over title, description, '
+                            'tags and ingredients; ranks results by default'
+            ),
+            OpenApiParameter(
+                'ordering',
+                OpenApiTypes.STR,
+                enum=list(RECIPE_ORDERINGS),
+                description='Sort order of the results'
             )
         ]
     )
 )
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(CachedListMixin, viewsets.ModelViewSet):
     serializer_class = serializers.RecipeDetailSerailizer
     queryset = Recipe.objects.all()
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
+    pagination_class = RecipeKeysetPagination
+    import_chunk_size = IMPORT_CHUNK_SIZE
+    export_chunk_size = EXPORT_CHUNK_SIZE
 
     def _params_to_ints(self,qs):
         return [int(str_id) for str_id in qs.split(',')]
@@ -50,16 +94,71 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
         queryset = self.queryset
 
+        match_all = self.request.query_params.get('match') == 'all'
+
         if tags:
             tags_ids = self._params_to_ints(tags)
-            queryset = queryset.filter(tags__id__in=tags_ids)
+            queryset = filter_by_related(queryset, 'tags', tags_ids, match_all)
         if ingredients:
             ingredient_ids = self._params_to_ints(ingredients)
-            queryset = queryset.filter(ingredients__id__in=ingredient_ids)
+            queryset = filter_by_related(
+                queryset, 'ingredients', ingredient_ids, match_all
+            )
+
+        search = self.request.query_params.get('search')
+        if search:
+            query = SearchQuery(
+                search, config=SEARCH_CONFIG, search_type='websearch'
+            )
+            # ts_rank is float4, which a cursor cannot round-trip exactly;
+            # a fixed-scale numeric compares equal to its own text form.
+            queryset = queryset.filter(search_vector=query).annotate(
+                rank=Cast(
+                    SearchRank(F('search_vector'), query),
+                    DecimalField(max_digits=16, decimal_places=8),
+                )
+            )
 
         return queryset.filter(
             user=self.request.user
-        ).order_by('-id').distinct()
+        ).prefetch_related('tags', 'ingredients').order_by(
+            *RECIPE_ORDERINGS[get_recipe_ordering(self.request)]
+        )
+
+    def _list_etag(self, request):
+        """ETag from the per-user version bumped on every write"""
+        return make_etag(
+            request.user.pk,
+            request.get_full_path(),
+            get_user_version(request.user.pk),
+        )
+
+    def list(self, request, *args, **kwargs):
+        if not settings.RECIPE_LIST_CACHE_ENABLED:
+            return super().list(request, *args, **kwargs)
+        etag = self._list_etag(request)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        response = super().list(request, *args, **kwargs)
+        response['ETag'] = etag
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        # The row fetched for the ETag is the one serialized; tags and
+        # ingredients are only loaded when the client's copy is stale.
+        queryset = self.get_queryset().prefetch_related(None)
+        recipe = get_object_or_404(queryset, pk=self.kwargs['pk'])
+        self.check_object_permissions(request, recipe)
+        etag = make_etag(
+            request.user.pk, request.get_full_path(), recipe.updated_at
+        )
+        if etag_matches(request, etag):
+            return not_modified(etag)
+
+        prefetch_related_objects([recipe], 'tags', 'ingredients')
+        response = Response(self.get_serializer(recipe).data)
+        response['ETag'] = etag
+        return response
 
     def get_serializer_class(self):
         """Return Serializer class for request"""
@@ -71,6 +170,16 @@ class RecipeViewSet(viewsets.ModelViewSet):
     
     def perform_create(self,serializer):
         return serializer.save(user=self.request.user)
+
+    def perform_destroy(self, instance):
+        # The image and its variants are queued with one INSERT and
+        # deleted in the background once the delete commits.
+        with transaction.atomic():
+            if instance.image:
+                enqueue_file_deletions(
+                    [instance.image.name, *instance.image_variants.values()]
+                )
+            instance.delete()
     
     @action(methods=['POST'], detail=True, url_path='upload-image')
     def upload_image(self, request, pk=None):
@@ -78,12 +187,87 @@ class RecipeViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(recipe, data=request.data)
 
         if serializer.is_valid():
-            serializer.save()
+            # The stored file's reference is taken in the same transaction
+            # as the row update, so a failed update does not leak it.
+            with transaction.atomic():
+                schedule_variant_cleanup(
+                    recipe.image.storage, recipe.image_variants
+                )
+                recipe = serializer.save(image_variants={})
+                schedule_variants(recipe)
             return Response(serializer.data, status=status.HTTP_200_OK)
         
         print("Serializer errors:", serializer.errors)  # Debugging line
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @extend_schema(
+        parameters=[
+            OpenApiParameter('width', OpenApiTypes.INT, required=True),
+            OpenApiParameter(
+                'image_format', OpenApiTypes.STR, enum=['jpeg', 'png', 'webp']
+            ),
+            OpenApiParameter(
+                'v', OpenApiTypes.STR,
+                description='ETag of the variant; enables long-term caching'
+            ),
+        ],
+        responses={(200, 'image/*'): OpenApiTypes.BINARY},
+    )
+    @action(methods=['GET'], detail=True, url_path='resized-image')
+    def resized_image(self, request, pk=None):
+        """Return the recipe image resized to the requested width"""
+        recipe = self.get_object()
+        return resized_image_response(request, recipe.image, private=True)
+
+    @extend_schema(
+        request={NDJSONParser.media_type: OpenApiTypes.STR},
+        responses=OpenApiTypes.OBJECT,
+    )
+    @action(
+        methods=['POST'],
+        detail=False,
+        url_path='bulk-import',
+        parser_classes=[NDJSONParser],
+    )
+    def bulk_import(self, request):
+        """Import recipes from a newline-delimited JSON body"""
+        report = import_recipes(
+            request.data, request, chunk_size=self.import_chunk_size
+        )
+        return Response(report, status=status.HTTP_200_OK)
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'export_format',
+                OpenApiTypes.STR,
+                enum=[*EXPORT_FORMATS],
+                description='Output format, ndjson (default) or csv'
+            )
+        ],
+        responses=OpenApiTypes.STR,
+    )
+    @action(methods=['GET'], detail=False, url_path='export')
+    def export(self, request):
+        """Stream every matching recipe without loading them all at once"""
+        export_format = request.query_params.get('export_format', 'ndjson')
+        if export_format not in EXPORT_FORMATS:
+            return Response(
+                {'export_format': [f'Must be one of {list(EXPORT_FORMATS)}.']},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        response = StreamingHttpResponse(
+            stream_recipes(
+                self.get_queryset(), export_format, self.export_chunk_size
+            ),
+            content_type=EXPORT_FORMATS[export_format],
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="recipes.{export_format}"'
+        )
+        return response
+
 @extend_schema_view(
     list=extend_schema(
         parameters=[
@@ -96,12 +280,13 @@ class RecipeViewSet(viewsets.ModelViewSet):
     )
 )
 class BaseRecipeAttrViewSet(
+                            CachedListMixin,
                             mixins.DestroyModelMixin,
                             mixins.UpdateModelMixin,
                             mixins.ListModelMixin,
                             viewsets.GenericViewSet):
     
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
 
 
@@ -116,8 +301,27 @@ class BaseRecipeAttrViewSet(
 
         return queryset.filter(
             user=self.request.user
-        ).order_b('-name').distinct()
+        ).order_by('-name').distinct()
         #return self.queryset.filter(user=self.request.user).order_by("-name")
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter('q', OpenApiTypes.STR, description='Prefix'),
+            OpenApiParameter('limit', OpenApiTypes.INT),
+        ]
+    )
+    @action(methods=['GET'], detail=False, url_path='autocomplete')
+    def autocomplete(self, request):
+        """The user's names with a word starting with `q`, from memory"""
+        try:
+            prefix, limit = parse_autocomplete_params(request.query_params)
+        except ValueError as exc:
+            return Response(
+                {'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response({'results': autocomplete_names(
+            self.queryset.model, request.user.id, prefix, limit
+        )})
     
 class TagViewSet(
     BaseRecipeAttrViewSet
@@ -0,0 +1,186 @@
+"""Token authentication with the token lookup cached.
+
+`CachedTokenAuthentication` is a drop-in for DRF's TokenAuthentication:
+an authenticated token and its user are kept in a bounded in-process LRU
+for TOKEN_AUTH_CACHE_TIMEOUT seconds and, when TOKEN_AUTH_SHARED_CACHE
+names a cache alias, in that cache too, so a hit costs no query.
+
+Entries are dropped when the token is deleted or its user is saved,
+which covers deactivation, once the transaction commits. With a shared
+cache each user also has a generation key there that invalidation
+replaces; every hit, including one from the in-process LRU, checks it
+with one cache GET, so a revocation reaches all processes at once.
+Without one, other processes only drop their entries when those expire.
+"""
+import hashlib
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from functools import partial
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+KEY_PREFIX = 'token-auth'
+
+
+def _cache_key(key):
+    # Never keep raw tokens in cache keys.
+    return f'{KEY_PREFIX}:{hashlib.sha256(key.encode()).hexdigest()}'
+
+
+def _user_key(user_id):
+    return f'{KEY_PREFIX}:user:{user_id}'
+
+
+class TokenCache:
+    """LRU of pickled tokens with their user, expiring after a timeout.
+
+    Entries are `(user_id, user_generation, data)`; `user_generation` is
+    the value of the user's generation key in the shared cache when the
+    entry was stored, or None without a shared cache.
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Bumped by every invalidation, so a lookup that raced with one
+        # does not store what it read.
+        self.generation = 0
+
+    def _shared(self):
+        alias = settings.TOKEN_AUTH_SHARED_CACHE
+        return caches[alias] if alias else None
+
+    def get(self, key):
+        """The cached `(user, token)` of `key`, or None"""
+        cache_key = _cache_key(key)
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None:
+                expires, entry = entry
+                if expires > time.monotonic():
+                    self._entries.move_to_end(cache_key)
+                else:
+                    del self._entries[cache_key]
+                    entry = None
+        local = entry is not None
+
+        shared = self._shared()
+        if shared:
+            if entry is None:
+                entry = shared.get(cache_key)
+                if entry is None:
+                    return None
+            user_id, user_generation, data = entry
+            if shared.get(_user_key(user_id)) != user_generation:
+                if local:
+                    self._drop(cache_key)
+                return None
+            if not local:
+                self._store(cache_key, entry)
+        elif entry is None:
+            return None
+
+        # Each request gets its own copy to modify.
+        token = pickle.loads(entry[2])
+        return token.user, token
+
+    def set(self, key, token, generation):
+        """Cache `token` unless something was invalidated since `generation`"""
+        cache_key = _cache_key(key)
+        shared = self._shared()
+        user_generation = (
+            self._user_generation(shared, token.user_id) if shared else None
+        )
+        entry = (token.user_id, user_generation, pickle.dumps(token))
+        if not self._store(cache_key, entry, generation):
+            return
+        if shared:
+            shared.set(cache_key, entry, settings.TOKEN_AUTH_CACHE_TIMEOUT)
+
+    def _user_generation(self, shared, user_id):
+        user_key = _user_key(user_id)
+        user_generation = shared.get(user_key)
+        if user_generation is None:
+            # An evicted generation key must not match older entries.
+            shared.add(user_key, uuid.uuid4().hex, None)
+            user_generation = shared.get(user_key)
+        return user_generation
+
+    def _store(self, cache_key, entry, generation=None):
+        expires = time.monotonic() + settings.TOKEN_AUTH_CACHE_TIMEOUT
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return False
+            self._entries[cache_key] = (expires, entry)
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > settings.TOKEN_AUTH_CACHE_MAX_ENTRIES:
+                self._entries.popitem(last=False)
+        return True
+
+    def _drop(self, cache_key):
+        with self._lock:
+            self._entries.pop(cache_key, None)
+
+    def invalidate(self, *keys, user_id=None):
+        """Drop the tokens `keys` and, given `user_id`, all of that user's"""
+        cache_keys = [_cache_key(key) for key in keys]
+        with self._lock:
+            self.generation += 1
+            for cache_key in cache_keys:
+                self._entries.pop(cache_key, None)
+            if user_id is not None:
+                for cache_key, (_, entry) in list(self._entries.items()):
+                    if entry[0] == user_id:
+                        del self._entries[cache_key]
+        shared = self._shared()
+        if shared and cache_keys:
+            shared.delete_many(cache_keys)
+        if shared and user_id is not None:
+            shared.set(_user_key(user_id), uuid.uuid4().hex, None)
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication that caches successful lookups"""
+
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        if cached is not None:
+            return cached
+
+        generation = token_cache.generation
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(key, token, generation)
+        return user, token
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    transaction.on_commit(
+        partial(token_cache.invalidate, instance.key, user_id=instance.user_id)
+    )
+
+
+@receiver(post_save, sender=get_user_model())
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    # Logins only touch last_login, which cached users need not track.
+    if created or update_fields == frozenset({'last_login'}):
+        return
+    transaction.on_commit(partial(token_cache.invalidate, user_id=instance.pk))
@@ -0,0 +1,162 @@
+"""Tests for the cached token authentication"""
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import update_last_login
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from user.authentication import TokenCache, token_cache
+
+ME_URL = reverse('user:me')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+def create_user(email='user@example.com', **params):
+    return get_user_model().objects.create_user(
+        email=email, password='password', name='Test', **params
+    )
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    """Test caching token lookups and invalidating them"""
+
+    def setUp(self):
+        token_cache.clear()
+        cache.clear()
+        self.user = create_user()
+        self.token = Token.objects.create(user=self.user)
+        self.client = self._client(self.token)
+
+    def _client(self, token):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        return client
+
+    def test_cache_hit_runs_no_queries(self):
+        self.assertEqual(self.client.get(ME_URL).status_code, 200)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['email'], self.user.email)
+
+    def test_recipe_endpoints_use_cache(self):
+        self.client.get(TAGS_URL)
+
+        with self.assertNumQueries(1):
+            res = self.client.get(TAGS_URL, {'assigned_only': 1})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_deleted_token_is_rejected(self):
+        self.client.get(ME_URL)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.token.delete()
+
+        res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_is_rejected(self):
+        self.client.get(ME_URL)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+
+        res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_profile_update_is_not_served_stale(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(ME_URL, {'name': 'Renamed'})
+
+        res = self.client.get(ME_URL)
+        self.assertEqual(res.data['name'], 'Renamed')
+
+    @override_settings(TOKEN_AUTH_CACHE_MAX_ENTRIES=1)
+    def test_least_recently_used_token_is_evicted(self):
+        other = self._client(
+            Token.objects.create(user=create_user('other@example.com'))
+        )
+        self.client.get(ME_URL)
+        other.get(ME_URL)
+
+        with self.assertNumQueries(0):
+            other.get(ME_URL)
+        with self.assertNumQueries(1):
+            self.client.get(ME_URL)
+
+    @override_settings(TOKEN_AUTH_CACHE_TIMEOUT=0)
+    def test_entries_expire(self):
+        self.client.get(ME_URL)
+
+        with self.assertNumQueries(1):
+            self.client.get(ME_URL)
+
+    @override_settings(TOKEN_AUTH_SHARED_CACHE='default')
+    def test_shared_cache_backs_the_lru(self):
+        self.client.get(ME_URL)
+        token_cache.clear()
+
+        with self.assertNumQueries(0):
+            self.client.get(ME_URL)
+
+        token_cache.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.token.delete()
+        res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(TOKEN_AUTH_SHARED_CACHE='default')
+    def test_revocation_in_another_process_reaches_the_lru(self):
+        self.client.get(ME_URL)
+        other_process = TokenCache()
+
+        key = self.token.key
+        # This process's own on_commit invalidation never runs here.
+        self.token.delete()
+        other_process.invalidate(key, user_id=self.user.pk)
+
+        with self.assertNumQueries(1):
+            res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(TOKEN_AUTH_SHARED_CACHE='default')
+    def test_user_save_in_another_process_reaches_the_lru(self):
+        self.client.get(ME_URL)
+        other_process = TokenCache()
+
+        get_user_model().objects.filter(pk=self.user.pk).update(name='Renamed')
+        other_process.invalidate(user_id=self.user.pk)
+
+        res = self.client.get(ME_URL)
+        self.assertEqual(res.data['name'], 'Renamed')
+
+    def test_login_keeps_cache_and_skips_token_lookup(self):
+        self.client.get(ME_URL)
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertNumQueries(1):
+                update_last_login(None, self.user)
+        self.assertEqual(callbacks, [])
+
+        with self.assertNumQueries(0):
+            self.client.get(ME_URL)
+
+    def test_user_save_runs_no_token_query(self):
+        with self.assertNumQueries(1):
+            self.user.save()
+
+    def test_lookup_racing_an_invalidation_is_not_cached(self):
+        generation = token_cache.generation
+        token_cache.invalidate('another-token')
+
+        token_cache.set(self.token.key, self.token, generation)
+
+        self.assertIsNone(token_cache.get(self.token.key))
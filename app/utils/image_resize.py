@@ -0,0 +1,242 @@
+"""On-demand image resizing backed by a size-bounded LRU disk cache.
+
+Resized files live under `IMAGE_RESIZE_CACHE_DIR` (inside MEDIA_ROOT) and
+are named after a digest of the owning row, the stored file's name, size
+and modification time, the width and the format. A new upload, even one
+reusing a deleted image's file name, therefore gets a new key and ETag.
+Concurrent requests for the same variant in a process share one render.
+"""
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.http import FileResponse
+from django.utils.http import http_date
+from PIL import Image, ImageOps, features
+from rest_framework import status
+from rest_framework.response import Response
+
+from utils.conditional import etag_matches, make_etag, not_modified
+
+MIN_WIDTH = 16
+MAX_WIDTH = 2048
+FORMATS = {
+    'jpeg': ('JPEG', 'image/jpeg'),
+    'png': ('PNG', 'image/png'),
+    'webp': ('WEBP', 'image/webp'),
+}
+FAR_FUTURE = 60 * 60 * 24 * 365
+
+
+class ResizeCache:
+    """Cache directory evicted least recently used first, by total size.
+
+    Reads and writes set the file's mtime, so the directory itself is the
+    LRU index: every process sharing it finds the others' renders, and
+    each write rescans it and evicts the oldest files until the total
+    fits in `max_bytes` across all of them.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._inflight = {}
+
+    def _scan(self):
+        """`(mtime, name, size)` of the cached files, oldest first"""
+        os.makedirs(self.directory, exist_ok=True)
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.startswith('.'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime_ns, entry.name, stat.st_size))
+        entries.sort()
+        return entries
+
+    def _touch(self, path):
+        # Explicit times, since the kernel's own are too coarse to order
+        # files written in quick succession.
+        now = time.time_ns()
+        os.utime(path, ns=(now, now))
+
+    def path(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        """Return the cached path for `key` and mark it recently used"""
+        path = self.path(key)
+        try:
+            self._touch(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key, content):
+        """Atomically write `content` and evict the least recently used"""
+        os.makedirs(self.directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp')
+        with os.fdopen(fd, 'wb') as tmp:
+            tmp.write(content)
+        path = self.path(key)
+        os.replace(tmp_path, path)
+        self._touch(path)
+
+        with self._lock:
+            entries = self._scan()
+            total = sum(size for _, _, size in entries)
+            for _, name, size in entries:
+                if total <= self.max_bytes:
+                    break
+                if name == key:
+                    continue
+                try:
+                    os.remove(self.path(name))
+                except FileNotFoundError:
+                    pass
+                total -= size
+        return path
+
+    def get_or_create(self, key, render):
+        """Return the path for `key`, calling `render()` at most once"""
+        path = self.get(key)
+        if path:
+            return path
+
+        with self._lock:
+            key_lock, waiters = self._inflight.get(key, (threading.Lock(), 0))
+            self._inflight[key] = (key_lock, waiters + 1)
+        try:
+            with key_lock:
+                path = self.get(key)
+                if path:
+                    return path
+                return self.put(key, render())
+        finally:
+            with self._lock:
+                key_lock, waiters = self._inflight[key]
+                if waiters == 1:
+                    del self._inflight[key]
+                else:
+                    self._inflight[key] = (key_lock, waiters - 1)
+
+    @property
+    def total_bytes(self):
+        return sum(size for _, _, size in self._scan())
+
+
+_cache = None
+
+
+def get_resize_cache():
+    global _cache
+    directory = settings.IMAGE_RESIZE_CACHE_DIR
+    max_bytes = settings.IMAGE_RESIZE_CACHE_MAX_BYTES
+    if (_cache is None or _cache.directory != directory
+            or _cache.max_bytes != max_bytes):
+        _cache = ResizeCache(directory, max_bytes)
+    return _cache
+
+
+def resize_image(data, width, image_format):
+    """Downscale to `width` (never upscaling) and encode as `image_format`"""
+    image = ImageOps.exif_transpose(Image.open(io.BytesIO(data)))
+    if width < image.width:
+        height = max(1, round(image.height * width / image.width))
+        image = image.resize((width, height), Image.LANCZOS)
+    if image_format == 'JPEG':
+        image = image.convert('RGB')
+
+    buffer = io.BytesIO()
+    image.save(buffer, image_format)
+    return buffer.getvalue()
+
+
+def parse_resize_params(query_params):
+    """Return `(width, format key)` or raise ValueError with a message"""
+    try:
+        width = int(query_params.get('width', ''))
+    except ValueError:
+        raise ValueError('width must be an integer.')
+    if not MIN_WIDTH <= width <= MAX_WIDTH:
+        raise ValueError(f'width must be between {MIN_WIDTH} and {MAX_WIDTH}.')
+
+    # `format` is reserved by DRF for renderer selection.
+    image_format = query_params.get('image_format', 'jpeg').lower()
+    if image_format not in FORMATS:
+        raise ValueError(f'image_format must be one of {sorted(FORMATS)}.')
+    if image_format == 'webp' and not features.check('webp'):
+        raise ValueError('webp is not supported on this server.')
+    return width, image_format
+
+
+def source_version(field_file):
+    """Identify the stored content of `field_file` without reading it"""
+    instance = field_file.instance
+    try:
+        modified = field_file.storage.get_modified_time(field_file.name)
+    except NotImplementedError:
+        modified = None
+    return (
+        f'{instance._meta.label}:{instance.pk}:{field_file.name}:'
+        f'{field_file.size}:{modified and modified.timestamp()}'
+    )
+
+
+def resized_image_response(request, field_file, private=False):
+    """Serve `field_file` resized per the `width`/`image_format` params.
+
+    Responses are immutable for a year when the request carries `v` equal
+    to the returned ETag, which changes with the stored content; otherwise
+    clients revalidate with the ETag.
+    """
+    if not field_file:
+        return Response(
+            {'image': ['No image uploaded.']},
+            status=status.HTTP_404_NOT_FOUND,
+        )
+    try:
+        width, image_format = parse_resize_params(request.query_params)
+    except ValueError as exc:
+        return Response(
+            {'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST
+        )
+
+    key = hashlib.sha1(
+        f'{source_version(field_file)}:{width}:{image_format}'.encode()
+    ).hexdigest()
+    etag = make_etag(key)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    pil_format, content_type = FORMATS[image_format]
+
+    def render():
+        with field_file.open('rb') as original:
+            return resize_image(original.read(), width, pil_format)
+
+    cache = get_resize_cache()
+    cache_key = f'{key}.{image_format}'
+    path = cache.get_or_create(cache_key, render)
+    try:
+        resized = open(path, 'rb')
+    except FileNotFoundError:
+        # Evicted between lookup and open by another request.
+        resized = open(cache.put(cache_key, render()), 'rb')
+
+    response = FileResponse(resized, content_type=content_type)
+    response['ETag'] = etag
+    scope = 'private' if private else 'public'
+    if request.query_params.get('v') == etag.strip('"'):
+        response['Cache-Control'] = f'{scope}, max-age={FAR_FUTURE}, immutable'
+        response['Expires'] = http_date(time.time() + FAR_FUTURE)
+    else:
+        response['Cache-Control'] = f'{scope}, no-cache'
+    return response
@@ -0,0 +1,172 @@
+"""Resized and WebP derivatives of uploaded images, built off the request path.
+
+Uploads are saved as-is by the views; once the transaction commits the
+derivatives are rendered with Pillow in a process pool and recorded in the
+model's `image_variants` JSON field as `{variant name: storage path}`.
+That update bumps `updated_at` where the model has one and sends
+`variants_generated`, since a queryset update fires no post_save.
+"""
+import io
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from django.db.models.functions import Now
+from django.dispatch import Signal
+from PIL import Image, ImageOps, features
+
+logger = logging.getLogger(__name__)
+
+VARIANT_SIZES = {
+    'thumb': 150,
+    'medium': 600,
+    'large': 1200,
+}
+
+# Sent with the model instance once its variants are recorded.
+variants_generated = Signal()
+
+_render_pool = None
+_task_pool = None
+_pools_lock = threading.Lock()
+
+
+def _pools():
+    global _render_pool, _task_pool
+    with _pools_lock:
+        if _render_pool is None:
+            workers = settings.IMAGE_VARIANT_WORKERS
+            # The pool starts from a threaded web process; a forked child
+            # could inherit locks held by other threads and deadlock, so
+            # the workers are spawned fresh and only import this module.
+            _render_pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+            _task_pool = ThreadPoolExecutor(max_workers=workers)
+    return _render_pool, _task_pool
+
+
+def _encode(image, image_format):
+    buffer = io.BytesIO()
+    if image_format == 'JPEG':
+        image.convert('RGB').save(buffer, 'JPEG', quality=85, optimize=True)
+    else:
+        image.save(buffer, image_format, **(
+            {'quality': 80} if image_format == 'WEBP' else {'optimize': True}
+        ))
+    return buffer.getvalue()
+
+
+def render_variants(data):
+    """Return `{name: (bytes, extension)}` for every variant of an image.
+
+    Runs in a worker process, so it only deals with bytes.
+    """
+    image = ImageOps.exif_transpose(Image.open(io.BytesIO(data)))
+    has_alpha = image.mode in ('RGBA', 'LA', 'P')
+    base_format, base_ext = ('PNG', 'png') if has_alpha else ('JPEG', 'jpg')
+    with_webp = features.check('webp')
+
+    rendered = {}
+    for name, size in VARIANT_SIZES.items():
+        resized = image.copy()
+        resized.thumbnail((size, size), Image.LANCZOS)
+        rendered[name] = (_encode(resized, base_format), base_ext)
+        if with_webp:
+            rendered[f'{name}_webp'] = (_encode(resized, 'WEBP'), 'webp')
+    return rendered
+
+
+def delete_variants(storage, variants):
+    for path in (variants or {}).values():
+        storage.delete(path)
+
+
+def generate_variants(model_label, pk, field='image'):
+    """Render, store and record the variants of one model image"""
+    model = apps.get_model(model_label)
+    obj = model.objects.filter(pk=pk).first()
+    image = getattr(obj, field, None)
+    if not image:
+        return None
+
+    with image.open('rb') as original:
+        data = original.read()
+
+    if settings.IMAGE_VARIANT_WORKERS:
+        rendered = _pools()[0].submit(render_variants, data).result()
+    else:
+        rendered = render_variants(data)
+
+    base = os.path.splitext(image.name)[0]
+    changes = {}
+    if any(f.name == 'updated_at' for f in model._meta.concrete_fields):
+        changes['updated_at'] = Now()
+    # Storage references are taken in the transaction recording them.
+    with transaction.atomic():
+        variants = {
+            name: image.storage.save(
+                f'{base}_{name}.{ext}', ContentFile(content)
+            )
+            for name, (content, ext) in rendered.items()
+        }
+        # Only record the variants if the image was not replaced meanwhile.
+        updated = model.objects.filter(pk=pk, **{field: image.name}).update(
+            image_variants=variants, **changes
+        )
+        if not updated:
+            delete_variants(image.storage, variants)
+            return None
+    obj.image_variants = variants
+    variants_generated.send(sender=model, instance=obj)
+    return variants
+
+
+def _run_in_background(func, *args):
+    try:
+        func(*args)
+    except Exception:
+        logger.exception(
+            'Image variant task failed: %s%r', func.__name__, args
+        )
+    finally:
+        connection.close()
+
+
+def _submit(func, *args):
+    if settings.IMAGE_VARIANT_WORKERS:
+        _pools()[1].submit(_run_in_background, func, *args)
+    else:
+        func(*args)
+
+
+def schedule_variants(instance, field='image'):
+    """Build the variants of `instance.<field>` after the current commit"""
+    transaction.on_commit(partial(
+        _submit, generate_variants, instance._meta.label, instance.pk, field
+    ))
+
+
+def schedule_variant_cleanup(storage, variants):
+    """Delete previously generated variant files after the current commit"""
+    if variants:
+        transaction.on_commit(partial(
+            _submit, delete_variants, storage, dict(variants)
+        ))
+
+
+def variant_urls(field_file, variants, request=None):
+    """Map variant names to URLs the same way DRF's ImageField does"""
+    urls = {}
+    for name, path in (variants or {}).items():
+        url = field_file.storage.url(path)
+        urls[name] = request.build_absolute_uri(url) if request else url
+    return urls
@@ -0,0 +1,52 @@
+"""Cursor helpers shared by the keyset paginators.
+
+An ordering is a tuple of field names such as `('-price', '-id')` that ends
+with a unique tiebreaker. Cursors are opaque base64 JSON holding the
+ordering key they were issued for and the values of the last row seen.
+"""
+import base64
+import json
+
+from django.db.models import Q
+
+
+def cursor_values(obj, ordering):
+    """Values of `obj` along `ordering`, as stored in a cursor"""
+    return [str(getattr(obj, field.lstrip('-'))) for field in ordering]
+
+
+def encode_cursor(ordering_key, values):
+    payload = json.dumps([ordering_key, values])
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_cursor(cursor, ordering_key, ordering):
+    """Return the values of a cursor issued for `ordering_key`.
+
+    Raises ValueError for anything that is not such a cursor.
+    """
+    try:
+        key, values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (TypeError, ValueError):
+        raise ValueError('Malformed cursor')
+    if (key != ordering_key
+            or not isinstance(values, list)
+            or len(values) != len(ordering)):
+        raise ValueError('Cursor does not match the ordering')
+    return values
+
+
+def keyset_filter(ordering, values):
+    """Build `(a, b) > (x, y)` as an index-friendly Q expression"""
+    fields = [field.lstrip('-') for field in ordering]
+    lookups = ['lt' if field.startswith('-') else 'gt' for field in ordering]
+
+    condition = Q()
+    equal = Q()
+    for field, lookup, value in zip(fields, lookups, values):
+        condition |= equal & Q(**{f'{field}__{lookup}': value})
+        equal &= Q(**{field: value})
+
+    # Bound the leading column too so the planner can range-scan it.
+    leading = Q(**{f'{fields[0]}__{lookups[0]}e': values[0]})
+    return leading & condition
@@ -0,0 +1,275 @@
+"""In-process prefix index for autocomplete.
+
+Names are case-folded and indexed once per word, so "lap" finds both
+"Laptop stand" and "Gaming laptop". The keys live in one sorted list with
+the matching ids in a parallel `array`, which keeps the footprint to the
+key strings themselves; a lookup is a bisect plus a scan of the matches.
+Inserts and removals keep the arrays sorted, so the index can follow
+model signals instead of being rebuilt.
+
+Rebuilds run outside the registry lock while the previous index keeps
+serving lookups. It records the changes applied to it meanwhile; they are
+replayed onto the new index when it is swapped in, and later changes are
+forwarded to it, so writes that commit during a rebuild are not lost.
+"""
+import bisect
+import logging
+import sys
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+
+
+def parse_autocomplete_params(query_params):
+    """Return `(prefix, limit)` or raise ValueError with a message"""
+    try:
+        limit = int(query_params.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        raise ValueError('limit must be an integer.')
+    if not 1 <= limit <= MAX_LIMIT:
+        raise ValueError(f'limit must be between 1 and {MAX_LIMIT}.')
+    return query_params.get('q', ''), limit
+
+
+def index_keys(name):
+    """Case-folded suffixes of `name` starting at each word"""
+    folded = ' '.join(name.casefold().split())
+    keys = [folded]
+    for position, char in enumerate(folded):
+        if char == ' ':
+            keys.append(folded[position + 1:])
+    return keys
+
+
+class PrefixIndex:
+    """Sorted word keys mapping name prefixes to `(id, name)` pairs"""
+
+    def __init__(self, items=()):
+        self._lock = threading.Lock()
+        self._journal = None
+        self._successor = None
+        self.build(items)
+
+    def build(self, items):
+        """Replace the contents with `items`, an iterable of (id, name)"""
+        start = time.perf_counter()
+        names, pairs = {}, []
+        for pk, name in items:
+            names[pk] = name
+            pairs.extend((key, pk) for key in index_keys(name))
+        pairs.sort()
+        keys = [key for key, _ in pairs]
+        ids = array('q', (pk for _, pk in pairs))
+        with self._lock:
+            self._keys, self._ids, self._names = keys, ids, names
+            self.built_at = time.monotonic()
+            self.build_seconds = time.perf_counter() - start
+
+    def __len__(self):
+        return len(self._names)
+
+    def _insert(self, pk, name):
+        self._names[pk] = name
+        for key in index_keys(name):
+            position = bisect.bisect_right(self._keys, key)
+            self._keys.insert(position, key)
+            self._ids.insert(position, pk)
+
+    def _remove(self, pk):
+        name = self._names.pop(pk, None)
+        if name is None:
+            return
+        for key in index_keys(name):
+            position = bisect.bisect_left(self._keys, key)
+            while position < len(self._keys) and self._keys[position] == key:
+                if self._ids[position] == pk:
+                    del self._keys[position]
+                    del self._ids[position]
+                    break
+                position += 1
+
+    def add(self, pk, name):
+        """Index `name` under `pk`, replacing what `pk` had before"""
+        with self._lock:
+            successor = self._successor
+            if successor is None:
+                self._remove(pk)
+                self._insert(pk, name)
+                if self._journal is not None:
+                    self._journal.append((pk, name))
+        if successor is not None:
+            successor.add(pk, name)
+
+    def remove(self, pk):
+        with self._lock:
+            successor = self._successor
+            if successor is None:
+                self._remove(pk)
+                if self._journal is not None:
+                    self._journal.append((pk, None))
+        if successor is not None:
+            successor.remove(pk)
+
+    def record(self, enabled=True):
+        """Start or stop recording the adds and removes applied from now on"""
+        with self._lock:
+            self._journal = [] if enabled else None
+
+    def replace_with(self, index):
+        """Replay the recorded changes onto `index` and forward later ones"""
+        with self._lock:
+            for pk, name in self._journal or ():
+                if name is None:
+                    index.remove(pk)
+                else:
+                    index.add(pk, name)
+            self._journal = None
+            self._successor = index
+
+    def search(self, prefix, limit=10):
+        """Up to `limit` `(id, name)` pairs with a word starting `prefix`"""
+        prefix = ' '.join(prefix.casefold().split())
+        if not prefix:
+            return []
+        results, seen = [], set()
+        with self._lock:
+            position = bisect.bisect_left(self._keys, prefix)
+            while (len(results) < limit and position < len(self._keys)
+                    and self._keys[position].startswith(prefix)):
+                pk = self._ids[position]
+                if pk not in seen:
+                    seen.add(pk)
+                    results.append((pk, self._names[pk]))
+                position += 1
+        return results
+
+    def memory_bytes(self):
+        """Approximate bytes held by the index structures"""
+        with self._lock:
+            return (
+                sys.getsizeof(self._keys)
+                + sum(sys.getsizeof(key) for key in self._keys)
+                + sys.getsizeof(self._ids)
+                + sys.getsizeof(self._names)
+                + sum(sys.getsizeof(name) for name in self._names.values())
+            )
+
+    def stats(self):
+        return {
+            'names': len(self._names),
+            'keys': len(self._keys),
+            'memory_bytes': self.memory_bytes(),
+            'build_seconds': self.build_seconds,
+        }
+
+
+class IndexRegistry:
+    """Lazily built prefix indexes, one per scope such as a user id.
+
+    `loader(scope)` returns the `(id, name)` pairs of a scope. An index is
+    rebuilt once it is older than AUTOCOMPLETE_INDEX_MAX_AGE seconds, which
+    bounds how stale other processes and writes that bypass signals can
+    leave it; the stale index is served until the rebuild is swapped in.
+    Concurrent first requests for a scope wait for a single build.
+    At most `max_indexes` scopes are kept, least recently used first out.
+    """
+
+    def __init__(self, loader, max_indexes=None):
+        self.loader = loader
+        self.max_indexes = max_indexes
+        self._indexes = OrderedDict()
+        # Scope -> the index recording changes while that scope is built.
+        self._building = {}
+        # Scope -> event set when its running build ends.
+        self._built = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, scope=None):
+        max_age = settings.AUTOCOMPLETE_INDEX_MAX_AGE
+        with self._lock:
+            index = self._indexes.get(scope)
+            if index is not None:
+                self._indexes.move_to_end(scope)
+                if (scope in self._building
+                        or time.monotonic() - index.built_at <= max_age):
+                    return index
+            recorder = self._building.get(scope)
+            if recorder is not None:
+                # Another caller is building the first index of this scope.
+                done = self._built[scope]
+            else:
+                done = None
+                # Nothing loaded yet: record into a placeholder that
+                # `loaded` hands to writers until the build lands.
+                recorder = index if index is not None else PrefixIndex()
+                recorder.record()
+                self._building[scope] = recorder
+                self._built[scope] = threading.Event()
+            generation = self._generation
+
+        if done is not None:
+            done.wait()
+            with self._lock:
+                index = self._indexes.get(scope)
+            # The build failed or was cleared: try again.
+            return index if index is not None else self.get(scope)
+
+        try:
+            built = PrefixIndex(self.loader(scope))
+        except BaseException:
+            with self._lock:
+                self._end_build(scope, recorder)
+            if recorder is index:
+                recorder.record(False)
+            raise
+
+        with self._lock:
+            self._end_build(scope, recorder)
+            current = self._indexes.get(scope)
+            if generation != self._generation:
+                return built
+            if current is not None and current is not index:
+                # Another caller built the first index of this scope.
+                return current
+            recorder.replace_with(built)
+            self._indexes[scope] = built
+            self._indexes.move_to_end(scope)
+            if self.max_indexes:
+                while len(self._indexes) > self.max_indexes:
+                    self._indexes.popitem(last=False)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(
+                'Built autocomplete index %r: %s', scope, built.stats()
+            )
+        return built
+
+    def _end_build(self, scope, recorder):
+        if self._building.get(scope) is recorder:
+            del self._building[scope]
+            self._built.pop(scope).set()
+
+    def loaded(self, scope=None):
+        """The index of `scope` if built or building, without building it"""
+        with self._lock:
+            index = self._indexes.get(scope)
+            return index if index is not None else self._building.get(scope)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._indexes.clear()
+            for recorder in self._building.values():
+                recorder.record(False)
+            self._building.clear()
+            for done in self._built.values():
+                done.set()
+            self._built.clear()